@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional
+from unittest.mock import patch
+
+import click
+
+from benchmarks.fake_server import REST_API_MAX_PAGE_SIZE, FakeTableauServer
+from benchmarks.generators import SyntheticTableauSite, generate_manifest, materialized_names
+from benchmarks.run import PRESETS, _git_revision
+from exposurescrawler.crawlers.tableau import (
+    DEFAULT_MAX_CONCURRENCY,
+    LOOKUP_MODE_AUTO,
+    LOOKUP_MODES,
+    tableau_crawler,
+)
+from exposurescrawler.tableau.graphql_client import DEFAULT_PAGE_SIZE
+from exposurescrawler.utils import serialization
+from exposurescrawler.utils.logger import logger
+
+"""
+Benchmarks a whole crawl end to end: `tableau_crawler()` runs against a `FakeTableauServer` on
+a local port, through the real Tableau client (HTTP, authentication and paging). Unlike
+`run.py`, which measures each stage on its own, this measures the throughput of the crawl and
+how it changes with the latency of Tableau, the concurrency, page limits and errors.
+"""
+
+
+def run_end_to_end(
+    nodes: int,
+    sources: int,
+    workbooks: int,
+    custom_sqls: int,
+    latency: float = 0.0,
+    page_limit: int = REST_API_MAX_PAGE_SIZE,
+    error_rate: float = 0.0,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    lookup_mode: str = LOOKUP_MODE_AUTO,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    :return: the parameters, the duration and throughput of the crawl, the requests served and
+             the run report of the crawler (see `Metrics.report()`)
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        manifest_path = os.path.join(folder, 'manifest.json')
+        report_path = os.path.join(folder, 'report.json')
+        generated = generate_manifest(nodes, sources, seed)
+
+        with open(manifest_path, 'wb') as file:
+            file.write(serialization.dumps(generated))
+
+        site = SyntheticTableauSite(
+            materialized_names(generated), workbooks, custom_sqls, seed=seed
+        )
+        del generated
+
+        with FakeTableauServer(site, latency, page_limit, error_rate, seed=seed) as server:
+            environment = {
+                'TABLEAU_URL': server.url,
+                'TABLEAU_USERNAME': 'benchmark',
+                'TABLEAU_PASSWORD': 'benchmark',
+            }
+
+            start = time.perf_counter()
+
+            with patch.dict(os.environ, environment):
+                tableau_crawler(
+                    manifest_path,
+                    'benchmark',
+                    [],
+                    False,
+                    page_size=page_size,
+                    max_concurrency=max_concurrency,
+                    lookup_mode=lookup_mode,
+                    metrics_report_path=report_path,
+                )
+
+            seconds = time.perf_counter() - start
+
+        with open(report_path) as file:
+            report = json.load(file)
+
+    return {
+        'revision': _git_revision(),
+        'parameters': {
+            'nodes': nodes,
+            'sources': sources,
+            'workbooks': workbooks,
+            'custom_sqls': custom_sqls,
+            'latency': latency,
+            'page_limit': page_limit,
+            'error_rate': error_rate,
+            'page_size': page_size,
+            'max_concurrency': max_concurrency,
+            'lookup_mode': lookup_mode,
+            'seed': seed,
+        },
+        'seconds': round(seconds, 6),
+        'requests': server.requests,
+        'errors': server.errors,
+        'workbooks_per_second': round(workbooks / seconds, 2),
+        'requests_per_second': round(server.requests / seconds, 2),
+        'report': report,
+    }
+
+
+@click.command()
+@click.option(
+    '--preset',
+    type=click.Choice(list(PRESETS)),
+    default='small',
+    show_default=True,
+    help='The size of the generated inputs, overridden by the options below',
+)
+@click.option('--nodes', type=click.IntRange(min=1), help='How many models to generate')
+@click.option('--sources', type=click.IntRange(min=0), help='How many sources to generate')
+@click.option('--workbooks', type=click.IntRange(min=1), help='How many workbooks to generate')
+@click.option('--custom-sqls', type=click.IntRange(min=1), help='How many custom SQLs to generate')
+@click.option(
+    '--latency',
+    type=click.FloatRange(min=0),
+    default=0.0,
+    show_default=True,
+    metavar='SECONDS',
+    help='How long the fake server takes to answer each request',
+)
+@click.option(
+    '--page-limit',
+    type=click.IntRange(min=1),
+    default=REST_API_MAX_PAGE_SIZE,
+    show_default=True,
+    help='The largest page returned by the fake server, regardless of the requested size',
+)
+@click.option(
+    '--error-rate',
+    type=click.FloatRange(min=0, max=1),
+    default=0.0,
+    show_default=True,
+    help='The fraction of requests answered with 429 or 503 errors',
+)
+@click.option('--page-size', type=click.IntRange(min=1), default=DEFAULT_PAGE_SIZE)
+@click.option('--max-concurrency', type=click.IntRange(min=1), default=DEFAULT_MAX_CONCURRENCY)
+@click.option('--lookup-mode', type=click.Choice(LOOKUP_MODES), default=LOOKUP_MODE_AUTO)
+@click.option('--seed', type=int, default=0, show_default=True)
+@click.option('--output', metavar='PATH', help='Where to write the results to, as JSON')
+def end_to_end_command(
+    preset: str,
+    nodes: Optional[int],
+    sources: Optional[int],
+    workbooks: Optional[int],
+    custom_sqls: Optional[int],
+    latency: float,
+    page_limit: int,
+    error_rate: float,
+    page_size: int,
+    max_concurrency: int,
+    lookup_mode: str,
+    seed: int,
+    output: Optional[str],
+):
+    # The crawler logs every workbook, which would be measured as well
+    logger().setLevel(logging.WARNING)
+
+    preset_nodes, preset_sources, preset_workbooks, preset_custom_sqls = PRESETS[preset]
+
+    results = run_end_to_end(
+        nodes or preset_nodes,
+        preset_sources if sources is None else sources,
+        workbooks or preset_workbooks,
+        custom_sqls or preset_custom_sqls,
+        latency=latency,
+        page_limit=page_limit,
+        error_rate=error_rate,
+        page_size=page_size,
+        max_concurrency=max_concurrency,
+        lookup_mode=lookup_mode,
+        seed=seed,
+    )
+
+    serialized = json.dumps(results, indent=4)
+
+    if output:
+        with open(output, 'w') as file:
+            file.write(serialized + '\n')
+    else:
+        click.echo(serialized)
+
+
+if __name__ == '__main__':
+    end_to_end_command()
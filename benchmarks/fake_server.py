@@ -0,0 +1,312 @@
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from xml.etree import ElementTree
+
+from benchmarks.generators import SyntheticTableauSite
+from exposurescrawler.tableau.models import UserDetails, WorkbookDetails
+
+"""
+A local stand-in for a Tableau Server, serving a `SyntheticTableauSite` over HTTP: the endpoints
+of the REST API (server info, signing in and out, listing and getting workbooks and users) and
+the Metadata API (GraphQL) used by `TableauRestClient`.
+
+Unlike `SyntheticTableauClient`, requests go through the real client: HTTP, authentication,
+paging and `TSC.Pager`. Latency, page limits and errors (429 and 5xx) can be injected, so the
+throughput of a whole crawl and how it behaves under concurrency can be measured locally.
+"""
+
+NAMESPACE = 'http://tableau.com/api'
+PRODUCT_VERSION = '2023.1.0'
+REST_API_VERSION = '3.19'
+SITE_ID = 'fake-site-id'
+SIGNED_IN_USER_ID = 'fake-signed-in-user-id'
+
+# The largest page Tableau Server returns on the REST API
+REST_API_MAX_PAGE_SIZE = 1000
+
+_API_PREFIX = r'^/api/(?P<version>[0-9.]+)'
+_SITE_PREFIX = _API_PREFIX + r'/sites/(?P<site_id>[^/]+)'
+
+
+def _xml_response(build: Callable[[ElementTree.Element], None]) -> bytes:
+    root = ElementTree.Element('tsResponse', xmlns=NAMESPACE)
+    build(root)
+
+    return ElementTree.tostring(root, encoding='utf-8', xml_declaration=True)
+
+
+def _error_response(code: str, summary: str) -> bytes:
+    def build(root):
+        error = ElementTree.SubElement(root, 'error', code=code)
+        ElementTree.SubElement(error, 'summary').text = summary
+        ElementTree.SubElement(error, 'detail').text = summary
+
+    return _xml_response(build)
+
+
+def _add_workbook(parent: ElementTree.Element, workbook: WorkbookDetails) -> None:
+    element = ElementTree.SubElement(
+        parent,
+        'workbook',
+        id=workbook.id,
+        name=workbook.name,
+        description=workbook.description,
+        webpageUrl=workbook.webpage_url,
+        createdAt=workbook.created_at,
+        updatedAt=workbook.updated_at,
+    )
+
+    # Workbooks on personal spaces belong to projects without a name
+    project = ElementTree.SubElement(element, 'project', id=f'project-{workbook.project_name}')
+    if workbook.project_name:
+        project.set('name', workbook.project_name)
+
+    ElementTree.SubElement(element, 'owner', id=workbook.owner_id)
+
+    tags = ElementTree.SubElement(element, 'tags')
+    for tag in workbook.tags:
+        ElementTree.SubElement(tags, 'tag', label=tag)
+
+
+def _add_user(parent: ElementTree.Element, user: UserDetails) -> None:
+    ElementTree.SubElement(
+        parent, 'user', id=user.id, name=user.name, fullName=user.fullname, siteRole='Viewer'
+    )
+
+
+def _page(items: List[Any], query: Dict[str, List[str]], page_limit: int) -> Tuple[List, int, int]:
+    """
+    :return: the items of the requested page, the page number and the size of the page, which
+             is capped to `page_limit`
+    """
+    page_size = min(int(query.get('pageSize', ['100'])[0]), page_limit)
+    page_number = int(query.get('pageNumber', ['1'])[0])
+    start = (page_number - 1) * page_size
+
+    return items[slice(start, start + page_size)], page_number, page_size
+
+
+class FakeTableauServer:
+    """
+    Serves `site` on a local port, on a background thread. It should be used as a context
+    manager, which starts the server and stops it at the end.
+
+    :param site: the synthetic site to serve
+    :param latency: how many seconds each request takes, on top of the time to answer it
+    :param page_limit: the largest page returned by both APIs, regardless of the requested size
+    :param error_rate: the fraction of requests (other than signing in and out) answered with an
+                       error, alternating between 429 (with a `Retry-After` header) and 503
+    :param retry_after: the value of the `Retry-After` header on 429 errors
+    """
+
+    def __init__(
+        self,
+        site: SyntheticTableauSite,
+        latency: float = 0.0,
+        page_limit: int = REST_API_MAX_PAGE_SIZE,
+        error_rate: float = 0.0,
+        retry_after: int = 1,
+        seed: int = 0,
+    ):
+        self.site = site
+        self.latency = latency
+        self.page_limit = page_limit
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+
+        self.auth_token = uuid.UUID(int=random.Random(seed).getrandbits(128)).hex
+        self.requests = 0
+        self.errors = 0
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._workbooks = {workbook.id: workbook for workbook in site.workbooks}
+        self._users = {user.id: user for user in site.users}
+
+        self._routes: Iterable[Tuple[str, 're.Pattern[str]', Callable]] = [
+            ('GET', re.compile(_API_PREFIX + r'/serverInfo$'), self._server_info),
+            ('POST', re.compile(_API_PREFIX + r'/auth/signin$'), self._sign_in),
+            ('POST', re.compile(_API_PREFIX + r'/auth/signout$'), self._sign_out),
+            ('GET', re.compile(_SITE_PREFIX + r'/workbooks$'), self._list_workbooks),
+            ('GET', re.compile(_SITE_PREFIX + r'/workbooks/(?P<id>[^/]+)$'), self._get_workbook),
+            ('GET', re.compile(_SITE_PREFIX + r'/users$'), self._list_users),
+            ('GET', re.compile(_SITE_PREFIX + r'/users/(?P<id>[^/]+)$'), self._get_user),
+            ('POST', re.compile(r'^/api/metadata/graphql$'), self._metadata_api),
+        ]
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self) -> 'FakeTableauServer':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+        if self._thread:
+            self._thread.join()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server._handle(self, 'GET')
+
+            def do_POST(self):
+                server._handle(self, 'POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _inject_error(self) -> Optional[int]:
+        with self._lock:
+            if self._rng.random() >= self.error_rate:
+                return None
+
+            self.errors += 1
+            return 429 if self.errors % 2 else 503
+
+    def _handle(self, request: BaseHTTPRequestHandler, method: str) -> None:
+        url = urlsplit(request.path)
+        body = request.rfile.read(int(request.headers.get('Content-Length') or 0))
+
+        with self._lock:
+            self.requests += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(url.path)
+
+            if route_method == method and match:
+                break
+        else:
+            return self._respond(request, 404, _error_response('404000', 'Not found'))
+
+        if handler not in (self._server_info, self._sign_in, self._sign_out):
+            if request.headers.get('X-Tableau-Auth') != self.auth_token:
+                return self._respond(request, 401, _error_response('401002', 'Unauthorized'))
+
+            if status := self._inject_error():
+                headers = {'Retry-After': str(self.retry_after)} if status == 429 else {}
+                error = _error_response(f'{status}000', 'Injected error')
+                return self._respond(request, status, error, headers=headers)
+
+        status, content = handler(match.groupdict(), parse_qs(url.query), body)
+        content_type = 'application/json' if isinstance(content, dict) else 'application/xml'
+        serialized = json.dumps(content).encode() if isinstance(content, dict) else content
+
+        self._respond(request, status, serialized, content_type)
+
+    @staticmethod
+    def _respond(
+        request: BaseHTTPRequestHandler,
+        status: int,
+        content: bytes,
+        content_type: str = 'application/xml',
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        request.send_response(status)
+        request.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        request.send_header('Content-Length', str(len(content)))
+
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+
+        request.end_headers()
+        request.wfile.write(content)
+
+    def _server_info(self, params, query, body):
+        def build(root):
+            server_info = ElementTree.SubElement(root, 'serverInfo')
+            product_version = ElementTree.SubElement(server_info, 'productVersion', build='1')
+            product_version.text = PRODUCT_VERSION
+            ElementTree.SubElement(server_info, 'restApiVersion').text = REST_API_VERSION
+
+        return 200, _xml_response(build)
+
+    def _sign_in(self, params, query, body):
+        def build(root):
+            credentials = ElementTree.SubElement(root, 'credentials', token=self.auth_token)
+            ElementTree.SubElement(credentials, 'site', id=SITE_ID, contentUrl='')
+            ElementTree.SubElement(credentials, 'user', id=SIGNED_IN_USER_ID)
+
+        return 200, _xml_response(build)
+
+    def _sign_out(self, params, query, body):
+        return 204, b''
+
+    def _list(self, items, query, element_name, add_item):
+        page, page_number, page_size = _page(items, query, self.page_limit)
+
+        def build(root):
+            ElementTree.SubElement(
+                root,
+                'pagination',
+                pageNumber=str(page_number),
+                pageSize=str(page_size),
+                totalAvailable=str(len(items)),
+            )
+            parent = ElementTree.SubElement(root, element_name)
+
+            for item in page:
+                add_item(parent, item)
+
+        return 200, _xml_response(build)
+
+    def _list_workbooks(self, params, query, body):
+        return self._list(self.site.workbooks, query, 'workbooks', _add_workbook)
+
+    def _list_users(self, params, query, body):
+        return self._list(self.site.users, query, 'users', _add_user)
+
+    def _get_workbook(self, params, query, body):
+        if (workbook := self._workbooks.get(params['id'])) is None:
+            return 404, _error_response('404006', 'Workbook not found')
+
+        return 200, _xml_response(lambda root: _add_workbook(root, workbook))
+
+    def _get_user(self, params, query, body):
+        if (user := self._users.get(params['id'])) is None:
+            return 404, _error_response('404002', 'User not found')
+
+        return 200, _xml_response(lambda root: _add_user(root, user))
+
+    def _metadata_api(self, params, query, body):
+        request = json.loads(body)
+        variables = request.get('variables') or {}
+        start = int(variables.get('afterToken') or 0)
+        size = min(variables.get('first') or self.page_limit, self.page_limit)
+
+        if 'customSQLTablesConnection' in request['query']:
+            return 200, {'data': self.site.custom_sql_page(start, size)}
+
+        return 200, {'data': self.site.native_sql_page(start, size)}
@@ -0,0 +1,328 @@
+import random
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from exposurescrawler.tableau.models import UserDetails, WorkbookDetails
+
+"""
+Generators of synthetic (but realistically shaped) inputs for the benchmarks: dbt manifests,
+and the payloads of the Tableau Metadata API (GraphQL) and REST API.
+
+Everything is generated from a seed, so the same parameters always produce the same inputs and
+results can be compared across commits.
+"""
+
+PACKAGE_NAME = 'benchmark'
+DATABASE_NAME = 'ANALYTICS'
+SOURCES_DATABASE_NAME = 'RAW'
+SCHEMAS = ('core', 'finance', 'marketing', 'operations', 'product', 'staging')
+SOURCE_SCHEMAS = ('app', 'payments', 'crm', 'events')
+PROJECTS = ('Finance', 'Marketing', 'Operations', 'Product', None)
+TAGS = ('certified', 'draft', 'finance', 'kpi')
+
+# Tables referenced by Tableau but not by dbt, which the parser has to skip
+UNKNOWN_TABLES = tuple(f'LEGACY_DB.PUBLIC.TABLE_{index}' for index in range(50))
+
+_SQL_TEMPLATES = (
+    'select * from {0}',
+    'select a.*, b.* from {0} a left join {1} b on a.id = b.{2}_id where a.created_at > {3}',
+    'with base as (select * from {0} where status = \'{2}\')\n'
+    'select base.id, count(*) from base join {1} on base.id = {1}.id group by 1 limit {3}',
+    '/* dashboard {2} */ select id, sum(amount) as total from {0} group by id having total > {3}',
+)
+
+
+def _model(index: int, rng: random.Random) -> Dict[str, Any]:
+    name = f'model_{index}'
+    schema = SCHEMAS[index % len(SCHEMAS)]
+    unique_id = f'model.{PACKAGE_NAME}.{name}'
+    compiled_code = f'select * from {DATABASE_NAME}.{schema}.upstream_{index}\n' + '\n'.join(
+        f'    , column_{column} as renamed_{column}' for column in range(rng.randint(5, 40))
+    )
+
+    return {
+        'database': DATABASE_NAME.lower(),
+        'schema': schema,
+        'name': name,
+        'resource_type': 'model',
+        'package_name': PACKAGE_NAME,
+        'path': f'{schema}/{name}.sql',
+        'original_file_path': f'models/{schema}/{name}.sql',
+        'unique_id': unique_id,
+        'fqn': [PACKAGE_NAME, schema, name],
+        'alias': name,
+        'config': {'enabled': True, 'materialized': 'table', 'tags': [], 'meta': {}},
+        'tags': [],
+        'description': f'The {name} model',
+        'columns': {
+            f'column_{column}': {'name': f'column_{column}', 'description': '', 'meta': {}}
+            for column in range(rng.randint(2, 20))
+        },
+        'raw_code': compiled_code.replace(DATABASE_NAME, '{{ target.database }}'),
+        'compiled_code': compiled_code,
+        'depends_on': {'macros': [], 'nodes': []},
+    }
+
+
+def _source(index: int) -> Dict[str, Any]:
+    name = f'source_{index}'
+    schema = SOURCE_SCHEMAS[index % len(SOURCE_SCHEMAS)]
+
+    return {
+        'database': SOURCES_DATABASE_NAME.lower(),
+        'schema': schema,
+        'name': name,
+        'resource_type': 'source',
+        'package_name': PACKAGE_NAME,
+        'unique_id': f'source.{PACKAGE_NAME}.{schema}.{name}',
+        'fqn': [PACKAGE_NAME, schema, name],
+        'source_name': schema,
+        'identifier': name,
+        'description': '',
+        'columns': {},
+        'meta': {},
+        'tags': [],
+    }
+
+
+def generate_manifest(nodes: int, sources: int, seed: int = 0) -> Dict[str, Any]:
+    """
+    :param nodes: how many models to generate
+    :param sources: how many sources to generate
+    :return: a manifest with the sections of a real one, including (less relevant to the
+             crawler, but big) macros, docs and child_map
+    """
+    rng = random.Random(seed)
+
+    manifest: Dict[str, Any] = {
+        'metadata': {'dbt_version': '1.4.8', 'adapter_type': 'snowflake'},
+        'nodes': {},
+        'sources': {},
+        'macros': {},
+        'docs': {},
+        'exposures': {},
+        'metrics': {},
+        'selectors': {},
+        'disabled': {},
+        'parent_map': {},
+        'child_map': {},
+    }
+
+    for index in range(nodes):
+        model = _model(index, rng)
+        manifest['nodes'][model['unique_id']] = model
+
+    for index in range(sources):
+        source = _source(index)
+        manifest['sources'][source['unique_id']] = source
+
+    for index in range(max(nodes // 10, 1)):
+        unique_id = f'macro.{PACKAGE_NAME}.macro_{index}'
+        manifest['macros'][unique_id] = {
+            'unique_id': unique_id,
+            'macro_sql': '{% macro macro_' + str(index) + '() %} select 1 {% endmacro %}',
+        }
+
+    for unique_id in list(manifest['nodes']) + list(manifest['sources']):
+        manifest['parent_map'][unique_id] = []
+        manifest['child_map'][unique_id] = []
+
+    return manifest
+
+
+def materialized_names(manifest: Dict[str, Any]) -> List[str]:
+    """
+    :return: the fully qualified names of all models and sources, as Tableau would reference them
+    """
+    return [
+        f'{node["database"]}.{node["schema"]}.{node.get("alias") or node["name"]}'.upper()
+        for section in ('nodes', 'sources')
+        for node in manifest[section].values()
+    ]
+
+
+class SyntheticTableauSite:
+    """
+    A synthetic Tableau site: workbooks, their owners, their custom SQLs and the tables they
+    connect to natively.
+
+    :param tables: the fully qualified names of the tables the SQLs may reference
+    :param workbooks: how many workbooks the site has
+    :param custom_sqls: how many custom SQL tables the site has
+    :param duplication: the fraction of custom SQLs that are copies of another one (e.g.
+                        copy-pasted across workbooks)
+    :param users: how many users own the workbooks
+    :param unknown_ratio: the fraction of referenced tables that are not dbt models
+    """
+
+    def __init__(
+        self,
+        tables: List[str],
+        workbooks: int,
+        custom_sqls: int,
+        duplication: float = 0.5,
+        users: Optional[int] = None,
+        unknown_ratio: float = 0.2,
+        seed: int = 0,
+    ):
+        self._rng = random.Random(seed)
+        self.tables = tables
+        self.unknown_ratio = unknown_ratio
+
+        users = users or max(workbooks // 20, 1)
+        self.users = [
+            UserDetails(f'user-{index}', f'user.{index}@example.com', f'User {index}')
+            for index in range(users)
+        ]
+        self.workbooks = [self._workbook(index) for index in range(workbooks)]
+
+        distinct_sqls = [self._sql() for _ in range(max(int(custom_sqls * (1 - duplication)), 1))]
+        copies = [self._rng.choice(distinct_sqls) for _ in range(custom_sqls - len(distinct_sqls))]
+        self.custom_sqls: List[Tuple[str, WorkbookDetails]] = [
+            (query, self._rng.choice(self.workbooks)) for query in distinct_sqls + copies
+        ]
+
+        # Roughly half of the workbooks also connect to tables natively
+        self.native_tables: List[Tuple[WorkbookDetails, List[str]]] = [
+            (workbook, [self._table() for _ in range(self._rng.randint(1, 4))])
+            for workbook in self.workbooks
+            if self._rng.random() < 0.5
+        ]
+
+    def _workbook(self, index: int) -> WorkbookDetails:
+        return WorkbookDetails(
+            id=str(uuid.UUID(int=self._rng.getrandbits(128))),
+            name=f'Workbook {index}',
+            description=f'Description of workbook {index}',
+            webpage_url=f'https://tableau.example.com/#/workbooks/{index}',
+            owner_id=self._rng.choice(self.users).id,
+            project_name=self._rng.choice(PROJECTS),
+            tags=self._rng.sample(TAGS, self._rng.randint(0, 2)),
+            created_at='2021-01-01T00:00:00Z',
+            updated_at=f'2022-{self._rng.randint(1, 12):02d}-01T00:00:00Z',
+        )
+
+    def _table(self) -> str:
+        if self._rng.random() < self.unknown_ratio:
+            return self._rng.choice(UNKNOWN_TABLES)
+
+        return self._rng.choice(self.tables)
+
+    def _sql(self) -> str:
+        template = self._rng.choice(_SQL_TEMPLATES)
+        return template.format(
+            self._table(), self._table(), self._rng.choice(SCHEMAS), self._rng.randint(1, 10_000)
+        )
+
+    def custom_sql_page(self, start: int, size: int) -> Dict[str, Any]:
+        """
+        :return: a page of the result of the custom SQL query on the Metadata API
+        """
+        end = start + size
+        nodes = [
+            {
+                'query': query,
+                'name': 'Custom SQL Query',
+                'isEmbedded': None,
+                'database': {'name': DATABASE_NAME, 'connectionType': 'snowflake'},
+                'tables': [],
+                'downstreamWorkbooks': [
+                    {'luid': workbook.id, 'name': workbook.name, 'updatedAt': workbook.updated_at}
+                ],
+            }
+            for query, workbook in self.custom_sqls[start:end]
+        ]
+
+        return _page('customSQLTablesConnection', nodes, end, len(self.custom_sqls))
+
+    def native_sql_page(self, start: int, size: int) -> Dict[str, Any]:
+        """
+        :return: a page of the result of the native SQL query on the Metadata API
+        """
+        end = start + size
+        nodes = [
+            {
+                'id': workbook.id,
+                'luid': workbook.id,
+                'name': workbook.name,
+                'updatedAt': workbook.updated_at,
+                'embeddedDatasources': [
+                    {
+                        'id': f'{workbook.id}-datasource',
+                        'name': 'Datasource',
+                        'upstreamTables': [_upstream_table(table) for table in tables],
+                    }
+                ],
+            }
+            for workbook, tables in self.native_tables[start:end]
+        ]
+
+        return _page('workbooksConnection', nodes, end, len(self.native_tables))
+
+
+class SyntheticTableauClient:
+    """
+    Stands in for `TableauRestClient`, answering from a `SyntheticTableauSite` instead of a
+    Tableau server, so the benchmarks measure the crawler and not the network.
+    """
+
+    def __init__(self, site: SyntheticTableauSite):
+        self.site = site
+        self._workbooks = {workbook.id: workbook for workbook in site.workbooks}
+        self._users = {user.id: user for user in site.users}
+
+    def sign_in(self) -> None:
+        pass
+
+    def run_metadata_api(self, query: str, variables: Optional[dict] = None):
+        variables = variables or {}
+        start = int(variables.get('afterToken') or 0)
+        size = variables.get('first') or len(self.site.workbooks)
+
+        if 'customSQLTablesConnection' in query:
+            return self.site.custom_sql_page(start, size)
+
+        return self.site.native_sql_page(start, size)
+
+    def retrieve_workbook(self, workbook_id: str) -> WorkbookDetails:
+        return self._workbooks[workbook_id]
+
+    def retrieve_user(self, user_id: str) -> UserDetails:
+        return self._users[user_id]
+
+    def retrieve_all_workbooks(self) -> List[WorkbookDetails]:
+        return self.site.workbooks
+
+    def retrieve_all_users(self) -> List[UserDetails]:
+        return self.site.users
+
+    def count_workbooks(self) -> int:
+        return len(self.site.workbooks)
+
+    def count_users(self) -> int:
+        return len(self.site.users)
+
+
+def _upstream_table(fqn: str) -> Dict[str, Any]:
+    database, schema, name = fqn.split('.')
+
+    return {
+        'database': {'name': database},
+        'schema': schema,
+        'fullName': f'[{schema}].[{name}]',
+        'connectionType': 'snowflake',
+    }
+
+
+def _page(connection_name: str, nodes: List[dict], end: int, total: int) -> Dict[str, Any]:
+    has_next_page = end < total
+
+    return {
+        connection_name: {
+            'nodes': nodes,
+            'pageInfo': {
+                'hasNextPage': has_next_page,
+                'endCursor': str(end) if has_next_page else None,
+            },
+        }
+    }
@@ -0,0 +1,312 @@
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import click
+
+from benchmarks.generators import (
+    SyntheticTableauClient,
+    SyntheticTableauSite,
+    generate_manifest,
+    materialized_names,
+)
+from exposurescrawler.crawlers.tableau import (
+    DEFAULT_QUERY_MEMO_SIZE,
+    _merge_workbooks_models,
+    _parse_tables_from_sql,
+    _should_ignore_workbook,
+)
+from exposurescrawler.dbt.exposure import DbtExposure
+from exposurescrawler.dbt.manifest import DbtManifest
+from exposurescrawler.tableau.graphql_client import (
+    DEFAULT_PAGE_SIZE,
+    retrieve_custom_sql,
+    retrieve_native_sql,
+)
+from exposurescrawler.utils import serialization
+from exposurescrawler.utils.logger import logger
+from exposurescrawler.utils.query_parsing import ModelIndex, ParallelModelIndex, QueryMemo
+
+"""
+Benchmarks the stages of the Tableau crawler against synthetic inputs (see `generators.py`),
+without any network calls, recording how long each stage takes and its peak memory.
+
+Results are written as JSON, and can be compared against the results of another commit with
+`--baseline`.
+"""
+
+# Preset sizes: models, sources, workbooks and custom SQLs
+PRESETS = {
+    'small': (1_000, 200, 1_000, 2_000),
+    'medium': (10_000, 2_000, 10_000, 20_000),
+    'large': (50_000, 10_000, 100_000, 100_000),
+}
+
+
+class StageTimer:
+    """
+    Records the duration and the peak memory (allocated by Python, as traced by `tracemalloc`)
+    of each stage. Tracing memory makes everything slower, so it can be disabled when only
+    timings are compared.
+    """
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self.trace_memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            result: Dict[str, Any] = {'seconds': round(time.perf_counter() - start, 6)}
+
+            if self.trace_memory:
+                result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+            self.stages[name] = result
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, check=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _max_rss_bytes() -> int:
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Reported in bytes on macOS, and in kilobytes on Linux
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def run_benchmark(
+    nodes: int,
+    sources: int,
+    workbooks: int,
+    custom_sqls: int,
+    duplication: float = 0.5,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    lazy_manifest: bool = False,
+    compact_output: bool = False,
+    trace_memory: bool = True,
+    workers: int = 1,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Generates the inputs and runs the stages of the crawler on them, in the same order as
+    `tableau_crawler()` does.
+
+    :return: the parameters, the results of every stage and the environment
+    """
+    timer = StageTimer(trace_memory)
+
+    # Used to build the URLs of the exposures
+    os.environ.setdefault('TABLEAU_URL', 'https://tableau.example.com')
+
+    with tempfile.TemporaryDirectory() as folder:
+        manifest_path = os.path.join(folder, 'manifest.json')
+        generated = generate_manifest(nodes, sources, seed)
+
+        with open(manifest_path, 'wb') as file:
+            file.write(serialization.dumps(generated))
+
+        manifest_size = os.path.getsize(manifest_path)
+        site = SyntheticTableauSite(
+            materialized_names(generated), workbooks, custom_sqls, duplication, seed=seed
+        )
+        client = SyntheticTableauClient(site)
+        del generated
+
+        with timer.stage('manifest_load'):
+            manifest = DbtManifest.from_file(manifest_path, lazy=lazy_manifest)
+
+        with timer.stage('retrieve_models_and_sources'):
+            models = manifest.retrieve_models_and_sources()
+
+        with timer.stage('build_index'):
+            model_index = ParallelModelIndex(models, workers) if workers > 1 else ModelIndex(models)
+            query_memo = QueryMemo(model_index, DEFAULT_QUERY_MEMO_SIZE)
+
+        with timer.stage('parse_custom_sql'):
+            custom_sql_models = _parse_tables_from_sql(
+                retrieve_custom_sql(client, ['snowflake'], page_size), query_memo  # type: ignore
+            )
+
+        with timer.stage('parse_native_sql'):
+            native_sql_models = _parse_tables_from_sql(
+                retrieve_native_sql(client, ['snowflake'], page_size), query_memo  # type: ignore
+            )
+
+        if isinstance(model_index, ParallelModelIndex):
+            model_index.close()
+
+        with timer.stage('merge'):
+            workbooks_models = _merge_workbooks_models(custom_sql_models, native_sql_models)
+
+        with timer.stage('build_exposures'):
+            for workbook_reference, found in workbooks_models.items():
+                workbook = client.retrieve_workbook(workbook_reference.id)
+                owner = client.retrieve_user(workbook.owner_id)
+
+                if _should_ignore_workbook(workbook, []):
+                    continue
+
+                exposure = DbtExposure.from_tableau_workbook('benchmark', workbook, owner, found)
+                manifest.add_exposure(exposure, found)
+
+        with timer.stage('save'):
+            manifest.save(manifest_path, compact=compact_output)
+
+    return {
+        'revision': _git_revision(),
+        'parameters': {
+            'nodes': nodes,
+            'sources': sources,
+            'workbooks': workbooks,
+            'custom_sqls': custom_sqls,
+            'duplication': duplication,
+            'page_size': page_size,
+            'lazy_manifest': lazy_manifest,
+            'compact_output': compact_output,
+            'workers': workers,
+            'seed': seed,
+        },
+        'manifest_size_bytes': manifest_size,
+        'matched_workbooks': len(workbooks_models),
+        'memo_hit_rate': round(query_memo.hit_rate, 4),
+        'stages': timer.stages,
+        'total_seconds': round(sum(stage['seconds'] for stage in timer.stages.values()), 6),
+        'max_rss_bytes': _max_rss_bytes(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'json_backend': serialization.DEFAULT_BACKEND,
+        },
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> str:
+    """
+    :return: a table with the duration of each stage on both results, and how it changed
+    """
+    lines = [f'{"stage":<30} {"baseline":>10} {"current":>10} {"change":>8}']
+
+    for name, stage in results['stages'].items():
+        before = baseline['stages'].get(name, {}).get('seconds')
+
+        if not before:
+            lines.append(f'{name:<30} {"-":>10} {stage["seconds"]:>10.3f} {"-":>8}')
+            continue
+
+        change = stage['seconds'] / before - 1
+        lines.append(f'{name:<30} {before:>10.3f} {stage["seconds"]:>10.3f} {change:>+8.1%}')
+
+    return '\n'.join(lines)
+
+
+@click.command()
+@click.option(
+    '--preset',
+    type=click.Choice(list(PRESETS)),
+    default='small',
+    show_default=True,
+    help='The size of the generated inputs, overridden by the options below',
+)
+@click.option('--nodes', type=click.IntRange(min=1), help='How many models to generate')
+@click.option('--sources', type=click.IntRange(min=0), help='How many sources to generate')
+@click.option('--workbooks', type=click.IntRange(min=1), help='How many workbooks to generate')
+@click.option('--custom-sqls', type=click.IntRange(min=1), help='How many custom SQLs to generate')
+@click.option(
+    '--duplication',
+    type=click.FloatRange(min=0, max=1),
+    default=0.5,
+    show_default=True,
+    help='The fraction of custom SQLs that are copies of another one',
+)
+@click.option('--page-size', type=click.IntRange(min=1), default=DEFAULT_PAGE_SIZE)
+@click.option('--lazy-manifest', is_flag=True, default=False)
+@click.option('--compact-output', is_flag=True, default=False)
+@click.option(
+    '--trace-memory/--no-trace-memory',
+    default=True,
+    show_default=True,
+    help='Whether to record the peak memory of each stage, which slows all stages down',
+)
+@click.option('--workers', type=click.IntRange(min=1), default=1, show_default=True)
+@click.option('--seed', type=int, default=0, show_default=True)
+@click.option('--output', metavar='PATH', help='Where to write the results to, as JSON')
+@click.option(
+    '--baseline',
+    metavar='PATH',
+    type=click.Path(exists=True, dir_okay=False),
+    help='Results of a previous run to compare against',
+)
+def benchmark_command(
+    preset: str,
+    nodes: Optional[int],
+    sources: Optional[int],
+    workbooks: Optional[int],
+    custom_sqls: Optional[int],
+    duplication: float,
+    page_size: int,
+    lazy_manifest: bool,
+    compact_output: bool,
+    trace_memory: bool,
+    workers: int,
+    seed: int,
+    output: Optional[str],
+    baseline: Optional[str],
+):
+    # The crawler logs every workbook, which would be measured as well
+    logger().setLevel(logging.WARNING)
+
+    preset_nodes, preset_sources, preset_workbooks, preset_custom_sqls = PRESETS[preset]
+
+    results = run_benchmark(
+        nodes or preset_nodes,
+        preset_sources if sources is None else sources,
+        workbooks or preset_workbooks,
+        custom_sqls or preset_custom_sqls,
+        duplication=duplication,
+        page_size=page_size,
+        lazy_manifest=lazy_manifest,
+        compact_output=compact_output,
+        trace_memory=trace_memory,
+        workers=workers,
+        seed=seed,
+    )
+
+    serialized = json.dumps(results, indent=4)
+
+    if output:
+        with open(output, 'w') as file:
+            file.write(serialized + '\n')
+    else:
+        click.echo(serialized)
+
+    if baseline:
+        with open(baseline) as file:
+            click.echo(compare(results, json.load(file)), err=True)
+
+
+if __name__ == '__main__':
+    benchmark_command()
@@ -24,17 +24,26 @@ setup(
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.10',
         'Programming Language :: Python :: 3 :: Only',
     ],
     package_dir={'': 'src'},
     packages=find_packages(where='src'),
     package_data={'exposurescrawler': ['**/*.txt']},
-    python_requires='>=3.8, <4',
+    python_requires='>=3.10, <4',
     setup_requires=['wheel', 'setuptools_scm'],
     install_requires=[
         'click ~= 8.0.1',
         'python-slugify ~= 4.0.1',
-        'tableauserverclient ~= 0.10',
+        'requests ~= 2.32',
+        'tableauserverclient ~= 0.41',
     ],
+    entry_points={
+        'console_scripts': ['dbt-exposures-crawler = exposurescrawler.cli:main'],
+    },
+    extras_require={
+        # Faster JSON (de)serialization of the manifest
+        'orjson': ['orjson >= 3.0'],
+        'ujson': ['ujson >= 5.0'],
+    },
 )
@@ -0,0 +1,66 @@
+import importlib
+from typing import List, Optional
+
+import click
+
+"""
+The `dbt-exposures-crawler` command (the console script installed with the package), which
+groups all the commands of the crawler, e.g.:
+
+    dbt-exposures-crawler tableau --manifest-path=manifest.json --dbt-package-name=my_package
+
+Each command is only imported once it is run, so the command line starts fast (e.g. for
+--help) and only pays for the dependencies of the command run.
+"""
+
+# The name of every command, where it is and what it does (shown on --help, without importing it)
+_COMMANDS = {
+    'tableau': (
+        'exposurescrawler.crawlers.tableau:tableau_crawler_command',
+        'Crawl Tableau and add the exposures to the manifest',
+    ),
+    'tableau-watch': (
+        'exposurescrawler.crawlers.tableau_watch:tableau_watch_command',
+        'Apply the exposures again every time the manifest changes',
+    ),
+    'tableau-merge': (
+        'exposurescrawler.crawlers.tableau_merge:tableau_merge_command',
+        'Merge the results of a sharded crawl into the manifest',
+    ),
+    'impact': (
+        'exposurescrawler.dbt.impact_index:impact_command',
+        'Look up which workbooks use which models on the impact index',
+    ),
+    'apply-patch': (
+        'exposurescrawler.dbt.manifest_patch:apply_patch_command',
+        'Apply a patch written by the crawler to the manifest',
+    ),
+}
+
+
+class _LazyGroup(click.Group):
+    def list_commands(self, context: click.Context) -> List[str]:
+        return list(_COMMANDS)
+
+    def get_command(self, context: click.Context, name: str) -> Optional[click.Command]:
+        if name not in _COMMANDS:
+            return None
+
+        module_name, attribute = _COMMANDS[name][0].split(':')
+
+        return getattr(importlib.import_module(module_name), attribute)
+
+    def format_commands(self, context: click.Context, formatter: click.HelpFormatter) -> None:
+        with formatter.section('Commands'):
+            formatter.write_dl([(name, help) for name, (_, help) in _COMMANDS.items()])
+
+
+@click.group(cls=_LazyGroup)
+def main():
+    """
+    Extracts information from different systems and convert them to dbt exposures.
+    """
+
+
+if __name__ == '__main__':
+    main()
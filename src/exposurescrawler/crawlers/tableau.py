@@ -1,20 +1,75 @@
 import itertools
 import logging
+import math
 import os
-from typing import Collection, List
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Collection,
+    ContextManager,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+)
 
 import click
 
 from exposurescrawler.dbt.exposure import DbtExposure
+from exposurescrawler.dbt.impact_index import ExposureRecord, ImpactIndex, exposure_record
 from exposurescrawler.dbt.manifest import DbtManifest
-from exposurescrawler.tableau.graphql_client import (
-    retrieve_custom_sql,
-    retrieve_native_sql,
+from exposurescrawler.dbt.manifest_patch import build_patch, read_patch, write_patch
+from exposurescrawler.dbt.models import ModelRecord
+from exposurescrawler.tableau.graphql_client import retrieve_custom_sql, retrieve_native_sql
+from exposurescrawler.tableau.cache import CrawlCache, models_fingerprint
+from exposurescrawler.tableau.checkpoint import (
+    STAGE_USERS,
+    STAGE_WORKBOOKS,
+    CrawlCheckpoint,
+    crawl_fingerprint,
+)
+from exposurescrawler.tableau.defaults import (
+    DEFAULT_CONNECTION_TYPES,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_PAGE_SIZE,
+    DEFAULT_TOKEN_TTL,
+    REST_API_PAGE_SIZE,
 )
-from exposurescrawler.tableau.models import WorkbookModelsMapping
-from exposurescrawler.tableau.rest_client import TableauRestClient
+from exposurescrawler.tableau.models import SqlQuery, WorkbookModelsMapping, WorkbookReference
+from exposurescrawler.tableau.shards import Shard, parse_shard, shard_pages, write_shard
+from exposurescrawler.tableau.sites import TableauSite, load_sites, site_from_environment
 from exposurescrawler.utils.logger import logger
-from exposurescrawler.utils.query_parsing import search_model_in_query
+from exposurescrawler.utils.metrics import metrics
+from exposurescrawler.utils.query_parsing import ModelIndex, ParallelModelIndex, QueryMemo
+
+# The Tableau client (and its dependencies) is only imported once a crawl starts, so the command
+# line starts fast (e.g. for --help)
+if TYPE_CHECKING:
+    from exposurescrawler.tableau.rest_client import TableauRestClient
+
+# How the metadata of workbooks and their owners is retrieved from the Tableau REST API
+LOOKUP_MODE_AUTO = 'auto'
+LOOKUP_MODE_BULK = 'bulk'
+LOOKUP_MODE_TARGETED = 'targeted'
+LOOKUP_MODES = (LOOKUP_MODE_AUTO, LOOKUP_MODE_BULK, LOOKUP_MODE_TARGETED)
+
+# How many distinct queries are memoized in memory
+DEFAULT_QUERY_MEMO_SIZE = 100_000
+
+# Where the SQLs come from, used as keys on the crawl cache
+SOURCE_CUSTOM_SQL = 'custom_sql'
+SOURCE_NATIVE_SQL = 'native_sql'
+
+T = TypeVar('T')
 
 
 def _should_ignore_workbook(workbook, projects_to_ignore: Collection[str]) -> bool:
@@ -27,45 +82,176 @@ def _should_ignore_workbook(workbook, projects_to_ignore: Collection[str]) -> bo
     return workbook.project_name in projects_to_ignore
 
 
-def _parse_tables_from_sql(workbooks_sqls: WorkbookModelsMapping, models) -> WorkbookModelsMapping:
+def _search_models(
+    workbooks_sqls: Mapping[WorkbookReference, Sequence[SqlQuery]], query_memo: QueryMemo
+) -> Dict[WorkbookReference, List[ModelRecord]]:
     """
-    Receives a map of workbook (references) and their respective SQLs (list), and look
-    for occurrences of `models` in the SQLs.
-
-    :param workbooks_sqls: map of workbook (references) to SQLs
-    :param models: the node dict coming from the manifest.json
+    Searches the SQLs of all given workbooks at once, so they can be searched in parallel.
 
-    :return: another map, but instead of workbooks to SQLs, it
-             has workbooks to models
+    :return: for each workbook, a list of the records of the dbt models found
     """
-    logger().info('⚙️ Parsing SQL: looking for references to models')
+    sqls = [sql for workbook_sqls in workbooks_sqls.values() for sql in workbook_sqls]
+    models_found = iter(
+        query_memo.search_many([(sql.query, sql.database, sql.schema) for sql in sqls])
+    )
 
-    output: WorkbookModelsMapping = {}
-    for workbook_reference, custom_sqls in workbooks_sqls.items():
-        # a list of dbt model represented as their original dicts from the manifest
-        all_found: List[dict] = []
+    output: Dict[WorkbookReference, List[ModelRecord]] = {}
+
+    for workbook_reference, workbook_sqls in workbooks_sqls.items():
+        # Each model only once per workbook, even if used by many of its SQLs
+        all_found: Dict[ModelRecord, None] = {}
+
+        for _ in workbook_sqls:
+            all_found.update(dict.fromkeys(next(models_found).values()))
+
+        output[workbook_reference] = list(all_found)
+        metrics().increment('model_matches', len(all_found))
 
-        for custom_sql in custom_sqls:
-            if models_found_query := search_model_in_query(custom_sql, models):
-                all_found.extend(models_found_query.values())
+    metrics().increment('sql_queries_scanned', len(sqls))
 
+    return output
+
+
+def _add_models_found(
+    output: WorkbookModelsMapping,
+    models_found: Mapping[WorkbookReference, Sequence[ModelRecord]],
+) -> None:
+    for workbook_reference, all_found in models_found.items():
         if all_found:
             logger().debug(
                 ' ✅ {}: found models {}'.format(
                     workbook_reference.name,
-                    [model['materialized_name'] for model in all_found],
+                    [model.materialized_name for model in all_found],
                 )
             )
 
-            output[workbook_reference] = all_found
+            output.setdefault(workbook_reference, []).extend(all_found)
         else:
             logger().debug(f' ❌ {workbook_reference.name}: found no models')
 
+
+def _search_page(
+    to_parse: WorkbookModelsMapping,
+    query_memo: QueryMemo,
+    checkpoint: Optional[CrawlCheckpoint],
+    source: str,
+    number: int,
+) -> Mapping[WorkbookReference, Sequence[ModelRecord]]:
+    """
+    Searches the SQLs of the workbooks of a page, unless the models found on them were
+    checkpointed by a previous run, and checkpoints the models found.
+    """
+    restored = checkpoint.get_matches(source, number) if checkpoint else None
+
+    if restored is not None and all(reference in restored for reference in to_parse):
+        return {reference: restored[reference] for reference in to_parse}
+
+    models_found = _search_models(to_parse, query_memo)
+
+    if checkpoint:
+        checkpoint.set_matches(source, number, models_found)  # type: ignore
+
+    return models_found
+
+
+def _parse_tables_from_sql(
+    workbooks_sqls_pages: Iterable[WorkbookModelsMapping],
+    query_memo: QueryMemo,
+    cache: Optional[CrawlCache] = None,
+    source: str = '',
+    checkpoint: Optional[CrawlCheckpoint] = None,
+) -> WorkbookModelsMapping:
+    """
+    Receives pages of maps of workbook (references) and their respective SQLs (list), and look
+    for occurrences of the models known by `query_memo` in the SQLs.
+
+    Pages are consumed one at a time, so only the SQLs of the current page are kept in memory.
+
+    If a `cache` is given, workbooks that have not changed since the last crawl reuse the
+    models found back then (for the same `source`) instead of being parsed again. The workbooks
+    parsed are cached along with the keys of their SQLs on `query_memo`, which is flushed first.
+
+    :param workbooks_sqls_pages: pages of maps of workbook (references) to SQLs
+    :param query_memo: memo (around the index built from the models and sources of the
+                       manifest.json) used to search for models in the SQLs
+    :param cache: the crawl cache, if incremental crawls are enabled
+    :param source: where the SQLs come from (custom or native SQL), used as key on the cache
+    :param checkpoint: the checkpoint of the crawl, where the models found on every page are
+                       checkpointed (and restored from, when resuming)
+
+    :return: another map, but instead of workbooks to SQLs, it
+             has workbooks to models
+    """
+    logger().info('⚙️ Parsing SQL: looking for references to models')
+
+    output: WorkbookModelsMapping = {}
+
+    # Workbooks restored from the cache, and workbooks parsed again (which will be cached)
+    cached: Set[str] = set()
+    parsed: Dict[str, WorkbookReference] = {}
+    parsed_queries: Dict[str, List[str]] = {}
+
+    # Includes retrieving the pages, which happens while they are consumed
+    with metrics().span(f'parse_sql.{source}'):
+        for number, workbooks_sqls in enumerate(workbooks_sqls_pages):
+            # The workbooks of the page that are not cached, parsed all at once
+            to_parse: WorkbookModelsMapping = {}
+
+            for workbook_reference, custom_sqls in workbooks_sqls.items():
+                if workbook_reference.id in cached:
+                    continue
+
+                if cache and workbook_reference.id not in parsed:
+                    found_names = cache.get_found(
+                        workbook_reference.id, source, workbook_reference.updated_at
+                    )
+
+                    if found_names is not None:
+                        cached.add(workbook_reference.id)
+
+                        if found_names:
+                            output[workbook_reference] = [
+                                query_memo.models[name] for name in found_names
+                            ]
+                        continue
+
+                parsed[workbook_reference.id] = workbook_reference
+                to_parse[workbook_reference] = custom_sqls
+
+                if cache:
+                    parsed_queries.setdefault(workbook_reference.id, []).extend(
+                        query_memo.key(sql.query, sql.database, sql.schema) for sql in custom_sqls
+                    )
+
+            if to_parse:
+                _add_models_found(
+                    output, _search_page(to_parse, query_memo, checkpoint, source, number)
+                )
+
+    metrics().increment('workbooks_parsed', len(parsed))
+
+    if cache:
+        logger().info(f'⚙️ Reused the cached models of {len(cached)} unchanged workbooks')
+        metrics().increment('crawl_cache_workbook_hits', len(cached))
+
+        # The SQLs first, or the workbooks using them would be dropped from the cache
+        query_memo.flush()
+        cache.set_found(
+            (
+                workbook_reference.id,
+                source,
+                workbook_reference.updated_at,
+                [model.materialized_name for model in output.get(workbook_reference, [])],
+                parsed_queries[workbook_reference.id],
+            )
+            for workbook_reference in parsed.values()
+        )
+
     logger().info(f'⚙️ Found {len(output.keys())} workbooks with linked models')
     return output
 
 
-def retrieve_all_workbook_owner_map(tableau_client: TableauRestClient):
+def retrieve_all_workbook_owner_map(tableau_client: 'TableauRestClient'):
     """
 
     :param tableau_client: Tableau rest client
@@ -78,7 +264,7 @@ def retrieve_all_workbook_owner_map(tableau_client: TableauRestClient):
     return dict((workbook.id, workbook) for workbook in all_workbooks)
 
 
-def retrieve_all_user_id_map(tableau_client: TableauRestClient):
+def retrieve_all_user_id_map(tableau_client: 'TableauRestClient'):
     """
 
     :param tableau_client: Tableau rest client
@@ -92,41 +278,276 @@ def retrieve_all_user_id_map(tableau_client: TableauRestClient):
     return dict((user.id, user) for user in all_users)
 
 
-def tableau_crawler(
-        manifest_path: str,
-        dbt_package_name: str,
-        tableau_projects_to_ignore: Collection[str],
-        verbose: bool,
-) -> None:
-    # Enable verbose logging
-    if verbose:
-        logger().setLevel(logging.DEBUG)
+def retrieve_workbook_owner_map(
+    tableau_client: 'TableauRestClient', workbook_ids: Collection[str], executor: Executor
+):
+    """
+    Retrieves only the given workbooks, one request per workbook (run on `executor`).
 
-    # Parse arguments
-    manifest_path = os.path.expandvars(manifest_path)
-    manifest_path = os.path.expanduser(manifest_path)
+    :param tableau_client: Tableau rest client
+    :param workbook_ids: the ids of the workbooks to retrieve
+    :param executor: executor running the requests concurrently
+    :return: the dictionary of {workbook_id, WorkbookItem}
+    """
+    logger().info(f'⚙️ Retrieving {len(workbook_ids)} workbooks (targeted)')
 
-    # Parse the dbt manifest JSON file
-    manifest: DbtManifest = DbtManifest.from_file(manifest_path)
+    workbooks = list(executor.map(tableau_client.retrieve_workbook, workbook_ids))
+    logger().info(f'✅ Fetched {len(workbooks)} workbooks')
+    return dict((workbook.id, workbook) for workbook in workbooks)
 
-    # Retrieve all models
-    models = manifest.retrieve_models_and_sources()
 
-    # Configure the Tableau REST client
-    tableau_client = TableauRestClient(
-        os.environ['TABLEAU_URL'],
-        os.environ['TABLEAU_USERNAME'],
-        os.environ['TABLEAU_PASSWORD'],
+def retrieve_user_id_map(
+    tableau_client: 'TableauRestClient', user_ids: Collection[str], executor: Executor
+):
+    """
+    Retrieves only the given users, one request per user (run on `executor`).
+
+    :param tableau_client: Tableau rest client
+    :param user_ids: the ids of the users to retrieve
+    :param executor: executor running the requests concurrently
+    :return: the dictionary of {user_id, UserItem}
+    """
+    logger().info(f'⚙️ Retrieving {len(user_ids)} users (targeted)')
+
+    users = list(executor.map(tableau_client.retrieve_user, user_ids))
+    logger().info(f'⚙️ Fetched {len(users)} users')
+
+    return dict((user.id, user) for user in users)
+
+
+def _count_site(tableau_client: 'TableauRestClient') -> Tuple[int, int]:
+    return tableau_client.count_workbooks(), tableau_client.count_users()
+
+
+def _choose_lookup_mode(
+    matched_workbooks: int, site_size: Tuple[int, int], max_concurrency: int
+) -> str:
+    """
+    Bulk mode lists all workbooks and users page by page, while targeted mode does one
+    request per matched workbook and per owner, but concurrently. Chooses whichever takes the
+    fewest rounds of requests, assuming (at worst) one distinct owner per workbook.
+    """
+    total_workbooks, total_users = site_size
+
+    bulk_rounds = math.ceil(total_workbooks / REST_API_PAGE_SIZE) + math.ceil(
+        total_users / REST_API_PAGE_SIZE
+    )
+    targeted_rounds = math.ceil(2 * matched_workbooks / max_concurrency)
+
+    lookup_mode = LOOKUP_MODE_TARGETED if targeted_rounds < bulk_rounds else LOOKUP_MODE_BULK
+    logger().info(
+        f'⚙️ {matched_workbooks} of {total_workbooks} workbooks matched: '
+        f'using {lookup_mode} lookups'
+    )
+
+    return lookup_mode
+
+
+def _checkpointed(
+    checkpoint: Optional[CrawlCheckpoint], stage: str, retrieve: Callable[..., T], *args: Any
+) -> T:
+    """
+    Runs a stage (`retrieve`, with `args`) and checkpoints its result, unless the stage was
+    completed by a previous run, in which case its result is restored from the checkpoint.
+    """
+    if checkpoint:
+        restored = checkpoint.get_stage(stage)
+
+        if restored is not None:
+            logger().info(f'⏯️ Restored {len(restored)} {stage} from the checkpoint')
+            metrics().increment('checkpoint_stages_restored')
+            return restored  # type: ignore
+
+    result = retrieve(*args)
+
+    if checkpoint:
+        checkpoint.set_stage(stage, result)  # type: ignore
+
+    return result
+
+
+def _retrieve_metadata_targeted(
+    tableau_client: 'TableauRestClient',
+    updated_ats: Dict[str, Optional[str]],
+    executor: Executor,
+    cache: Optional[CrawlCache],
+    checkpoint: Optional[CrawlCheckpoint] = None,
+) -> Tuple[dict, dict]:
+    """
+    Retrieves the given workbooks and their owners, except for the workbooks (and owners)
+    that are cached and have not changed since.
+
+    :param updated_ats: map of the workbook ids to retrieve to when they were last updated
+    :return: the map of workbooks and the map of users
+    """
+    cached_workbooks = cache.get_workbooks(updated_ats) if cache else {}
+    workbook_ids = [luid for luid in updated_ats.keys() if luid not in cached_workbooks]
+    metrics().increment('crawl_cache_workbook_metadata_hits', len(cached_workbooks))
+
+    workbook_owner_map = _checkpointed(
+        checkpoint,
+        STAGE_WORKBOOKS,
+        retrieve_workbook_owner_map,
+        tableau_client,
+        workbook_ids,
+        executor,
     )
 
-    # Retrieve custom SQLs and find model references
-    workbooks_custom_sqls = retrieve_custom_sql(tableau_client, 'snowflake')
-    workbooks_custom_sql_models = _parse_tables_from_sql(workbooks_custom_sqls, models)
+    # The owners of workbooks that have changed are retrieved again
+    owner_ids = set(workbook.owner_id for workbook in workbook_owner_map.values())
+    cached_owner_ids = set(workbook.owner_id for workbook in cached_workbooks.values())
+    cached_users = cache.get_users(cached_owner_ids - owner_ids) if cache else {}
+    owner_ids.update(cached_owner_ids - cached_users.keys())
+
+    user_userid_map = _checkpointed(
+        checkpoint, STAGE_USERS, retrieve_user_id_map, tableau_client, owner_ids, executor
+    )
+
+    if cache:
+        cache.set_workbooks(workbook_owner_map.values(), updated_ats)
+        cache.set_users(user_userid_map.values())
+
+    return {**cached_workbooks, **workbook_owner_map}, {**cached_users, **user_userid_map}
+
+
+def _fetch_concurrently(
+    tableau_client: 'TableauRestClient',
+    query_memo: QueryMemo,
+    page_size: int,
+    max_concurrency: int,
+    lookup_mode: str,
+    cache: Optional[CrawlCache] = None,
+    connection_types: Collection[str] = DEFAULT_CONNECTION_TYPES,
+    checkpoint: Optional[CrawlCheckpoint] = None,
+    shard: Optional[Shard] = None,
+) -> Tuple[WorkbookModelsMapping, WorkbookModelsMapping, dict, dict]:
+    """
+    The custom SQLs, native SQLs, workbooks and users are independent from each other, so
+    they are retrieved (and the SQLs parsed) at the same time, on up to `max_concurrency`
+    threads. The total time is then close to the time of the slowest call. The SQLs of all
+    `connection_types` are retrieved at once.
 
-    # Retrieve native SQLs and find model references
-    workbooks_native_sqls = retrieve_native_sql(tableau_client, 'snowflake')
-    workbooks_native_sql_models = _parse_tables_from_sql(workbooks_native_sqls, models)
+    In targeted mode, only the workbooks that reference models (and their owners) are
+    retrieved, once the SQLs have been parsed, and skipping the ones on the `cache` that have
+    not changed since. In auto mode, targeted mode is used if it is expected to be faster than
+    bulk mode, given how many workbooks and users the site has.
+
+    With a `checkpoint`, every page of SQLs, the models found on it and the workbooks and users
+    are checkpointed, and the ones completed by a previous run are restored instead.
+
+    With a `shard`, only the workbooks of the shard are searched and looked up.
+
+    :return: the workbooks with models found on custom SQL, the workbooks with models found
+             on native SQL, the map of workbooks and the map of users
+    """
+    # Sign in before starting, so all threads share the same session
+    tableau_client.sign_in()
+
+    # The stages checkpointed on targeted mode only hold the workbooks (and owners) that were
+    # not cached, so they are resumed on the mode chosen by the previous run
+    if lookup_mode == LOOKUP_MODE_AUTO and checkpoint:
+        lookup_mode = checkpoint.get_lookup_mode() or LOOKUP_MODE_AUTO
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        custom_sql_future = executor.submit(
+            lambda: _parse_tables_from_sql(
+                shard_pages(
+                    retrieve_custom_sql(tableau_client, connection_types, page_size, checkpoint),
+                    shard,
+                ),
+                query_memo,
+                cache,
+                SOURCE_CUSTOM_SQL,
+                checkpoint,
+            )
+        )
+        native_sql_future = executor.submit(
+            lambda: _parse_tables_from_sql(
+                shard_pages(
+                    retrieve_native_sql(tableau_client, connection_types, page_size, checkpoint),
+                    shard,
+                ),
+                query_memo,
+                cache,
+                SOURCE_NATIVE_SQL,
+                checkpoint,
+            )
+        )
 
+        if lookup_mode == LOOKUP_MODE_AUTO:
+            site_size_future = executor.submit(_count_site, tableau_client)
+
+        if lookup_mode == LOOKUP_MODE_BULK:
+            workbooks_future = executor.submit(
+                _checkpointed,
+                checkpoint,
+                STAGE_WORKBOOKS,
+                retrieve_all_workbook_owner_map,
+                tableau_client,
+            )
+            users_future = executor.submit(
+                _checkpointed, checkpoint, STAGE_USERS, retrieve_all_user_id_map, tableau_client
+            )
+
+        workbooks_custom_sql_models = custom_sql_future.result()
+        workbooks_native_sql_models = native_sql_future.result()
+
+        updated_ats = dict(
+            (workbook_reference.id, workbook_reference.updated_at)
+            for workbook_reference in itertools.chain(
+                workbooks_custom_sql_models.keys(), workbooks_native_sql_models.keys()
+            )
+        )
+
+        if lookup_mode == LOOKUP_MODE_AUTO:
+            changed = len(updated_ats) - len(cache.get_workbooks(updated_ats) if cache else {})
+            lookup_mode = _choose_lookup_mode(changed, site_size_future.result(), max_concurrency)
+
+            if checkpoint:
+                checkpoint.set_lookup_mode(lookup_mode)
+
+            if lookup_mode == LOOKUP_MODE_BULK:
+                workbooks_future = executor.submit(
+                    _checkpointed,
+                    checkpoint,
+                    STAGE_WORKBOOKS,
+                    retrieve_all_workbook_owner_map,
+                    tableau_client,
+                )
+                users_future = executor.submit(
+                    _checkpointed,
+                    checkpoint,
+                    STAGE_USERS,
+                    retrieve_all_user_id_map,
+                    tableau_client,
+                )
+
+        if lookup_mode == LOOKUP_MODE_BULK:
+            workbook_owner_map = workbooks_future.result()
+            user_userid_map = users_future.result()
+
+            if cache:
+                cache.set_workbooks(
+                    (workbook_owner_map[id] for id in updated_ats if id in workbook_owner_map),
+                    updated_ats,
+                )
+        else:
+            workbook_owner_map, user_userid_map = _retrieve_metadata_targeted(
+                tableau_client, updated_ats, executor, cache, checkpoint
+            )
+
+        return (
+            workbooks_custom_sql_models,
+            workbooks_native_sql_models,
+            workbook_owner_map,
+            user_userid_map,
+        )
+
+
+def _merge_workbooks_models(
+    workbooks_custom_sql_models: WorkbookModelsMapping,
+    workbooks_native_sql_models: WorkbookModelsMapping,
+) -> WorkbookModelsMapping:
     # Merge the results by chaining the iterables
     # Here it is fine to have duplicates on the list
     # Duplicates will be handled in the DbtExposure class
@@ -146,30 +567,448 @@ def tableau_crawler(
         )
     )
 
+    return workbooks_models
+
+
+def _open_cache(
+    cache_path: Optional[str], models: Mapping[str, Any], connection_types: Collection[str]
+) -> ContextManager:
+    if not cache_path:
+        return nullcontext()
+
+    logger().info(f'🗄️ Using crawl cache: {cache_path}')
+    return CrawlCache(cache_path, models.keys(), connection_types)
+
+
+def _open_model_index(models: Mapping[str, Any], workers: int) -> ContextManager:
+    with metrics().span('build_index'):
+        if workers > 1:
+            logger().info(f'⚙️ Searching SQLs on {workers} worker processes')
+            return ParallelModelIndex(models, workers)
+
+        return nullcontext(ModelIndex(models))
+
+
+def _open_checkpoint(
+    state_dir: Optional[str], resume: bool, models: Mapping[str, Any], **crawl: Any
+) -> Optional[CrawlCheckpoint]:
+    """
+    :param crawl: what identifies the crawl, besides the models
+    """
+    if not state_dir:
+        return None
+
+    fingerprint = crawl_fingerprint(models=models_fingerprint(models.keys()), **crawl)
+    checkpoint = CrawlCheckpoint(state_dir, fingerprint, models, resume)
+
+    if checkpoint.resumed:
+        logger().info(f'⏯️ Resuming the crawl from the checkpoint on {state_dir}')
+    elif resume:
+        logger().info(f'⏯️ No checkpoint of the same crawl on {state_dir}, starting over')
+    else:
+        logger().info(f'💾 Checkpointing the crawl to {state_dir}')
+
+    return checkpoint
+
+
+def _write_metrics(
+    metrics_report_path: Optional[str], prometheus_textfile_path: Optional[str]
+) -> None:
+    if metrics_report_path:
+        logger().info(f'📈 Writing run report to file: {metrics_report_path}')
+        metrics().write_report(metrics_report_path)
+
+    if prometheus_textfile_path:
+        logger().info(f'📈 Writing Prometheus metrics to file: {prometheus_textfile_path}')
+        metrics().write_prometheus_textfile(prometheus_textfile_path)
+
+
+def _crawl_tableau(
+    tableau_client: 'TableauRestClient',
+    query_memo: QueryMemo,
+    page_size: int,
+    max_concurrency: int,
+    lookup_mode: str,
+    cache: Optional[CrawlCache],
+    connection_types: Collection[str],
+    checkpoint: Optional[CrawlCheckpoint] = None,
+    shard: Optional[Shard] = None,
+) -> Tuple[WorkbookModelsMapping, dict, dict]:
+    """
+    Retrieves the SQLs of the Tableau site and the models they reference, and the metadata of
+    the workbooks and their owners.
+
+    :return: the workbooks with models found (on custom or native SQL), the map of workbooks
+             and the map of users
+    """
     logger().info('')
-    logger().info('🌏 Retrieving workbooks and authors metadata from the Tableau REST API')
-
-    # Fetching all workbooks and users using Tableau batch API and keep in a dictionary.
-    workbook_owner_map = retrieve_all_workbook_owner_map(tableau_client)
-    user_userid_map = retrieve_all_user_id_map(tableau_client)
-
-    # For every workbook and the models found, create exposures and add
-    # to the manifest (in-memory)
-    for workbook_reference, found in workbooks_models.items():
-        workbook = workbook_owner_map[workbook_reference.id]
-        owner = user_userid_map[workbook.owner_id]
-        if _should_ignore_workbook(workbook, tableau_projects_to_ignore):
-            logger().debug(
-                f'⏩ Skipping workbook: {workbook.name} ({workbook.project_name} is ignored)'
+    logger().info(
+        '🌏 Retrieving SQLs from the Tableau Metadata API, and workbooks and authors '
+        'metadata from the Tableau REST API'
+    )
+
+    # Retrieve custom and native SQLs (and find model references), and fetch all workbooks
+    # and users using Tableau batch API, keeping them in dictionaries.
+    with metrics().span('fetch'):
+        (
+            workbooks_custom_sql_models,
+            workbooks_native_sql_models,
+            workbook_owner_map,
+            user_userid_map,
+        ) = _fetch_concurrently(
+            tableau_client,
+            query_memo,
+            page_size,
+            max_concurrency,
+            lookup_mode,
+            cache,
+            connection_types,
+            checkpoint,
+            shard,
+        )
+
+    # Persist the queries parsed on this run
+    query_memo.flush()
+
+    with metrics().span('merge'):
+        workbooks_models = _merge_workbooks_models(
+            workbooks_custom_sql_models, workbooks_native_sql_models
+        )
+
+    return workbooks_models, workbook_owner_map, user_userid_map
+
+
+def _add_exposures(
+    manifest: DbtManifest,
+    dbt_package_name: str,
+    tableau_projects_to_ignore: Collection[str],
+    workbooks_models: WorkbookModelsMapping,
+    workbook_owner_map: Mapping[str, Any],
+    user_userid_map: Mapping[str, Any],
+    site: Optional[TableauSite] = None,
+) -> List[ExposureRecord]:
+    """
+    For every workbook and the models found, creates an exposure and adds it to the manifest
+    (in-memory).
+
+    :param site: the site of the workbooks, by default the one configured on the environment
+    :return: the exposures added, as records of the impact index
+    """
+    added = []
+
+    with metrics().span('build_exposures'):
+        for workbook_reference, found in workbooks_models.items():
+            workbook = workbook_owner_map[workbook_reference.id]
+            owner = user_userid_map[workbook.owner_id]
+            if _should_ignore_workbook(workbook, tableau_projects_to_ignore):
+                logger().debug(
+                    f'⏩ Skipping workbook: {workbook.name} ({workbook.project_name} is ignored)'
+                )
+                continue
+
+            exposure = DbtExposure.from_tableau_workbook(
+                dbt_package_name,
+                workbook,
+                owner,
+                found,
+                tableau_url=site.url if site else None,
+                site_name=site.name if site else None,
             )
-            continue
+            manifest.add_exposure(exposure, found)
+            added.append(exposure_record(exposure, workbook, found, site.name if site else None))
+            metrics().increment('exposures')
+
+    return added
+
 
-        exposure = DbtExposure.from_tableau_workbook(dbt_package_name, workbook, owner, found)
-        manifest.add_exposure(exposure, found)
-    # Persist the modified manifest
+def _save_manifest(manifest: DbtManifest, manifest_path: str, compact_output: bool) -> None:
     logger().info('')
     logger().info(f'💾 Writing results to file: {manifest_path}')
-    manifest.save(manifest_path)
+
+    with metrics().span('save'):
+        manifest.save(manifest_path, compact=compact_output)
+
+
+def _save_patch(
+    manifest: DbtManifest, path: str, unique_ids: Iterable[str], compact_output: bool
+) -> None:
+    """
+    Writes only the exposures added to the manifest (see `manifest_patch.py`), and reports the
+    changes since the previous patch written to the same path.
+    """
+    logger().info('')
+    logger().info(f'🩹 Writing the changes to the manifest to file: {path}')
+
+    with metrics().span('save'):
+        patch = build_patch(manifest, unique_ids, read_patch(path))
+        write_patch(path, patch, compact=compact_output)
+
+    changes = patch['changes']
+    logger().info(
+        f'📝 Since the previous run, {len(changes["added"])} exposures were added, '
+        f'{len(changes["changed"])} changed and {len(changes["removed"])} removed'
+    )
+
+    for change, changed_ids in changes.items():
+        metrics().increment(f'exposures_{change}', len(changed_ids))
+
+
+def _update_impact_index(
+    path: Optional[str], sites_records: Iterable[Tuple[Optional[str], List[ExposureRecord]]]
+) -> None:
+    """
+    :param sites_records: the name of every site crawled and the exposures added for it
+    """
+    if not path:
+        return
+
+    logger().info(f'🔎 Updating the impact index: {path}')
+
+    with metrics().span('impact_index'), ImpactIndex(path) as impact_index:
+        for site_name, records in sites_records:
+            written, removed = impact_index.update(site_name, records)
+            metrics().increment('impact_index_written', written)
+            metrics().increment('impact_index_removed', removed)
+
+
+def _save_shard(path: str, shard: Shard, sites_results: Sequence[Tuple[TableauSite, Any]]) -> None:
+    logger().info('')
+    logger().info(f'💾 Writing the results of shard {shard.index}/{shard.count} to file: {path}')
+
+    with metrics().span('save'):
+        write_shard(path, shard, sites_results)
+
+
+def _log_query_memo(query_memo: QueryMemo) -> None:
+    logger().info('')
+    logger().info(
+        '📊 Parsed {} distinct SQLs, reused {} ({:.1%} memo hit rate)'.format(
+            query_memo.misses, query_memo.hits, query_memo.hit_rate
+        )
+    )
+
+    metrics().increment('sql_queries_parsed', query_memo.misses)
+    metrics().increment('query_memo_hits', query_memo.hits)
+
+
+def _site_dir(directory: Optional[str], site: TableauSite) -> Optional[str]:
+    # Each of several sites keeps its own files, e.g. on the state or recording directories
+    return os.path.join(directory, site.name) if directory and site.name else directory
+
+
+def _crawl_site(
+    site: TableauSite,
+    query_memo: QueryMemo,
+    models: Mapping[str, Any],
+    cache: Optional[CrawlCache],
+    page_size: int,
+    max_concurrency: int,
+    lookup_mode: str,
+    connection_types: Collection[str],
+    state_dir: Optional[str],
+    resume: bool,
+    shard: Optional[Shard],
+    **client_options: Any,
+) -> Tuple[Optional[CrawlCheckpoint], Tuple[WorkbookModelsMapping, dict, dict]]:
+    """
+    Crawls a Tableau site on its own client: it signs in once, reuses the same session for all
+    the calls and signs out at the end.
+
+    :param client_options: the other options of `TableauRestClient`
+    :return: the checkpoint of the site (if any), and the results of `_crawl_tableau()`
+    """
+    from exposurescrawler.tableau.rest_client import TableauRestClient
+
+    if site.name:
+        logger().info(f'🌏 Crawling the {site.name} site: {site.url}')
+
+    with TableauRestClient(
+        site.url,
+        site.username,
+        site.password,
+        site=site.content_url,
+        max_concurrency=max_concurrency,
+        **client_options,
+    ) as tableau_client:
+        # What was retrieved and parsed is checkpointed, so a failed crawl can be resumed
+        checkpoint = _open_checkpoint(
+            _site_dir(state_dir, site),
+            resume,
+            models,
+            url=site.url,
+            site=site.content_url,
+            page_size=page_size,
+            lookup_mode=lookup_mode,
+            connection_types=sorted(connection_types),
+            shard=shard,
+        )
+
+        return checkpoint, _crawl_tableau(
+            tableau_client,
+            query_memo,
+            page_size,
+            max_concurrency,
+            lookup_mode,
+            cache,
+            connection_types,
+            checkpoint,
+            shard,
+        )
+
+
+def tableau_crawler(
+        manifest_path: str,
+        dbt_package_name: str,
+        tableau_projects_to_ignore: Collection[str],
+        verbose: bool,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        token_cache_path: Optional[str] = None,
+        token_ttl: int = DEFAULT_TOKEN_TTL,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        lookup_mode: str = LOOKUP_MODE_AUTO,
+        cache_path: Optional[str] = None,
+        query_memo_size: int = DEFAULT_QUERY_MEMO_SIZE,
+        compact_output: bool = False,
+        lazy_manifest: bool = False,
+        metrics_report_path: Optional[str] = None,
+        prometheus_textfile_path: Optional[str] = None,
+        workers: int = 1,
+        connection_types: Collection[str] = DEFAULT_CONNECTION_TYPES,
+        record_dir: Optional[str] = None,
+        replay_dir: Optional[str] = None,
+        rate_limit: Optional[float] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        state_dir: Optional[str] = None,
+        resume: bool = False,
+        sites: Optional[Sequence[TableauSite]] = None,
+        shard: Optional[Shard] = None,
+        shard_output_path: Optional[str] = None,
+        impact_index_path: Optional[str] = None,
+        patch_output_path: Optional[str] = None,
+) -> None:
+    """
+    :param sites: the Tableau sites to crawl, by default the one configured on the environment
+                  (see `sites.py`). They are crawled at the same time, and their exposures are
+                  all written to the manifest at once
+    :param shard: only crawl the workbooks of this shard (see `shards.py`), and write their
+                  partial results to `shard_output_path` instead of writing the manifest
+    :param impact_index_path: also update the impact index on this file (see `impact_index.py`)
+                              with the exposures of the sites crawled
+    :param patch_output_path: write only the exposures (and their edges on the parent and child
+                              maps) to this file, instead of writing the whole manifest again
+    """
+    # Enable verbose logging
+    if verbose:
+        logger().setLevel(logging.DEBUG)
+
+    # Every run is measured on its own
+    metrics().reset()
+
+    # Parse arguments
+    manifest_path = os.path.expandvars(manifest_path)
+    manifest_path = os.path.expanduser(manifest_path)
+
+    # Parse the dbt manifest JSON file
+    with metrics().span('manifest_load'):
+        manifest: DbtManifest = DbtManifest.from_file(manifest_path, lazy=lazy_manifest)
+
+    # Retrieve all models
+    with metrics().span('retrieve_models_and_sources'):
+        models = manifest.retrieve_models_and_sources()
+
+    sites = sites or [site_from_environment()]
+
+    # Build the index only once, since it is reused for every SQL (and shared by all sites)
+    with _open_model_index(models, workers) as model_index, _open_cache(
+        cache_path, models, connection_types
+    ) as cache:
+        # Identical SQLs (e.g. copy-pasted across workbooks or sites) are only parsed once
+        query_memo = QueryMemo(model_index, query_memo_size, cache)
+
+        # Each site on its own thread (and with its own session)
+        with ThreadPoolExecutor(max_workers=len(sites)) as executor:
+            futures = [
+                executor.submit(
+                    _crawl_site,
+                    site,
+                    query_memo,
+                    models,
+                    cache,
+                    page_size,
+                    max_concurrency,
+                    lookup_mode,
+                    connection_types,
+                    state_dir,
+                    resume,
+                    shard,
+                    token_cache_path=token_cache_path,
+                    token_ttl=token_ttl,
+                    record_dir=_site_dir(record_dir, site),
+                    replay_dir=_site_dir(replay_dir, site),
+                    rate_limit=rate_limit,
+                    max_retries=max_retries,
+                )
+                for site in sites
+            ]
+
+            results = [future.result() for future in futures]
+
+    sites_results = [(site, site_results) for site, (_, site_results) in zip(sites, results)]
+
+    if shard:
+        # The partial results of all shards are applied to the manifest by `tableau_merge`
+        _save_shard(shard_output_path, shard, sites_results)  # type: ignore
+    else:
+        sites_records = [
+            (
+                site.name,
+                _add_exposures(
+                    manifest, dbt_package_name, tableau_projects_to_ignore, *site_results, site
+                ),
+            )
+            for site, site_results in sites_results
+        ]
+
+        # Persist the modified manifest (or only what was modified), once for all sites
+        if patch_output_path:
+            unique_ids = [record.unique_id for _, records in sites_records for record in records]
+            _save_patch(manifest, patch_output_path, unique_ids, compact_output)
+        else:
+            _save_manifest(manifest, manifest_path, compact_output)
+
+        _update_impact_index(impact_index_path, sites_records)
+
+    # The crawl is complete, so there is nothing left to resume
+    for checkpoint, _ in results:
+        if checkpoint:
+            checkpoint.clear()
+
+    _log_query_memo(query_memo)
+    _write_metrics(metrics_report_path, prometheus_textfile_path)
+
+
+def _load_sites_option(
+    context: click.Context, parameter: click.Parameter, value: Optional[str]
+) -> Optional[List[TableauSite]]:
+    if not value:
+        return None
+
+    try:
+        return load_sites(value)
+    except (OSError, ValueError) as error:
+        raise click.BadParameter(f'{value}: {error}')
+
+
+def _parse_shard_option(
+    context: click.Context, parameter: click.Parameter, value: Optional[str]
+) -> Optional[Shard]:
+    if not value:
+        return None
+
+    try:
+        return parse_shard(value)
+    except ValueError as error:
+        raise click.BadParameter(str(error))
 
 
 @click.command()
@@ -192,14 +1031,260 @@ def tableau_crawler(
     default=[],
     help='The name of Tableau projects (folders) to ignore',
 )
+@click.option(
+    '--tableau-page-size',
+    'page_size',
+    default=DEFAULT_PAGE_SIZE,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help='The number of nodes requested per page from the Tableau Metadata API',
+)
+@click.option(
+    '--tableau-token-cache',
+    'token_cache_path',
+    default=None,
+    metavar='PATH',
+    help='A file where the Tableau authentication token is cached, so consecutive runs can '
+         'skip signing in',
+)
+@click.option(
+    '--tableau-token-ttl',
+    'token_ttl',
+    default=DEFAULT_TOKEN_TTL,
+    show_default=True,
+    type=click.IntRange(min=0),
+    metavar='SECONDS',
+    help='For how long a cached Tableau authentication token is reused',
+)
+@click.option(
+    '--max-concurrency',
+    default=DEFAULT_MAX_CONCURRENCY,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help='The maximum number of concurrent calls to the Tableau APIs. Fewer calls are made at '
+         'the same time while Tableau is overloaded',
+)
+@click.option(
+    '--tableau-rate-limit',
+    'rate_limit',
+    default=None,
+    type=click.FloatRange(min=0, min_open=True),
+    metavar='REQUESTS_PER_SECOND',
+    help='The maximum number of requests per second sent to Tableau. Unlimited by default',
+)
+@click.option(
+    '--tableau-max-retries',
+    'max_retries',
+    default=DEFAULT_MAX_RETRIES,
+    show_default=True,
+    type=click.IntRange(min=0),
+    help='How many times a request throttled (429) or failed with a transient error (5xx) '
+         'is retried, with backoff',
+)
+@click.option(
+    '--tableau-lookup-mode',
+    'lookup_mode',
+    default=LOOKUP_MODE_AUTO,
+    show_default=True,
+    type=click.Choice(LOOKUP_MODES),
+    help='Whether to retrieve all workbooks and users of the site (bulk), or only the workbooks '
+         'referencing models and their owners (targeted). Auto picks the fastest one',
+)
+@click.option(
+    '--cache-path',
+    default=None,
+    metavar='PATH',
+    help='A SQLite file where the models found on each workbook and the workbooks metadata are '
+         'cached, so the next runs only parse and look up the workbooks that have changed',
+)
+@click.option(
+    '--query-memo-size',
+    default=DEFAULT_QUERY_MEMO_SIZE,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help='How many distinct SQLs (and the models found on them) are memoized in memory. '
+         'With --cache-path, they are also persisted across runs',
+)
+@click.option(
+    '--compact-output',
+    is_flag=True,
+    default=False,
+    help='Write the manifest without indentation, which is faster and produces a smaller file',
+)
+@click.option(
+    '--lazy-manifest',
+    is_flag=True,
+    default=False,
+    help='Only decode the parts of the manifest used by the crawler, copying the rest as it is. '
+         'Uses much less memory on big manifests',
+)
+@click.option(
+    '--connection-types',
+    default=','.join(DEFAULT_CONNECTION_TYPES),
+    show_default=True,
+    callback=lambda context, parameter, value: tuple(
+        connection_type.strip() for connection_type in value.split(',') if connection_type.strip()
+    ),
+    help='Comma-separated types of the Tableau connections (e.g. snowflake,bigquery,postgres) '
+         'to look for models on. All of them are retrieved at once',
+)
+@click.option(
+    '--workers',
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help='How many processes search the SQLs for models. Useful on sites with many big custom '
+         'SQLs, since searching is CPU-bound',
+)
+@click.option(
+    '--metrics-report',
+    'metrics_report_path',
+    metavar='PATH',
+    help='Write a JSON report of how long each stage took, counters and the peak memory',
+)
+@click.option(
+    '--prometheus-textfile',
+    'prometheus_textfile_path',
+    metavar='PATH',
+    help='Write the same metrics for the textfile collector of the Prometheus node exporter',
+)
+@click.option(
+    '--record',
+    'record_dir',
+    metavar='DIR',
+    help='Record all responses from Tableau on this directory, so the crawl can be replayed',
+)
+@click.option(
+    '--replay',
+    'replay_dir',
+    metavar='DIR',
+    type=click.Path(exists=True, file_okay=False),
+    help='Replay the responses recorded on this directory instead of calling Tableau',
+)
+@click.option(
+    '--state-dir',
+    metavar='DIR',
+    help='Checkpoint every page of SQLs, the models found on them and the workbooks and users '
+         'retrieved on this directory, so a failed crawl can be resumed',
+)
+@click.option(
+    '--resume',
+    is_flag=True,
+    default=False,
+    help='Resume the crawl from the checkpoint on --state-dir, instead of starting over',
+)
+@click.option(
+    '--tableau-sites',
+    'sites',
+    metavar='PATH',
+    callback=_load_sites_option,
+    help='A JSON file listing several Tableau sites to crawl at the same time, instead of the '
+         'one configured on the environment',
+)
+@click.option(
+    '--shard',
+    metavar='I/N',
+    callback=_parse_shard_option,
+    help='Only crawl the I-th of N shards of the workbooks (partitioned by a hash of their id), '
+         'e.g. 1/4, so a crawl can be spread across machines. Requires --shard-output',
+)
+@click.option(
+    '--shard-output',
+    'shard_output_path',
+    metavar='PATH',
+    help='Where to write the partial results of the shard, instead of writing the manifest. '
+         'The results of all shards are applied to the manifest by tableau_merge',
+)
+@click.option(
+    '--impact-index',
+    'impact_index_path',
+    metavar='PATH',
+    help='A SQLite file indexing which workbooks use which models, updated with the exposures '
+         'of every crawl, for impact analysis (see impact_index)',
+)
+@click.option(
+    '--patch-output',
+    'patch_output_path',
+    metavar='PATH',
+    help='Write only the exposures and their lineage (a patch to apply with manifest_patch) to '
+         'this file, and the changes since the previous run, instead of writing the manifest',
+)
 @click.option('-v', '--verbose', is_flag=True, default=False, help='Enable verbose logging')
 def tableau_crawler_command(
         manifest_path: str,
         dbt_package_name: str,
         tableau_projects_to_ignore: Collection[str],
+        page_size: int,
+        token_cache_path: Optional[str],
+        token_ttl: int,
+        max_concurrency: int,
+        lookup_mode: str,
+        cache_path: Optional[str],
+        query_memo_size: int,
+        compact_output: bool,
+        lazy_manifest: bool,
+        metrics_report_path: Optional[str],
+        prometheus_textfile_path: Optional[str],
+        workers: int,
+        connection_types: Collection[str],
+        record_dir: Optional[str],
+        replay_dir: Optional[str],
+        rate_limit: Optional[float],
+        max_retries: int,
+        state_dir: Optional[str],
+        resume: bool,
+        sites: Optional[List[TableauSite]],
+        shard: Optional[Shard],
+        shard_output_path: Optional[str],
+        impact_index_path: Optional[str],
+        patch_output_path: Optional[str],
         verbose: bool,
 ):
-    tableau_crawler(manifest_path, dbt_package_name, tableau_projects_to_ignore, verbose)
+    if record_dir and replay_dir:
+        raise click.UsageError('--record and --replay cannot be used together')
+
+    if resume and not state_dir:
+        raise click.UsageError('--resume requires --state-dir')
+
+    if bool(shard) != bool(shard_output_path):
+        raise click.UsageError('--shard and --shard-output must be used together')
+
+    if shard and impact_index_path:
+        raise click.UsageError('with --shard, the impact index is updated by tableau_merge')
+
+    if shard and patch_output_path:
+        raise click.UsageError('with --shard, the patch is written by tableau_merge')
+
+    tableau_crawler(
+        manifest_path,
+        dbt_package_name,
+        tableau_projects_to_ignore,
+        verbose,
+        page_size=page_size,
+        token_cache_path=token_cache_path,
+        token_ttl=token_ttl,
+        max_concurrency=max_concurrency,
+        lookup_mode=lookup_mode,
+        cache_path=cache_path,
+        query_memo_size=query_memo_size,
+        compact_output=compact_output,
+        lazy_manifest=lazy_manifest,
+        metrics_report_path=metrics_report_path,
+        prometheus_textfile_path=prometheus_textfile_path,
+        workers=workers,
+        connection_types=connection_types,
+        record_dir=record_dir,
+        replay_dir=replay_dir,
+        rate_limit=rate_limit,
+        max_retries=max_retries,
+        state_dir=state_dir,
+        resume=resume,
+        sites=sites,
+        shard=shard,
+        shard_output_path=shard_output_path,
+        impact_index_path=impact_index_path,
+        patch_output_path=patch_output_path,
+    )
 
 
 if __name__ == '__main__':
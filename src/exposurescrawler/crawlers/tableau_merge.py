@@ -0,0 +1,113 @@
+import logging
+import os
+from typing import Any, Collection, Optional, Sequence
+
+import click
+
+from exposurescrawler.crawlers.tableau import (
+    _add_exposures,
+    _save_manifest,
+    _save_patch,
+    _update_impact_index,
+    _write_metrics,
+    tableau_crawler_command,
+)
+from exposurescrawler.dbt.manifest import DbtManifest
+from exposurescrawler.tableau.shards import ShardError, read_shards
+from exposurescrawler.utils.logger import logger
+from exposurescrawler.utils.metrics import metrics
+
+"""
+Merge step of a sharded crawl: combines the partial results written by every shard of the
+Tableau crawler (`--shard i/N --shard-output PATH`) and applies them to the manifest in a single
+pass, as a single (unsharded) crawl would have done. Tableau is not called at all.
+"""
+
+# The options shared with the crawler
+_CRAWLER_OPTIONS = (
+    'manifest_path',
+    'dbt_package_name',
+    'tableau_projects_to_ignore',
+    'compact_output',
+    'lazy_manifest',
+    'metrics_report_path',
+    'prometheus_textfile_path',
+    'impact_index_path',
+    'patch_output_path',
+    'verbose',
+)
+
+
+def tableau_merge(
+    manifest_path: str,
+    dbt_package_name: str,
+    tableau_projects_to_ignore: Collection[str],
+    shard_paths: Sequence[str],
+    verbose: bool,
+    compact_output: bool = False,
+    lazy_manifest: bool = False,
+    metrics_report_path: Optional[str] = None,
+    prometheus_textfile_path: Optional[str] = None,
+    impact_index_path: Optional[str] = None,
+    patch_output_path: Optional[str] = None,
+) -> None:
+    """
+    :param shard_paths: the partial results of all the shards of the crawl, in any order
+    """
+    if verbose:
+        logger().setLevel(logging.DEBUG)
+
+    metrics().reset()
+
+    manifest_path = os.path.expanduser(os.path.expandvars(manifest_path))
+
+    with metrics().span('read_shards'):
+        sites_results = read_shards(shard_paths)
+
+    logger().info(f'🧩 Merging the results of {len(shard_paths)} shards')
+
+    with metrics().span('manifest_load'):
+        manifest = DbtManifest.from_file(manifest_path, lazy=lazy_manifest)
+
+    sites_records = [
+        (
+            site.name,
+            _add_exposures(
+                manifest, dbt_package_name, tableau_projects_to_ignore, *site_results, site
+            ),
+        )
+        for site, site_results in sites_results
+    ]
+
+    if patch_output_path:
+        unique_ids = [record.unique_id for _, records in sites_records for record in records]
+        _save_patch(manifest, patch_output_path, unique_ids, compact_output)
+    else:
+        _save_manifest(manifest, manifest_path, compact_output)
+
+    _update_impact_index(impact_index_path, sites_records)
+    _write_metrics(metrics_report_path, prometheus_textfile_path)
+
+
+@click.command()
+@click.argument(
+    'shard_paths',
+    metavar='SHARDS...',
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, dir_okay=False),
+)
+def tableau_merge_command(**options: Any):
+    try:
+        tableau_merge(**options)
+    except ShardError as error:
+        raise click.UsageError(str(error))
+
+
+tableau_merge_command.params = [
+    parameter for parameter in tableau_crawler_command.params if parameter.name in _CRAWLER_OPTIONS
+] + tableau_merge_command.params
+
+
+if __name__ == '__main__':
+    tableau_merge_command()
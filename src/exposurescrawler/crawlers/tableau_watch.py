@@ -0,0 +1,376 @@
+import logging
+import os
+import signal
+import threading
+import time
+from contextlib import ExitStack
+from typing import TYPE_CHECKING, Any, Collection, Dict, List, Optional, Tuple
+
+import click
+
+from exposurescrawler.crawlers.tableau import (
+    DEFAULT_QUERY_MEMO_SIZE,
+    LOOKUP_MODE_AUTO,
+    _add_exposures,
+    _crawl_tableau,
+    _log_query_memo,
+    _open_cache,
+    _open_model_index,
+    _save_manifest,
+    _update_impact_index,
+    _write_metrics,
+    tableau_crawler_command,
+)
+from exposurescrawler.dbt.impact_index import ExposureRecord
+from exposurescrawler.dbt.manifest import DbtManifest
+from exposurescrawler.dbt.models import ModelRecord
+from exposurescrawler.tableau.cache import CrawlCache
+from exposurescrawler.tableau.defaults import (
+    DEFAULT_CONNECTION_TYPES,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_PAGE_SIZE,
+    DEFAULT_TOKEN_TTL,
+)
+from exposurescrawler.tableau.models import WorkbookModelsMapping
+from exposurescrawler.utils.logger import logger
+from exposurescrawler.utils.metrics import metrics
+from exposurescrawler.utils.query_parsing import QueryMemo
+
+if TYPE_CHECKING:
+    from exposurescrawler.tableau.rest_client import TableauRestClient
+
+"""
+Watch mode of the Tableau crawler: a long-running process that applies the exposures again every
+time the manifest changes (e.g. after each `dbt docs generate`), instead of a cold start per run.
+
+The authenticated Tableau session, the index of the models and the results of the last Tableau
+crawl are kept in memory. A change to the manifest only rebuilds the index if its models have
+changed, and only crawls Tableau again if they have (since the results depend on them) or if
+the Tableau results are older than the refresh interval.
+"""
+
+# How often the manifest is checked for changes
+DEFAULT_POLL_INTERVAL = 5
+
+# How often the Tableau site is crawled again, even if the manifest has not changed
+DEFAULT_REFRESH_INTERVAL = 15 * 60
+
+# The results of a Tableau crawl: the workbooks with models found, and the maps of workbooks and
+# users
+TableauResults = Tuple[WorkbookModelsMapping, Dict[str, Any], Dict[str, Any]]
+
+
+def _manifest_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """
+    :return: what identifies the current version of the file, or None if it does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    # dbt writes a new file, so the inode changes even if the modification time and the size
+    # do not (e.g. on file systems with a coarse time resolution)
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class TableauWatcher:
+    """
+    Applies the exposures to the manifest on `manifest_path` whenever it changes, reusing what
+    is kept in memory from the previous times (see the module docstring).
+
+    `poll()` checks for changes once, while `run()` keeps polling until `stop()` is called. It
+    should be used as a context manager, so the worker processes and the crawl cache (if any)
+    are closed at the end.
+
+    :param tableau_client: a client kept signed in for the whole time
+    :param refresh_interval: after how many seconds the Tableau results are considered stale
+    :param crawl_options: the options of the crawl, see `_crawl_tableau()`
+    """
+
+    def __init__(
+        self,
+        manifest_path: str,
+        dbt_package_name: str,
+        tableau_projects_to_ignore: Collection[str],
+        tableau_client: 'TableauRestClient',
+        refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        lookup_mode: str = LOOKUP_MODE_AUTO,
+        cache_path: Optional[str] = None,
+        query_memo_size: int = DEFAULT_QUERY_MEMO_SIZE,
+        compact_output: bool = False,
+        lazy_manifest: bool = False,
+        metrics_report_path: Optional[str] = None,
+        prometheus_textfile_path: Optional[str] = None,
+        workers: int = 1,
+        connection_types: Collection[str] = DEFAULT_CONNECTION_TYPES,
+        impact_index_path: Optional[str] = None,
+    ):
+        self.manifest_path = manifest_path
+        self.dbt_package_name = dbt_package_name
+        self.tableau_projects_to_ignore = tableau_projects_to_ignore
+        self.tableau_client = tableau_client
+        self.refresh_interval = refresh_interval
+
+        self.page_size = page_size
+        self.max_concurrency = max_concurrency
+        self.lookup_mode = lookup_mode
+        self.cache_path = cache_path
+        self.query_memo_size = query_memo_size
+        self.compact_output = compact_output
+        self.lazy_manifest = lazy_manifest
+        self.metrics_report_path = metrics_report_path
+        self.prometheus_textfile_path = prometheus_textfile_path
+        self.workers = workers
+        self.connection_types = connection_types
+        self.impact_index_path = impact_index_path
+
+        self._stopped = threading.Event()
+
+        # The manifest as written by dbt, and the version of the file seen last (including
+        # the one written by the watcher itself)
+        self._manifest: Optional[DbtManifest] = None
+        self._signature: Optional[Tuple[int, int, int]] = None
+
+        # The exposures added to `_manifest`, removed before applying them again
+        self._added: List[ExposureRecord] = []
+
+        # Kept while the models of the manifest stay the same
+        self._models: Optional[Dict[str, ModelRecord]] = None
+        self._query_memo: Optional[QueryMemo] = None
+        self._cache: Optional[CrawlCache] = None
+        self._exit_stack = ExitStack()
+
+        # The results of the last Tableau crawl, and when it happened
+        self._results: Optional[TableauResults] = None
+        self._fetched_at = 0.0
+
+    def __enter__(self) -> 'TableauWatcher':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._exit_stack.close()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def run(self, poll_interval: float = DEFAULT_POLL_INTERVAL) -> None:
+        """
+        Polls the manifest every `poll_interval` seconds, until `stop()` is called. Errors (e.g.
+        Tableau being unavailable) are logged, and the same poll is tried again next time.
+        """
+        logger().info(f'👀 Watching {self.manifest_path} for changes')
+
+        while not self._stopped.is_set():
+            try:
+                self.poll()
+            except Exception:
+                logger().exception('💥 Failed to apply the exposures, trying again later')
+
+            self._stopped.wait(poll_interval)
+
+    def poll(self) -> bool:
+        """
+        Applies the exposures again if the manifest has changed, or if the Tableau results are
+        stale (in which case Tableau is crawled again first).
+
+        :return: whether the manifest was written
+        """
+        signature = _manifest_signature(self.manifest_path)
+        manifest_changed = signature is not None and signature != self._signature
+        stale = (
+            self._results is None or time.monotonic() - self._fetched_at >= self.refresh_interval
+        )
+
+        if not manifest_changed and (not stale or self._manifest is None):
+            return False
+
+        # Every application of the exposures is measured on its own
+        metrics().reset()
+
+        if manifest_changed:
+            logger().info('')
+            logger().info('🔄 The manifest has changed, applying the exposures again')
+            self._load_manifest()
+            self._signature = signature
+
+        # The results are also dropped whenever the models change
+        if stale or self._results is None:
+            self._refresh()
+
+        self._apply()
+        return True
+
+    def _load_manifest(self) -> None:
+        with metrics().span('manifest_load'):
+            self._manifest = DbtManifest.from_file(self.manifest_path, lazy=self.lazy_manifest)
+
+        self._added = []
+
+        with metrics().span('retrieve_models_and_sources'):
+            models = self._manifest.retrieve_models_and_sources()
+
+        if models == self._models:
+            logger().info('⚙️ The models have not changed, reusing the index')
+            return
+
+        # The index and the memo are built again, the cache is opened again (dropping the entries
+        # affected by the models changed), and the Tableau results are computed against the new
+        # models
+        self.close()
+
+        self._models = models
+        self._exit_stack = ExitStack()
+        model_index = self._exit_stack.enter_context(_open_model_index(models, self.workers))
+        self._cache = self._exit_stack.enter_context(
+            _open_cache(self.cache_path, models, self.connection_types)
+        )
+        self._query_memo = QueryMemo(model_index, self.query_memo_size, self._cache)
+        self._results = None
+
+    def _refresh(self) -> None:
+        # The workbooks and users might have changed on Tableau as well
+        self.tableau_client.clear_cache()
+
+        self._results = _crawl_tableau(
+            self.tableau_client,
+            self._query_memo,  # type: ignore
+            self.page_size,
+            self.max_concurrency,
+            self.lookup_mode,
+            self._cache,
+            self.connection_types,
+        )
+        self._fetched_at = time.monotonic()
+
+        _log_query_memo(self._query_memo)  # type: ignore
+
+    def _apply(self) -> None:
+        manifest: DbtManifest = self._manifest  # type: ignore
+
+        # Exposures of workbooks that no longer reference any models are not kept around
+        for record in self._added:
+            manifest.remove_exposure(record.unique_id)
+
+        self._added = _add_exposures(
+            manifest,
+            self.dbt_package_name,
+            self.tableau_projects_to_ignore,
+            *self._results,  # type: ignore
+        )
+
+        _save_manifest(manifest, self.manifest_path, self.compact_output)
+        _update_impact_index(self.impact_index_path, [(None, self._added)])
+
+        # The watcher's own changes are not changes to react to
+        self._signature = _manifest_signature(self.manifest_path)
+
+        _write_metrics(self.metrics_report_path, self.prometheus_textfile_path)
+
+
+def tableau_watch(
+    manifest_path: str,
+    dbt_package_name: str,
+    tableau_projects_to_ignore: Collection[str],
+    verbose: bool,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+    token_cache_path: Optional[str] = None,
+    token_ttl: int = DEFAULT_TOKEN_TTL,
+    record_dir: Optional[str] = None,
+    replay_dir: Optional[str] = None,
+    rate_limit: Optional[float] = None,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    **crawl_options: Any,
+) -> None:
+    """
+    Runs the watcher until interrupted (or terminated).
+
+    :param crawl_options: the other options of `tableau_crawler()`
+    """
+    from exposurescrawler.tableau.rest_client import TableauRestClient
+
+    if verbose:
+        logger().setLevel(logging.DEBUG)
+
+    manifest_path = os.path.expanduser(os.path.expandvars(manifest_path))
+
+    with TableauRestClient(
+        os.environ['TABLEAU_URL'],
+        os.environ['TABLEAU_USERNAME'],
+        os.environ['TABLEAU_PASSWORD'],
+        token_cache_path=token_cache_path,
+        token_ttl=token_ttl,
+        record_dir=record_dir,
+        replay_dir=replay_dir,
+        max_concurrency=crawl_options.get('max_concurrency', DEFAULT_MAX_CONCURRENCY),
+        rate_limit=rate_limit,
+        max_retries=max_retries,
+    ) as tableau_client, TableauWatcher(
+        manifest_path,
+        dbt_package_name,
+        tableau_projects_to_ignore,
+        tableau_client,
+        refresh_interval,
+        **crawl_options,
+    ) as watcher:
+        # Stop after the current poll, so the manifest is never left half written
+        signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+
+        watcher.run(poll_interval)
+
+
+@click.command()
+@click.option(
+    '--poll-interval',
+    default=DEFAULT_POLL_INTERVAL,
+    show_default=True,
+    type=click.FloatRange(min=0.1),
+    metavar='SECONDS',
+    help='How often the manifest is checked for changes',
+)
+@click.option(
+    '--refresh-interval',
+    default=DEFAULT_REFRESH_INTERVAL,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    metavar='SECONDS',
+    help='How often Tableau is crawled again, even if the manifest has not changed',
+)
+def tableau_watch_command(**options: Any):
+    if options['record_dir'] and options['replay_dir']:
+        raise click.UsageError('--record and --replay cannot be used together')
+
+    # The results are kept in memory between crawls already
+    state_dir, resume = options.pop('state_dir'), options.pop('resume')
+
+    if state_dir or resume:
+        raise click.UsageError('--state-dir and --resume are not supported in watch mode')
+
+    if options.pop('sites'):
+        raise click.UsageError('--tableau-sites is not supported in watch mode')
+
+    shard, shard_output_path = options.pop('shard'), options.pop('shard_output_path')
+
+    if shard or shard_output_path:
+        raise click.UsageError('--shard and --shard-output are not supported in watch mode')
+
+    # The manifest is written again by dbt, and then by the watcher
+    if options.pop('patch_output_path'):
+        raise click.UsageError('--patch-output is not supported in watch mode')
+
+    tableau_watch(**options)
+
+
+# Also takes all the options of the crawler
+tableau_watch_command.params = tableau_crawler_command.params + tableau_watch_command.params
+
+
+if __name__ == '__main__':
+    tableau_watch_command()
@@ -1,9 +1,9 @@
 import os
 import re
 from dataclasses import dataclass, field
-from typing import Mapping, Any, Iterable
+from typing import Mapping, Any, Iterable, Optional
 
-from slugify import slugify
+from exposurescrawler.dbt.models import ModelRecord
 
 
 @dataclass
@@ -21,12 +21,28 @@ class DbtExposure:
 
     @classmethod
     def from_tableau_workbook(
-        cls, package_name: str, workbook: Any, owner: Any, models: Iterable[Mapping]
+        cls,
+        package_name: str,
+        workbook: Any,
+        owner: Any,
+        models: Iterable[ModelRecord],
+        tableau_url: Optional[str] = None,
+        site_name: Optional[str] = None,
     ):
+        """
+        :param tableau_url: the URL of the Tableau Server of the workbook, by default the one on
+                            the `TABLEAU_URL` environment variable
+        :param site_name: the name of the site of the workbook, when crawling several sites
+        """
+        # Only imported when building exposures, so the command line starts fast
+        from slugify import slugify
+
         # To guarantee that exposure names are unique, we append the first 3 characters of the
-        # Tableau internal id (UUID) instead of just using the workbook name
+        # Tableau internal id (UUID) instead of just using the workbook name. When crawling
+        # several sites, the name of the site is added as well
         workbook_name_safe = slugify(workbook.name, separator='_')
-        name = f'tableau_{workbook_name_safe}_{workbook.id[0:3]}'
+        site_prefix = f'{site_name}_' if site_name else ''
+        name = f'tableau_{site_prefix}{workbook_name_safe}_{workbook.id[0:3]}'
 
         '''
         Links coming from the Tableau API will be in the shape of
@@ -35,7 +51,8 @@ class DbtExposure:
         Here we replace the http(s)://hostname with the full Tableau URL provided by the user.
         We expect TABLEAU_URL to be provided without a trailing slash
         '''
-        url = re.sub(r'(https?:\/\/.*?)\/', os.environ['TABLEAU_URL'] + '/', workbook.webpage_url)
+        tableau_url = tableau_url or os.environ['TABLEAU_URL']
+        url = re.sub(r'(https?:\/\/.*?)\/', tableau_url + '/', workbook.webpage_url)
 
         description = '''
         # {project} / {name}
@@ -54,7 +71,8 @@ class DbtExposure:
             url=url,
         )
 
-        depends_on = {'nodes': list(set([model['unique_id'] for model in models]))}
+        # Sorted, so the manifest is the same however the models were found (e.g. across shards)
+        depends_on = {'nodes': sorted(set([model.unique_id for model in models]))}
         owner = {'name': owner.fullname, 'email': owner.name}
         tags = [f'tableau:{tag}' for tag in workbook.tags]
 
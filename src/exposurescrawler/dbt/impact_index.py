@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from typing import Any, Iterable, List, Optional, Tuple
+
+import click
+
+from exposurescrawler.dbt.exposure import DbtExposure
+from exposurescrawler.dbt.models import ModelRecord
+
+"""
+A persistent reverse index of the exposures added by the crawler, on a SQLite file, for impact
+analysis: which workbooks use a model (by its unique id or its materialized name), and which
+models a workbook uses (by its luid, its exposure unique id or its name). Lookups use the
+indexes of the database, without loading the manifest.
+
+It is updated on every crawl: the exposures of the sites crawled are compared with the ones
+indexed before (through a fingerprint of each one), and only the new, changed and removed ones
+are written.
+"""
+
+_SCHEMA = '''
+    create table if not exists exposures (
+        unique_id text primary key,
+        site text not null,
+        workbook_luid text not null,
+        workbook_name text not null,
+        project_name text,
+        owner_name text,
+        owner_email text,
+        url text,
+        fingerprint text not null
+    );
+
+    create index if not exists exposures_site on exposures (site);
+    create index if not exists exposures_workbook_luid on exposures (workbook_luid);
+    create index if not exists exposures_workbook_name on exposures (workbook_name);
+    create index if not exists exposures_owner_email on exposures (owner_email);
+    create index if not exists exposures_project_name on exposures (project_name);
+
+    create table if not exists exposure_models (
+        exposure_unique_id text not null,
+        model_unique_id text not null,
+        materialized_name text not null,
+        primary key (exposure_unique_id, model_unique_id)
+    );
+
+    create index if not exists exposure_models_model_unique_id
+        on exposure_models (model_unique_id);
+    -- Materialized names are looked up case-insensitively, e.g. on Snowflake
+    create index if not exists exposure_models_materialized_name_lower
+        on exposure_models (lower(materialized_name));
+'''
+
+"""
+An exposure (and its workbook) as indexed. The site is None for the single site configured
+through environment variables, and `models` are tuples of the unique id and the materialized
+name of each model used.
+"""
+ExposureRecord = namedtuple(
+    'ExposureRecord',
+    'unique_id site workbook_luid workbook_name project_name owner_name owner_email url models',
+    defaults=[()],
+)
+
+_EXPOSURE_COLUMNS = ExposureRecord._fields[:-1]
+
+
+def exposure_record(
+    exposure: DbtExposure, workbook: Any, models: Iterable[ModelRecord], site: Optional[str] = None
+) -> ExposureRecord:
+    """
+    :param workbook: the workbook of the exposure
+    :param models: the models found on the workbook
+    :param site: the name of the site of the workbook, when crawling several sites
+    """
+    return ExposureRecord(
+        exposure.unique_id,
+        site,
+        workbook.id,
+        workbook.name,
+        workbook.project_name,
+        exposure.owner['name'],
+        exposure.owner['email'],
+        exposure.url,
+        tuple(sorted(set((model.unique_id, model.materialized_name) for model in models))),
+    )
+
+
+def _fingerprint(record: ExposureRecord) -> str:
+    return hashlib.sha256(json.dumps(list(record), default=list).encode()).hexdigest()
+
+
+class ImpactIndex:
+    def __init__(self, path: str):
+        """
+        :param path: the path to the SQLite database, created if it does not exist
+        """
+        self.path = os.path.expanduser(path)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+
+    def __enter__(self) -> 'ImpactIndex':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def update(self, site: Optional[str], records: Iterable[ExposureRecord]) -> Tuple[int, int]:
+        """
+        Replaces the exposures of `site` with `records`, writing only what has changed.
+
+        :return: how many exposures were written (new or changed) and how many were removed
+        """
+        site_key = site or ''
+        new = {record.unique_id: record for record in records}
+
+        with self._lock, self._connection:
+            indexed = dict(
+                self._connection.execute(
+                    'select unique_id, fingerprint from exposures where site = ?', (site_key,)
+                )
+            )
+
+            removed = [unique_id for unique_id in indexed if unique_id not in new]
+            changed = [
+                (record, fingerprint)
+                for record in new.values()
+                if (fingerprint := _fingerprint(record)) != indexed.get(record.unique_id)
+            ]
+
+            for unique_ids in (removed, [record.unique_id for record, _ in changed]):
+                self._connection.executemany(
+                    'delete from exposure_models where exposure_unique_id = ?',
+                    [(unique_id,) for unique_id in unique_ids],
+                )
+
+            self._connection.executemany(
+                'delete from exposures where unique_id = ?', [(unique_id,) for unique_id in removed]
+            )
+            self._connection.executemany(
+                'insert or replace into exposures values (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (*record._replace(site=site_key)[: len(_EXPOSURE_COLUMNS)], fingerprint)
+                    for record, fingerprint in changed
+                ],
+            )
+            self._connection.executemany(
+                'insert or replace into exposure_models values (?, ?, ?)',
+                [
+                    (record.unique_id, model_unique_id, materialized_name)
+                    for record, _ in changed
+                    for model_unique_id, materialized_name in record.models
+                ],
+            )
+
+        return len(changed), len(removed)
+
+    def _exposures(self, where: str, parameters: tuple) -> List[ExposureRecord]:
+        with self._lock:
+            rows = self._connection.execute(
+                f'select distinct {", ".join("e." + column for column in _EXPOSURE_COLUMNS)} '
+                'from exposures e join exposure_models m on m.exposure_unique_id = e.unique_id '
+                f'where {where} order by e.unique_id',
+                parameters,
+            ).fetchall()
+
+        # The site is None for the single site configured through environment variables
+        return [ExposureRecord(*row)._replace(site=row[1] or None) for row in rows]
+
+    def workbooks_using(
+        self, model: str, owner: Optional[str] = None, project: Optional[str] = None
+    ) -> List[ExposureRecord]:
+        """
+        :param model: the unique id (e.g. `model.package.orders`) or the materialized name (e.g.
+                      `db.schema.orders`, in any case) of a model or source
+        :param owner: only the workbooks owned by this user (by their email/username)
+        :param project: only the workbooks on this Tableau project
+        :return: the exposures of the workbooks using the model (without their models)
+        """
+        where = '(m.model_unique_id = ? or lower(m.materialized_name) = lower(?))'
+        parameters: tuple = (model, model)
+
+        if owner:
+            where += ' and e.owner_email = ?'
+            parameters += (owner,)
+
+        if project:
+            where += ' and e.project_name = ?'
+            parameters += (project,)
+
+        return self._exposures(where, parameters)
+
+    def models_used_by(self, workbook: str) -> List[Tuple[str, str]]:
+        """
+        :param workbook: the luid, the exposure unique id or the name of a workbook
+        :return: the unique id and materialized name of every model used by the workbook (or by
+                 all workbooks with that name)
+        """
+        with self._lock:
+            return self._connection.execute(
+                'select distinct m.model_unique_id, m.materialized_name '
+                'from exposures e join exposure_models m on m.exposure_unique_id = e.unique_id '
+                'where e.workbook_luid = ? or e.unique_id = ? or e.workbook_name = ? '
+                'order by m.model_unique_id',
+                (workbook, workbook, workbook),
+            ).fetchall()
+
+
+def _echo(rows: Iterable[tuple], as_json: bool, fields: Tuple[str, ...]) -> None:
+    for row in rows:
+        if as_json:
+            click.echo(json.dumps(dict(zip(fields, row))))
+        else:
+            click.echo('\t'.join('' if value is None else str(value) for value in row))
+
+
+@click.group()
+@click.option(
+    '--index-path',
+    required=True,
+    metavar='PATH',
+    type=click.Path(exists=True, dir_okay=False),
+    help='The impact index written by the crawler (--impact-index)',
+)
+@click.option('--json', 'as_json', is_flag=True, default=False, help='Print JSON lines')
+@click.pass_context
+def impact_command(context: click.Context, index_path: str, as_json: bool):
+    """
+    Impact analysis on the exposures indexed by the crawler.
+    """
+    context.obj = {'index': context.with_resource(ImpactIndex(index_path)), 'as_json': as_json}
+
+
+@impact_command.command('workbooks')
+@click.argument('model')
+@click.option('--owner', help='Only the workbooks owned by this user (email or username)')
+@click.option('--project', help='Only the workbooks on this Tableau project')
+@click.pass_obj
+def workbooks_command(obj: dict, model: str, owner: Optional[str], project: Optional[str]):
+    """
+    Lists the workbooks using MODEL (a unique id or a materialized name).
+    """
+    records = obj['index'].workbooks_using(model, owner, project)
+    _echo(
+        (record[: len(_EXPOSURE_COLUMNS)] for record in records),
+        obj['as_json'],
+        _EXPOSURE_COLUMNS,
+    )
+
+
+@impact_command.command('models')
+@click.argument('workbook')
+@click.pass_obj
+def models_command(obj: dict, workbook: str):
+    """
+    Lists the models used by WORKBOOK (a luid, an exposure unique id or a name).
+    """
+    _echo(
+        obj['index'].models_used_by(workbook),
+        obj['as_json'],
+        ('unique_id', 'materialized_name'),
+    )
+
+
+if __name__ == '__main__':
+    impact_command()
@@ -1,23 +1,112 @@
-import json
+import bisect
+import mmap
 from collections import UserDict
-from typing import Any, Dict, Type
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
 
 from exposurescrawler.dbt.exposure import DbtExposure
+from exposurescrawler.dbt.models import ModelRecord
+from exposurescrawler.utils import json_spans, serialization
+from exposurescrawler.utils.files import atomic_write
+
+# On lazy mode, only these fields of models and sources are decoded, since they are the only
+# ones the crawler needs. The raw sections are still written back as they are.
+LAZY_NODE_SECTIONS = ('nodes', 'sources')
+LAZY_NODE_FIELDS = (
+    'unique_id',
+    'resource_type',
+    'package_name',
+    'name',
+    'alias',
+    'database',
+    'schema',
+)
+
+# On lazy mode, these sections are decoded in full, since the crawler modifies them
+LAZY_DECODED_SECTIONS = ('exposures', 'parent_map')
+
+# On lazy mode, only the entries of this section that the crawler modifies are decoded (and
+# written back), since it is as big as the whole lineage graph
+LAZY_SPLICED_SECTION = 'child_map'
 
 
 class DbtManifest(UserDict):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        # On lazy mode, the memory-mapped manifest file and the span of each top-level section
+        self._buffer: Optional[mmap.mmap] = None
+        self._spans: Dict[str, json_spans.Span] = {}
+
+        # On lazy mode, where the children of each node are on the child map, and the children
+        # of the nodes modified (None for the nodes removed from it)
+        self._child_spans: Dict[str, json_spans.Span] = {}
+        self._children_modified: Dict[str, Optional[List[str]]] = {}
+
     @classmethod
-    def from_file(cls: Type['DbtManifest'], path: str) -> 'DbtManifest':
-        with open(path) as file:
-            manifest = json.load(file)
+    def from_file(cls: Type['DbtManifest'], path: str, lazy: bool = False) -> 'DbtManifest':
+        """
+        :param path: the path to the dbt manifest artifact
+        :param lazy: whether to only decode the sections (and the fields of models and sources)
+                     used by the crawler. The file is memory-mapped and the other sections are
+                     written back as they are, so the memory used does not grow with the size
+                     of the manifest. In this mode, the manifest only holds `exposures`,
+                     `parent_map` and partial `nodes` and `sources`.
+        """
+        if lazy:
+            return cls._from_file_lazy(path)
+
+        with open(path, 'rb') as file:
+            manifest = serialization.loads(file.read())
 
         return cls(manifest)
 
-    def retrieve_models_and_sources(self) -> Dict[str, Any]:
+    @classmethod
+    def _from_file_lazy(cls: Type['DbtManifest'], path: str) -> 'DbtManifest':
+        with open(path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        data: Dict[str, Any] = {}
+        child_spans: Dict[str, json_spans.Span] = {}
+
+        def scan_section(key_span: json_spans.Span, start: int) -> int:
+            key = serialization.loads(buffer[slice(*key_span)])
+
+            if key in LAZY_NODE_SECTIONS:
+                data[key], end = _load_partial_nodes(buffer, start)
+            elif key == LAZY_SPLICED_SECTION:
+                members, end = json_spans.object_members(buffer, start)
+                child_spans.update(
+                    (serialization.loads(buffer[slice(*member_key_span)]), value_span)
+                    for member_key_span, value_span in members
+                )
+            else:
+                end = json_spans.value_end(buffer, start)
+
+                if key in LAZY_DECODED_SECTIONS:
+                    data[key] = serialization.loads(buffer[start:end])
+
+            return end
+
+        root = json_spans.skip_whitespace(buffer, 0)
+        members, _ = json_spans.object_members(buffer, root, scan_section)
+
+        spans = {
+            serialization.loads(buffer[key_start:key_end]): value_span
+            for (key_start, key_end), value_span in members
+        }
+
+        manifest = cls(data)
+        manifest._buffer = buffer
+        manifest._spans = spans
+        manifest._child_spans = child_spans
+
+        return manifest
+
+    def retrieve_models_and_sources(self) -> Dict[str, ModelRecord]:
         """
         Returns all models and sources from the manifest in a dictionary.
         The key is the fully qualified name (on the database, and not on
-        the dbt object tree), and the value is the node.
+        the dbt object tree), and the value is a record of the node.
 
         :return:
         """
@@ -25,23 +114,212 @@ class DbtManifest(UserDict):
 
         for node_id, node in self.data['nodes'].items():
             fqn = '{}.{}.{}'.format(node['database'], node['schema'], node['alias'])
-            node['materialized_name'] = fqn
-            models[fqn] = node
+            models[fqn] = ModelRecord(node['unique_id'], fqn)
 
         for node_id, node in self.data['sources'].items():
             fqn = '{}.{}.{}'.format(node['database'], node['schema'], node['name'])
-            node['materialized_name'] = fqn
-            models[fqn] = node
+            models[fqn] = ModelRecord(node['unique_id'], fqn)
 
         return models
 
-    def add_exposure(self, exposure: DbtExposure, found):
-        self['exposures'][exposure.unique_id] = exposure.to_dict()
-        self['parent_map'][exposure.unique_id] = list(set([model['unique_id'] for model in found]))
+    def add_exposure(self, exposure: DbtExposure, found: Iterable[ModelRecord]):
+        self.set_exposure(
+            exposure.unique_id, exposure.to_dict(), [model.unique_id for model in found]
+        )
+
+    def set_exposure(self, unique_id: str, exposure: Dict[str, Any], parents: Iterable[str]):
+        """
+        Adds (or replaces) an exposure, and its edges on the parent and child maps. As with every
+        node, the exposure also has its own (empty) entry on the child map.
+
+        :param exposure: the exposure, as on the manifest
+        :param parents: the unique ids of the models and sources the exposure depends on
+        """
+        self._unlink_exposure(unique_id)
+
+        self['exposures'][unique_id] = exposure
+        self['parent_map'][unique_id] = sorted(set(parents))
+
+        for parent in self['parent_map'][unique_id]:
+            children = self._children(parent)
+
+            if children is not None and unique_id not in children:
+                bisect.insort(children, unique_id)
+
+        self._children(unique_id)
+
+    def remove_exposure(self, unique_id: str):
+        self._unlink_exposure(unique_id)
+        self._remove_children(unique_id)
+
+    def _unlink_exposure(self, unique_id: str) -> None:
+        """
+        Removes an exposure and its edges from its parents, but not its own entry on the child
+        map.
+        """
+        self['exposures'].pop(unique_id, None)
+
+        for parent in self['parent_map'].pop(unique_id, None) or []:
+            children = self._children(parent, create=False)
+
+            if children and unique_id in children:
+                children.remove(unique_id)
+
+    def _remove_children(self, unique_id: str) -> None:
+        """
+        Removes a node from the child map.
+        """
+        if self._buffer is None:
+            if 'child_map' in self:
+                self['child_map'].pop(unique_id, None)
+        elif unique_id in self._child_spans:
+            self._children_modified[unique_id] = None
+        else:
+            self._children_modified.pop(unique_id, None)
+
+    def _children(self, unique_id: str, create: bool = True) -> Optional[List[str]]:
+        """
+        :param create: whether to add the node to the child map if it is not there yet
+        :return: the children of a node on the child map, to be modified in place, or None if
+                 the manifest has no child map (or the node is not on it, unless `create`)
+        """
+        if self._buffer is None:
+            if 'child_map' not in self:
+                return None
+
+            child_map = self['child_map']
+            return child_map.setdefault(unique_id, []) if create else child_map.get(unique_id)
+
+        if LAZY_SPLICED_SECTION not in self._spans:
+            return None
+
+        # Nodes removed from the child map are only added back if `create`
+        if self._children_modified.get(unique_id, []) is None and create:
+            self._children_modified[unique_id] = []
+
+        if unique_id not in self._children_modified:
+            span = self._child_spans.get(unique_id)
+
+            if span is None and not create:
+                return None
+
+            self._children_modified[unique_id] = (
+                serialization.loads(self._buffer[slice(*span)]) if span else []
+            )
+
+        return self._children_modified[unique_id]
 
     def to_dict(self):
         return self.data
 
-    def save(self, path):
-        with open(path, 'w') as file:
-            json.dump(self.to_dict(), file, indent=4)
+    def save(self, path, compact: bool = False):
+        """
+        :param path: where to write the manifest to
+        :param compact: whether to write without indentation, instead of pretty-printing. On lazy
+                        mode, the sections that were not decoded keep their original formatting
+        """
+        # On lazy mode, the original file is still memory-mapped (and it might be the same file)
+        with atomic_write(path, 'wb') as file:
+            if self._buffer is None:
+                file.write(serialization.dumps(self.to_dict(), compact=compact))
+            else:
+                self._write_lazy(file, compact)
+
+    def _write_lazy(self, file, compact: bool) -> None:
+        separator, indentation = (b':', b'') if compact else (b': ', b'\n    ')
+
+        keys = list(self._spans) + [key for key in self.data if key not in self._spans]
+
+        with memoryview(self._buffer) as view:  # type: ignore
+            file.write(b'{')
+
+            for index, key in enumerate(keys):
+                if index:
+                    file.write(b',')
+
+                file.write(indentation + serialization.dumps(key) + separator)
+
+                if key == LAZY_SPLICED_SECTION:
+                    self._write_child_map(file, view, compact)
+                elif key in self._spans and key not in LAZY_DECODED_SECTIONS:
+                    start, end = self._spans[key]
+                    file.write(view[start:end])
+                else:
+                    file.write(serialization.dumps(self.data[key], compact=compact))
+
+            file.write(b'}' if compact else b'\n}')
+
+    def _write_child_map(self, file, view: memoryview, compact: bool) -> None:
+        """
+        Copies the child map as it is, only splicing in the children of the nodes modified.
+        """
+        position, end = self._spans[LAZY_SPLICED_SECTION]
+
+        # Nodes can't be spliced out, so the whole section is written again if any was removed
+        # (e.g. when applying a patch that removes exposures already on the manifest)
+        if None in self._children_modified.values():
+            child_map = serialization.loads(self._buffer[position:end])  # type: ignore
+
+            for unique_id, children in self._children_modified.items():
+                if children is None:
+                    child_map.pop(unique_id, None)
+                else:
+                    child_map[unique_id] = children
+
+            file.write(serialization.dumps(child_map, compact=compact))
+            return
+
+        existing = sorted(
+            (self._child_spans[unique_id], children)
+            for unique_id, children in self._children_modified.items()
+            if unique_id in self._child_spans
+        )
+
+        for (start, value_end), children in existing:
+            file.write(view[position:start])
+            file.write(serialization.dumps(children, compact=True))
+            position = value_end
+
+        added = [
+            (unique_id, children)
+            for unique_id, children in self._children_modified.items()
+            if unique_id not in self._child_spans
+        ]
+
+        if not added:
+            file.write(view[position:end])
+            return
+
+        # New nodes are added right before the closing brace
+        file.write(view[slice(position, end - 1)])
+
+        for index, (unique_id, children) in enumerate(added):
+            if index or self._child_spans:
+                file.write(b',')
+
+            file.write(serialization.dumps(unique_id) + b':')
+            file.write(serialization.dumps(children, compact=True))
+
+        file.write(b'}')
+
+
+def _load_partial_nodes(buffer, position: int) -> Tuple[Dict[str, Dict[str, Any]], int]:
+    """
+    Decodes the nodes of a section one by one, only keeping the fields in `LAZY_NODE_FIELDS`.
+
+    :return: the partial nodes, and the position right after the end of the section
+    """
+    nodes = {}
+
+    def scan_node(key_span: json_spans.Span, start: int) -> int:
+        end = json_spans.value_end(buffer, start)
+        node = serialization.loads(buffer[start:end])
+
+        nodes[serialization.loads(buffer[slice(*key_span)])] = {
+            field: node[field] for field in LAZY_NODE_FIELDS if field in node
+        }
+
+        return end
+
+    _, end = json_spans.object_members(buffer, position, scan_node)
+    return nodes, end
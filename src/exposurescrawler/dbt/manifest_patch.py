@@ -0,0 +1,154 @@
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+import click
+
+from exposurescrawler.dbt.manifest import DbtManifest
+from exposurescrawler.utils import serialization
+from exposurescrawler.utils.files import atomic_write
+from exposurescrawler.utils.logger import logger
+
+"""
+Patches of the manifest: only what the crawler adds to it, instead of the whole (potentially
+huge) manifest written again. A patch holds the exposures and their edges on the parent and
+child maps, and is written as a small sidecar file next to the manifest generated by dbt:
+
+    {
+        "version": 1,
+        "exposures": {"exposure.package.name": {...}},
+        "parent_map": {"exposure.package.name": ["model.package.orders"]},
+        "child_map": {
+            "exposure.package.name": [],
+            "model.package.orders": ["exposure.package.name"]
+        },
+        "changes": {"added": [...], "changed": [...], "removed": [...]}
+    }
+
+`changes` compares the exposures with the ones of the previous patch written to the same path
+(if any): which exposures are new, which are different, and which are no longer found. The
+exposures removed are also removed from the manifest when the patch is applied.
+
+A patch is applied by `apply_patch()`, or from the command line (on lazy mode, so only the
+sections modified are decoded and written again):
+
+    python -m exposurescrawler.dbt.manifest_patch --manifest-path manifest.json patch.json
+"""
+
+PATCH_FORMAT_VERSION = 1
+
+
+def build_patch(
+    manifest: DbtManifest, unique_ids: Iterable[str], previous: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    :param manifest: the manifest the exposures were added to
+    :param unique_ids: the unique ids of the exposures added
+    :param previous: the patch of the previous run, to compare with
+    """
+    unique_ids = sorted(set(unique_ids))
+
+    exposures = {unique_id: manifest['exposures'][unique_id] for unique_id in unique_ids}
+    parent_map = {unique_id: manifest['parent_map'][unique_id] for unique_id in unique_ids}
+
+    # Every exposure has its own (empty) entry on the child map, like any other node
+    child_map: Dict[str, List[str]] = {unique_id: [] for unique_id in unique_ids}
+    for unique_id, parents in parent_map.items():
+        for parent in parents:
+            child_map.setdefault(parent, []).append(unique_id)
+
+    previous_exposures = previous['exposures'] if previous else {}
+    previous_parent_map = previous['parent_map'] if previous else {}
+
+    changes = {
+        'added': [unique_id for unique_id in unique_ids if unique_id not in previous_exposures],
+        'changed': [
+            unique_id
+            for unique_id in unique_ids
+            if unique_id in previous_exposures
+            and (
+                exposures[unique_id] != previous_exposures[unique_id]
+                or parent_map[unique_id] != previous_parent_map.get(unique_id)
+            )
+        ],
+        'removed': sorted(set(previous_exposures) - set(unique_ids)),
+    }
+
+    return {
+        'version': PATCH_FORMAT_VERSION,
+        'exposures': exposures,
+        'parent_map': parent_map,
+        'child_map': {parent: child_map[parent] for parent in sorted(child_map)},
+        'changes': changes,
+    }
+
+
+def read_patch(path: str) -> Optional[Dict[str, Any]]:
+    """
+    :return: the patch, or None if there is no patch on `path`
+    :raises ValueError: if the patch was written by an unsupported version
+    """
+    try:
+        with open(os.path.expanduser(path), 'rb') as file:
+            patch = serialization.loads(file.read())
+    except FileNotFoundError:
+        return None
+
+    if patch.get('version') != PATCH_FORMAT_VERSION:
+        raise ValueError(f'{path}: unsupported patch format version {patch.get("version")}')
+
+    return patch
+
+
+def write_patch(path: str, patch: Dict[str, Any], compact: bool = False) -> None:
+    with atomic_write(path, 'wb') as file:
+        file.write(serialization.dumps(patch, compact=compact))
+
+
+def apply_patch(manifest: DbtManifest, patch: Dict[str, Any]) -> None:
+    """
+    Adds (or replaces) the exposures of the patch on the manifest (in-memory), and removes the
+    ones no longer found.
+    """
+    for unique_id in patch['changes']['removed']:
+        manifest.remove_exposure(unique_id)
+
+    for unique_id, exposure in patch['exposures'].items():
+        manifest.set_exposure(unique_id, exposure, patch['parent_map'][unique_id])
+
+
+@click.command()
+@click.option(
+    '--manifest-path',
+    required=True,
+    metavar='PATH',
+    type=click.Path(exists=True, dir_okay=False),
+    help='The path to the dbt manifest artifact, modified in place',
+)
+@click.option(
+    '--compact-output',
+    is_flag=True,
+    default=False,
+    help='Write the sections modified without indentation',
+)
+@click.argument('patch_path', metavar='PATCH', type=click.Path(exists=True, dir_okay=False))
+def apply_patch_command(manifest_path: str, compact_output: bool, patch_path: str):
+    """
+    Applies a patch written by the crawler (--patch-output) to the manifest.
+    """
+    try:
+        patch = read_patch(patch_path)
+    except ValueError as error:
+        raise click.UsageError(str(error))
+
+    if patch is None:
+        raise click.UsageError(f'{patch_path}: no such patch')
+
+    logger().info(f'🩹 Applying {len(patch["exposures"])} exposures to: {manifest_path}')
+
+    manifest = DbtManifest.from_file(manifest_path, lazy=True)
+    apply_patch(manifest, patch)
+    manifest.save(manifest_path, compact=compact_output)
+
+
+if __name__ == '__main__':
+    apply_patch_command()
@@ -0,0 +1,9 @@
+from collections import namedtuple
+
+"""
+A lightweight record of a dbt model or source, with only what the crawler needs: its unique id
+(used by exposures) and its fully qualified name on the database (matched against Tableau).
+Records are carried through the whole pipeline instead of the much bigger manifest nodes, which
+are left untouched.
+"""
+ModelRecord = namedtuple('ModelRecord', 'unique_id materialized_name')
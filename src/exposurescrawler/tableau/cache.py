@@ -0,0 +1,333 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Collection, Dict, Iterable, List, Optional, Tuple
+
+from exposurescrawler.tableau.models import (
+    UserDetails,
+    WorkbookDetails,
+    user_details,
+    workbook_details,
+)
+from exposurescrawler.utils.query_parsing import affected_identifiers
+
+"""
+An on-disk (SQLite) cache used for incremental crawls. For every workbook, it keeps which models
+were found on its SQLs and its metadata from the REST API, keyed by the workbook luid and by the
+time the workbook was last updated on Tableau.
+
+The Metadata API can't filter custom SQL tables by when their workbooks were last updated, so
+the SQLs are still retrieved on every run. However, workbooks that haven't changed since the
+last crawl are neither parsed again nor looked up on the REST API.
+
+It also persists the query memo (see `QueryMemo`), so a SQL already parsed on a previous run
+is not parsed again, even if it's used by a workbook that has changed.
+
+Matches also depend on the models of the manifest. Each SQL is stored with the names it is
+looked up as (see `query_identifiers()`), and each workbook with the SQLs it was matched on.
+When the cache is opened, only the SQLs looked up as the names of models added or removed
+since the last run are dropped, together with the workbooks using them, so editing a single
+model does not invalidate the whole cache. The matches of a workbook also depend on the
+connection types crawled (its SQLs on other types are left out), so they are keyed on them as
+well.
+"""
+
+# Caches written with another version of the schema are discarded (and built again)
+_SCHEMA_VERSION = 3
+
+_SCHEMA = '''
+    create table if not exists workbook_matches (
+        luid text not null,
+        source text not null,
+        updated_at text,
+        connection_types text not null,
+        found text not null,
+        primary key (luid, source)
+    );
+
+    create table if not exists workbook_queries (
+        luid text not null,
+        source text not null,
+        key text not null
+    );
+    create index if not exists workbook_queries_workbook on workbook_queries (luid, source);
+    create index if not exists workbook_queries_key on workbook_queries (key);
+
+    create table if not exists workbooks (
+        luid text primary key,
+        updated_at text,
+        details text not null
+    );
+
+    create table if not exists users (
+        id text primary key,
+        details text not null
+    );
+
+    create table if not exists query_matches (
+        key text primary key,
+        found text not null
+    );
+
+    create table if not exists query_identifiers (
+        key text not null,
+        identifier text not null
+    );
+    create index if not exists query_identifiers_key on query_identifiers (key);
+    create index if not exists query_identifiers_identifier on query_identifiers (identifier);
+
+    create table if not exists models (
+        name text primary key
+    );
+'''
+
+
+def models_fingerprint(models: Iterable[str]) -> str:
+    """
+    :param models: the materialized names of all models and sources
+    :return: a fingerprint that changes whenever the set of materialized names changes
+    """
+    digest = hashlib.sha256()
+
+    for materialized_name in sorted(models):
+        digest.update(materialized_name.encode())
+        digest.update(b'\0')
+
+    return digest.hexdigest()
+
+
+class CrawlCache:
+    def __init__(self, path: str, models: Iterable[str], connection_types: Collection[str] = ()):
+        """
+        :param path: the path to the SQLite database
+        :param models: the materialized names of all models and sources of the current manifest
+        :param connection_types: the types of connections crawled
+        """
+        self.path = os.path.expanduser(path)
+        self.connection_types = ','.join(sorted(set(connection_types)))
+
+        # The same connection is shared by the threads crawling Tableau concurrently
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+
+        (version,) = self._connection.execute('pragma user_version').fetchone()
+        if version != _SCHEMA_VERSION:
+            self._drop_tables()
+
+        self._connection.executescript(_SCHEMA)
+        self._connection.execute(f'pragma user_version = {_SCHEMA_VERSION}')
+
+        self._invalidate(models)
+
+    def _invalidate(self, models: Iterable[str]) -> None:
+        """
+        Drops the matches affected by the models added or removed since the last run, and the
+        matches of the workbooks using SQLs that are not cached (e.g. the run was interrupted
+        before they were written).
+        """
+        current = set(models)
+        stored = {name for (name,) in self._connection.execute('select name from models')}
+
+        with self._connection:
+            self._connection.execute(
+                'create temp table if not exists affected (identifier text primary key)'
+            )
+            self._connection.execute('delete from affected')
+            self._connection.executemany(
+                'insert into affected values (?)',
+                ((identifier,) for identifier in affected_identifiers(current ^ stored)),
+            )
+
+            self._connection.execute(
+                'delete from query_matches where key in ('
+                'select key from query_identifiers '
+                'where identifier in (select identifier from affected))'
+            )
+            self._connection.execute(
+                'delete from query_identifiers where key not in (select key from query_matches)'
+            )
+            self._connection.execute(
+                'delete from workbook_matches where exists ('
+                'select 1 from workbook_queries queries '
+                'where queries.luid = workbook_matches.luid '
+                'and queries.source = workbook_matches.source '
+                'and queries.key not in (select key from query_matches))'
+            )
+            self._connection.execute(
+                'delete from workbook_queries where not exists ('
+                'select 1 from workbook_matches '
+                'where workbook_matches.luid = workbook_queries.luid '
+                'and workbook_matches.source = workbook_queries.source)'
+            )
+
+            self._connection.executemany(
+                'delete from models where name = ?', ((name,) for name in stored - current)
+            )
+            self._connection.executemany(
+                'insert into models values (?)', ((name,) for name in current - stored)
+            )
+
+    def _drop_tables(self) -> None:
+        tables = self._connection.execute("select name from sqlite_master where type = 'table'")
+
+        with self._connection:
+            for (table,) in tables.fetchall():
+                self._connection.execute(f'drop table "{table}"')
+
+    def __enter__(self) -> 'CrawlCache':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def get_found(self, luid: str, source: str, updated_at: Optional[str]) -> Optional[List[str]]:
+        """
+        :return: the materialized names of the models found on the SQLs of the workbook, or
+                 None if the workbook has changed (or the models its SQLs depend on or the
+                 connection types crawled have) since it was cached
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'select found from workbook_matches '
+                'where luid = ? and source = ? and updated_at is ? and connection_types = ?',
+                (luid, source, updated_at, self.connection_types),
+            ).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def set_found(
+        self,
+        entries: Iterable[Tuple[str, str, Optional[str], Collection[str], Collection[str]]],
+    ):
+        """
+        The SQLs of the workbooks are expected to be written (see `set_query_matches()`) before
+        the workbooks, or the workbooks are dropped the next time the cache is opened.
+
+        :param entries: tuples of luid, source, updated_at, the materialized names of the
+                        models found and the keys of its SQLs on the query memo
+        """
+        entries = list(entries)
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'insert or replace into workbook_matches values (?, ?, ?, ?, ?)',
+                (
+                    (
+                        luid,
+                        source,
+                        updated_at,
+                        self.connection_types,
+                        json.dumps(sorted(set(found))),
+                    )
+                    for luid, source, updated_at, found, _ in entries
+                ),
+            )
+            self._connection.executemany(
+                'delete from workbook_queries where luid = ? and source = ?',
+                ((luid, source) for luid, source, *_ in entries),
+            )
+            self._connection.executemany(
+                'insert into workbook_queries values (?, ?, ?)',
+                ((luid, source, key) for luid, source, _, _, keys in entries for key in set(keys)),
+            )
+
+    def get_workbooks(self, updated_ats: Dict[str, Optional[str]]) -> Dict[str, WorkbookDetails]:
+        """
+        :param updated_ats: map of workbook luids to when they were last updated
+        :return: the cached metadata of the workbooks that have not changed since cached
+        """
+        output: Dict[str, WorkbookDetails] = {}
+
+        with self._lock:
+            for luid, updated_at in updated_ats.items():
+                row = self._connection.execute(
+                    'select details from workbooks where luid = ? and updated_at is ?',
+                    (luid, updated_at),
+                ).fetchone()
+
+                if row:
+                    output[luid] = WorkbookDetails(**json.loads(row[0]))
+
+        return output
+
+    def set_workbooks(self, workbooks: Iterable[Any], updated_ats: Dict[str, Optional[str]]):
+        """
+        :param workbooks: workbook items (from the REST API) or details (from the cache)
+        :param updated_ats: map of workbook luids to when they were last updated
+        """
+        rows = [
+            (
+                workbook.id,
+                updated_ats.get(workbook.id),
+                json.dumps(workbook_details(workbook)._asdict()),
+            )
+            for workbook in workbooks
+        ]
+
+        with self._lock, self._connection:
+            self._connection.executemany('insert or replace into workbooks values (?, ?, ?)', rows)
+
+    def get_users(self, user_ids: Iterable[str]) -> Dict[str, UserDetails]:
+        output: Dict[str, UserDetails] = {}
+
+        with self._lock:
+            for user_id in user_ids:
+                row = self._connection.execute(
+                    'select details from users where id = ?', (user_id,)
+                ).fetchone()
+
+                if row:
+                    output[user_id] = UserDetails(**json.loads(row[0]))
+
+        return output
+
+    def set_users(self, users: Iterable[Any]) -> None:
+        rows = [(user.id, json.dumps(user_details(user)._asdict())) for user in users]
+
+        with self._lock, self._connection:
+            self._connection.executemany('insert or replace into users values (?, ?)', rows)
+
+    def get_query_matches(self, key: str) -> Optional[List[str]]:
+        """
+        :param key: the key of the query on the query memo
+        :return: the materialized names of the models found on the query, or None if the query
+                 has not been parsed yet (or the models it depends on have changed since)
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'select found from query_matches where key = ?', (key,)
+            ).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def set_query_matches(
+        self, entries: Iterable[Tuple[str, Collection[str], Collection[str]]]
+    ) -> None:
+        """
+        :param entries: tuples of the key of the query, the materialized names of the models
+                        found on it and the identifiers of the query (see `query_identifiers()`)
+        """
+        entries = list(entries)
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'insert or replace into query_matches values (?, ?)',
+                ((key, json.dumps(list(found))) for key, found, _ in entries),
+            )
+            self._connection.executemany(
+                'delete from query_identifiers where key = ?', ((key,) for key, *_ in entries)
+            )
+            self._connection.executemany(
+                'insert into query_identifiers values (?, ?)',
+                (
+                    (key, identifier)
+                    for key, _, identifiers in entries
+                    for identifier in set(identifiers)
+                ),
+            )
@@ -0,0 +1,198 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from exposurescrawler.dbt.models import ModelRecord
+from exposurescrawler.tableau.models import (
+    UserDetails,
+    WorkbookDetails,
+    WorkbookModelsMapping,
+    WorkbookReference,
+    user_details,
+    workbook_details,
+)
+from exposurescrawler.utils.files import atomic_write
+
+"""
+Checkpoints of a crawl, kept on a local state directory, so a crawl that fails late (e.g. a
+dropped connection while retrieving the users, or a crash while saving the manifest) can be
+resumed instead of started over.
+
+What is checkpointed, as soon as it completes:
+
+* every page of the Metadata API, as returned by Tableau (the SQLs);
+* the models found on the SQLs of every page;
+* every stage of the REST API (the metadata of the workbooks and of the users), and the lookup
+  mode chosen for them, so they are resumed on the same mode.
+
+When resuming, completed pages are read from the state directory instead of requested again
+(the next page is requested with the cursor of the last completed one), the models found on
+them are not searched again, and completed stages are skipped.
+
+A checkpoint is only resumed by the same crawl: the same site, options and models (see
+`crawl_fingerprint()`). Otherwise, or when not resuming, the state directory starts empty. It is
+emptied once the crawl completes.
+"""
+
+STAGE_WORKBOOKS = 'workbooks'
+STAGE_USERS = 'users'
+
+# The details kept of the items retrieved by each stage, and how to get them
+_STAGE_DETAILS: Dict[str, Tuple[type, Callable[[Any], Any]]] = {
+    STAGE_WORKBOOKS: (WorkbookDetails, workbook_details),
+    STAGE_USERS: (UserDetails, user_details),
+}
+
+_FINGERPRINT_FILE = 'checkpoint.json'
+_LOOKUP_MODE_FILE = 'stages/lookup_mode.json'
+_SUBDIRECTORIES = ('pages', 'matches', 'stages')
+
+
+def crawl_fingerprint(**parameters: Any) -> str:
+    """
+    :param parameters: what identifies the crawl (e.g. the site URL and the models fingerprint)
+    :return: a fingerprint that changes whenever any of the parameters change
+    """
+    serialized = json.dumps(parameters, sort_keys=True, default=list)
+
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+class CrawlCheckpoint:
+    def __init__(
+        self,
+        directory: str,
+        fingerprint: str,
+        models: Mapping[str, ModelRecord],
+        resume: bool = False,
+    ):
+        """
+        :param directory: the state directory, created if it does not exist
+        :param fingerprint: the fingerprint of the crawl, see `crawl_fingerprint()`
+        :param models: the models of the manifest, by their materialized name
+        :param resume: whether to resume from the checkpoint of a previous run of the same crawl
+        """
+        self.directory = os.path.expanduser(directory)
+        self.fingerprint = fingerprint
+        self.models = models
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Whether the checkpoint of a previous run is being resumed
+        self.resumed = resume and self._read_fingerprint() == fingerprint
+
+        if not self.resumed:
+            self.clear()
+            self._write(_FINGERPRINT_FILE, {'fingerprint': fingerprint}, compress=False)
+
+    def clear(self) -> None:
+        """
+        Removes the checkpoint (only the files written by it, and not the state directory).
+        """
+        for subdirectory in _SUBDIRECTORIES:
+            shutil.rmtree(os.path.join(self.directory, subdirectory), ignore_errors=True)
+
+        try:
+            os.remove(os.path.join(self.directory, _FINGERPRINT_FILE))
+        except FileNotFoundError:
+            pass
+
+    def _read_fingerprint(self) -> Optional[str]:
+        state = self._read(_FINGERPRINT_FILE, compress=False)
+
+        return state and state.get('fingerprint')
+
+    def _read(self, name: str, compress: bool = True) -> Optional[Any]:
+        path = os.path.join(self.directory, name)
+
+        try:
+            with (gzip.open if compress else open)(path, 'rt', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, name: str, value: Any, compress: bool = True) -> None:
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with atomic_write(path, compress=compress, encoding='utf-8') as file:
+            json.dump(value, file)
+
+    def get_page(self, connection_name: str, number: int) -> Optional[dict]:
+        """
+        :return: the results of the page of the Metadata API, or None if it was not completed
+        """
+        return self._read(f'pages/{connection_name}/{number}.json.gz')
+
+    def set_page(self, connection_name: str, number: int, results: dict) -> None:
+        self._write(f'pages/{connection_name}/{number}.json.gz', results)
+
+    def get_matches(self, source: str, number: int) -> Optional[WorkbookModelsMapping]:
+        """
+        :return: the models found on the SQLs of each workbook of the page, or None if they were
+                 not searched yet
+        """
+        entries = self._read(f'matches/{source}/{number}.json.gz')
+
+        if entries is None:
+            return None
+
+        return {
+            WorkbookReference(*reference): [self.models[name] for name in found]
+            for reference, found in entries
+        }
+
+    def set_matches(self, source: str, number: int, matches: WorkbookModelsMapping) -> None:
+        entries = [
+            (list(reference), [model.materialized_name for model in found])
+            for reference, found in matches.items()
+        ]
+
+        self._write(f'matches/{source}/{number}.json.gz', entries)
+
+    def has_stages(self, *stages: str) -> bool:
+        """
+        :return: whether all the stages were completed
+        """
+        return all(
+            os.path.exists(os.path.join(self.directory, f'stages/{stage}.json.gz'))
+            for stage in stages
+        )
+
+    def get_lookup_mode(self) -> Optional[str]:
+        """
+        :return: the lookup mode chosen by a previous run, or None if it was not chosen yet
+        """
+        state = self._read(_LOOKUP_MODE_FILE, compress=False)
+
+        return state and state.get('lookup_mode')
+
+    def set_lookup_mode(self, lookup_mode: str) -> None:
+        self._write(_LOOKUP_MODE_FILE, {'lookup_mode': lookup_mode}, compress=False)
+
+    def get_stage(self, stage: str) -> Optional[Dict[str, tuple]]:
+        """
+        :param stage: `STAGE_WORKBOOKS` or `STAGE_USERS`
+        :return: the map of ids to details retrieved by the stage, or None if it was not
+                 completed
+        """
+        entries: Optional[List[dict]] = self._read(f'stages/{stage}.json.gz')
+
+        if entries is None:
+            return None
+
+        details_type, _ = _STAGE_DETAILS[stage]
+
+        return {entry['id']: details_type(**entry) for entry in entries}
+
+    def set_stage(self, stage: str, items: Mapping[str, Any]) -> None:
+        """
+        :param items: the map of ids to the items (or details) retrieved by the stage
+        """
+        _, to_details = _STAGE_DETAILS[stage]
+        entries = [to_details(item)._asdict() for item in items.values()]
+
+        self._write(f'stages/{stage}.json.gz', entries)
@@ -0,0 +1,21 @@
+"""
+The defaults of the Tableau clients, on a module of their own so they can be used (e.g. on the
+options of the command line) without importing the clients and their dependencies, which are
+only imported once a crawl starts.
+"""
+
+# The number of nodes requested per page from the Metadata API
+DEFAULT_PAGE_SIZE = 1000
+
+DEFAULT_CONNECTION_TYPES = ('snowflake',)
+
+# Tableau Server invalidates idle sessions after 240 minutes by default
+DEFAULT_TOKEN_TTL = 60 * 60
+
+# The number of items requested per page when listing all workbooks or users
+REST_API_PAGE_SIZE = 100
+
+# How many requests are in flight at the same time, at most
+DEFAULT_MAX_CONCURRENCY = 4
+
+DEFAULT_MAX_RETRIES = 5
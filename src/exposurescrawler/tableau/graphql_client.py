@@ -1,9 +1,15 @@
+import itertools
 import pathlib
-from typing import Optional
+from typing import TYPE_CHECKING, Collection, Dict, Iterator, Optional, Set
 
-from exposurescrawler.tableau.models import WorkbookReference, WorkbookModelsMapping
-from exposurescrawler.tableau.rest_client import TableauRestClient
+from exposurescrawler.tableau.checkpoint import CrawlCheckpoint
+from exposurescrawler.tableau.defaults import DEFAULT_CONNECTION_TYPES, DEFAULT_PAGE_SIZE
+from exposurescrawler.tableau.models import SqlQuery, WorkbookReference, WorkbookModelsMapping
 from exposurescrawler.utils.logger import logger
+from exposurescrawler.utils.metrics import metrics
+
+if TYPE_CHECKING:
+    from exposurescrawler.tableau.rest_client import TableauRestClient
 
 """
 For the database connections without custom SQL, the Tableau Metadata API returns
@@ -17,55 +23,144 @@ tries to parse which tables  the query is using but I remember reading on their
 or forums  that this is not that reliable.
 
 Link to my message on their forum: https://community.tableau.com/s/idea/0874T000000HFDxQAO/detail
+
+Both queries are paginated (through the `pageInfo` cursor of the connection), and the results
+are yielded one page at a time, so only a single page has to be held in memory. With a
+checkpoint, every page is checkpointed once retrieved, and pages completed on a previous run are
+read from the checkpoint instead.
+
+Both queries are run once for all the requested connection types (e.g. Snowflake and Postgres),
+and the workbooks found are counted per connection type. Custom SQLs are resolved against the
+default schema of their connection type, since Tableau does not tell their schema.
 """
 
 CURRENT_FOLDER = pathlib.Path(__file__).parent.resolve()
 GRAPHQL_CUSTOM_SQL_QUERY_FILE = '_custom_sql_graphql_query.txt'
 GRAPHQL_NATIVE_SQL_QUERY_FILE = '_native_sql_graphql_query.txt'
 
+# The schema unqualified table names resolve to when a custom SQL runs on a connection of
+# these types, since the Metadata API does not tell the schema of custom SQL connections
+DEFAULT_SCHEMAS = {
+    'postgres': 'public',
+    'redshift': 'public',
+    'sqlserver': 'dbo',
+}
+
+
+def _paginate(
+    tableau_client: 'TableauRestClient',
+    query: str,
+    connection_name: str,
+    page_size: int,
+    variables: Optional[dict] = None,
+    checkpoint: Optional[CrawlCheckpoint] = None,
+) -> Iterator[dict]:
+    """
+    Runs a paginated query on the Metadata API, following the cursor of `connection_name`
+    until there are no pages left.
+
+    :param variables: other variables of the query, besides the pagination ones
+    :param checkpoint: the checkpoint of the crawl, if it can be resumed
+    :return: an iterator over the result of every page
+    """
+    cursor = None
+
+    for number in itertools.count():
+        results = checkpoint.get_page(connection_name, number) if checkpoint else None
+
+        if results is not None:
+            metrics().increment('checkpoint_pages_restored')
+        else:
+            results = tableau_client.run_metadata_api(
+                query, {**(variables or {}), 'first': page_size, 'afterToken': cursor}
+            )
+            metrics().increment('metadata_api_pages')
+
+            if checkpoint:
+                checkpoint.set_page(connection_name, number, results)
+
+        yield results
+
+        page_info = results[connection_name]['pageInfo']
+        if not page_info['hasNextPage']:
+            break
+
+        cursor = page_info['endCursor']
+
 
 def retrieve_custom_sql(
-    tableau_client: TableauRestClient, only_connection_type: Optional[str] = None
-) -> WorkbookModelsMapping:
+    tableau_client: 'TableauRestClient',
+    connection_types: Collection[str] = DEFAULT_CONNECTION_TYPES,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    checkpoint: Optional[CrawlCheckpoint] = None,
+) -> Iterator[WorkbookModelsMapping]:
     """
     Starts at CustomSQLTables and trace them back to workbooks.
 
-    :return:
+    :param connection_types: the types of connections of the custom SQLs to retrieve
+    :param checkpoint: the checkpoint of the crawl, if it can be resumed
+    :return: an iterator over the workbooks and their custom SQLs, one page at a time
     """
-    results = _fetch_custom_sql(tableau_client)
-
     logger().info('🔍 Parsing GraphQL result: looking for custom SQL tables')
 
-    workbooks_custom_sqls: WorkbookModelsMapping = {}
+    all_workbooks: Set[WorkbookReference] = set()
+    workbooks_per_type: Dict[str, Set[str]] = {}
+
+    for results in _fetch_custom_sql(tableau_client, page_size, checkpoint):
+        workbooks_custom_sqls: WorkbookModelsMapping = {}
 
-    for custom_sql_table in results['customSQLTablesConnection']['nodes']:
-        if (
-            only_connection_type
-            and custom_sql_table['database']['connectionType'] != only_connection_type
-        ):
-            # logger().debug('- Ignoring {} connectionType for workbook'.format(
-            #    custom_sql_table['database']['connectionType']))
-            continue
+        for custom_sql_table in results['customSQLTablesConnection']['nodes']:
+            connection_type = custom_sql_table['database']['connectionType']
 
-        for downstream_workbook in custom_sql_table['downstreamWorkbooks']:
-            workbook = WorkbookReference(downstream_workbook['luid'], downstream_workbook['name'])
+            if connection_type not in connection_types:
+                # logger().debug('- Ignoring {} connectionType for workbook'.format(
+                #    custom_sql_table['database']['connectionType']))
+                continue
 
-            logger().debug(f' ➕ {workbook.name} | adding custom SQL')
-            workbooks_custom_sqls.setdefault(workbook, []).append(custom_sql_table['query'])
+            for downstream_workbook in custom_sql_table['downstreamWorkbooks']:
+                workbook = WorkbookReference(
+                    downstream_workbook['luid'],
+                    downstream_workbook['name'],
+                    downstream_workbook.get('updatedAt'),
+                )
 
-    logger().info(f'🔍 Found {len(workbooks_custom_sqls.keys())} workbooks with custom SQL')
+                logger().debug(f' ➕ {workbook.name} | adding custom SQL')
+                workbooks_custom_sqls.setdefault(workbook, []).append(
+                    SqlQuery(
+                        custom_sql_table['query'],
+                        custom_sql_table['database']['name'],
+                        DEFAULT_SCHEMAS.get(connection_type),
+                    )
+                )
+                workbooks_per_type.setdefault(connection_type, set()).add(workbook.id)
 
-    return workbooks_custom_sqls
+        all_workbooks.update(workbooks_custom_sqls.keys())
+        yield workbooks_custom_sqls
 
+    logger().info(
+        f'🔍 Found {len(all_workbooks)} workbooks with custom SQL'
+        + _format_per_type(workbooks_per_type)
+    )
 
-def _fetch_custom_sql(tableau_client):
+
+def _fetch_custom_sql(tableau_client, page_size, checkpoint=None):
     query_custom_sql = (CURRENT_FOLDER / GRAPHQL_CUSTOM_SQL_QUERY_FILE).read_text()
-    return tableau_client.run_metadata_api(query_custom_sql)
+
+    return _paginate(
+        tableau_client,
+        query_custom_sql,
+        'customSQLTablesConnection',
+        page_size,
+        checkpoint=checkpoint,
+    )
 
 
 def retrieve_native_sql(
-    tableau_client: TableauRestClient, connection_type: str
-) -> WorkbookModelsMapping:
+    tableau_client: 'TableauRestClient',
+    connection_types: Collection[str] = DEFAULT_CONNECTION_TYPES,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    checkpoint: Optional[CrawlCheckpoint] = None,
+) -> Iterator[WorkbookModelsMapping]:
     """
     When starting by workbooks -> embeddedDatasources -> upstreamTables, only DatabaseTables are
     included, and not CustomSQLTables. We will need 2 queries.
@@ -76,45 +171,72 @@ def retrieve_native_sql(
     In the results, sometimes fullname has the full name, but other times only the schema and
     table name. If that's the case, we use the name of the database to complete the fullname.
 
-    :return:
+    :param connection_types: the types of connections of the tables to retrieve
+    :param checkpoint: the checkpoint of the crawl, if it can be resumed
+    :return: an iterator over the workbooks and their tables, one page at a time
     """
-    results = _fetch_native_sql(tableau_client, connection_type)
-
     logger().info('')
     logger().info('🔍 Parsing GraphQL result: looking for native SQL tables')
 
-    workbooks_native_sqls: WorkbookModelsMapping = {}
-
-    for native_sql_table in results['workbooksConnection']['nodes']:
-        workbook = WorkbookReference(native_sql_table['luid'], native_sql_table['name'])
+    all_workbooks: Set[WorkbookReference] = set()
+    workbooks_per_type: Dict[str, Set[str]] = {}
 
-        connection_types = []
+    for results in _fetch_native_sql(tableau_client, connection_types, page_size, checkpoint):
+        workbooks_native_sqls: WorkbookModelsMapping = {}
 
-        for embedded_data_source in native_sql_table['embeddedDatasources']:
-            for table in embedded_data_source['upstreamTables']:
-                connection_types.append(table['connectionType'])
+        for native_sql_table in results['workbooksConnection']['nodes']:
+            workbook = WorkbookReference(
+                native_sql_table['luid'],
+                native_sql_table['name'],
+                native_sql_table.get('updatedAt'),
+            )
 
-        if connection_type not in connection_types:
-            # logger().debug(' {} has no *native* Snowflake table'.format(workbook.name))
-            continue
+            for embedded_data_source in native_sql_table['embeddedDatasources']:
+                for table in embedded_data_source['upstreamTables']:
+                    # Already filtered by the query, but checked in case the filter is ignored
+                    if table['connectionType'] not in connection_types:
+                        continue
 
-        for embedded_data_source in native_sql_table['embeddedDatasources']:
-            for table in embedded_data_source['upstreamTables']:
-                fqn = _fix_fqn_native_sql(table)
+                    fqn = _fix_fqn_native_sql(table)
 
-                logger().debug(f' ➕ {workbook.name} | adding native SQL: {fqn}')
-                workbooks_native_sqls.setdefault(workbook, []).append(fqn)
+                    logger().debug(f' ➕ {workbook.name} | adding native SQL: {fqn}')
+                    workbooks_native_sqls.setdefault(workbook, []).append(
+                        SqlQuery(fqn, table['database']['name'], table['schema'])
+                    )
+                    workbooks_per_type.setdefault(table['connectionType'], set()).add(workbook.id)
 
-    logger().info(f'🔍 Found {len(workbooks_native_sqls.keys())} workbooks with native SQL')
+        all_workbooks.update(workbooks_native_sqls.keys())
+        yield workbooks_native_sqls
 
-    return workbooks_native_sqls
+    logger().info(
+        f'🔍 Found {len(all_workbooks)} workbooks with native SQL'
+        + _format_per_type(workbooks_per_type)
+    )
 
 
-def _fetch_native_sql(tableau_client, connection_type):
+def _fetch_native_sql(tableau_client, connection_types, page_size, checkpoint=None):
     query_native_sql = (CURRENT_FOLDER / GRAPHQL_NATIVE_SQL_QUERY_FILE).read_text()
-    query_native_sql = query_native_sql % {'connection_type': connection_type}
 
-    return tableau_client.run_metadata_api(query_native_sql)
+    return _paginate(
+        tableau_client,
+        query_native_sql,
+        'workbooksConnection',
+        page_size,
+        {'connectionTypes': list(connection_types)},
+        checkpoint,
+    )
+
+
+def _format_per_type(workbooks_per_type: Dict[str, Set[str]]) -> str:
+    if len(workbooks_per_type) < 2:
+        return ''
+
+    return ' ({})'.format(
+        ', '.join(
+            f'{connection_type}: {len(workbooks)}'
+            for connection_type, workbooks in sorted(workbooks_per_type.items())
+        )
+    )
 
 
 def _fix_fqn_native_sql(table):
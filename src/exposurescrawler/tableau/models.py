@@ -1,11 +1,53 @@
 from collections import namedtuple
 
-from typing import Any, MutableMapping, MutableSequence
+from typing import Any, MutableMapping, MutableSequence, Optional
 
 """
 A lightweight object representing a Tableau workbook. Useful to be used as keys on mappings
-before more metadata about the workbooks are extracted from Tableau.
+before more metadata about the workbooks are extracted from Tableau. The time the workbook was
+last updated (as returned by the Metadata API) is used to find which workbooks have changed
+since the last crawl.
 """
-WorkbookReference = namedtuple('WorkbookReference', 'id name')
+WorkbookReference = namedtuple('WorkbookReference', 'id name updated_at', defaults=[None])
+
+"""
+A SQL query (or table name) coming from Tableau, together with the database and schema of the
+connection it runs on, used to resolve partially qualified table names.
+"""
+SqlQuery = namedtuple('SqlQuery', 'query database schema', defaults=[None, None])
+
+"""
+The metadata of a workbook and of a user, as used to build exposures, when they are restored from
+the crawl cache instead of retrieved from the Tableau REST API.
+"""
+WorkbookDetails = namedtuple(
+    'WorkbookDetails',
+    'id name description webpage_url owner_id project_name tags created_at updated_at',
+)
+UserDetails = namedtuple('UserDetails', 'id name fullname')
 
 WorkbookModelsMapping = MutableMapping[WorkbookReference, MutableSequence[Any]]
+
+
+def workbook_details(workbook: Any) -> WorkbookDetails:
+    """
+    :param workbook: a workbook item (from the REST API) or its details
+    :return: the details of the workbook, with only values that can be serialized
+    """
+    details = {field: getattr(workbook, field) for field in WorkbookDetails._fields}
+    details['tags'] = sorted(details['tags'] or [])
+    details['created_at'] = _to_text(details['created_at'])
+    details['updated_at'] = _to_text(details['updated_at'])
+
+    return WorkbookDetails(**details)
+
+
+def user_details(user: Any) -> UserDetails:
+    """
+    :param user: a user item (from the REST API) or its details
+    """
+    return UserDetails(**{field: getattr(user, field) for field in UserDetails._fields})
+
+
+def _to_text(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
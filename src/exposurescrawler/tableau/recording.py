@@ -0,0 +1,155 @@
+import base64
+import gzip
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from exposurescrawler.utils.files import atomic_write
+
+"""
+Record and replay of the responses of the Tableau APIs (REST and Metadata API), as transport
+adapters of the `requests` session used by the Tableau client.
+
+When recording, every response is written to a directory, gzipped and addressed by a hash of
+the request that produced it (method, URL and body). When replaying, responses are served from
+that directory without any network call, so a crawl can be reproduced offline and
+deterministically (e.g. to profile the parsing and manifest stages on real data).
+
+Sign-in requests are addressed without their body, so the credentials are never part of a
+recording (not even hashed) and a recording can be replayed with any credentials. Their
+responses contain an authentication token, so recordings should be kept private, even if the
+tokens expire.
+"""
+
+# Requests whose body is not part of their address
+_BODYLESS_PATHS = ('/auth/signin',)
+
+# Headers that are not recorded: the body is recorded already decoded, and cookies might
+# identify the session
+_SKIPPED_HEADERS = frozenset(['content-encoding', 'content-length', 'set-cookie'])
+
+
+def request_key(method: str, url: str, body: Optional[bytes]) -> str:
+    """
+    :return: the address of the response to the request on a recording
+    """
+    if urlsplit(url).path.endswith(_BODYLESS_PATHS):
+        body = None
+
+    digest = hashlib.sha256(f'{method.upper()} {url}\n'.encode())
+    digest.update(body or b'')
+
+    return digest.hexdigest()
+
+
+def _body_bytes(request: requests.PreparedRequest) -> Optional[bytes]:
+    body = request.body
+
+    return body.encode() if isinstance(body, str) else body  # type: ignore
+
+
+def _path(directory: str, key: str) -> str:
+    # Split in subdirectories, so big recordings do not end up on a single directory
+    return os.path.join(directory, key[:2], f'{key}.json.gz')
+
+
+def _encode_body(content: bytes) -> Dict[str, str]:
+    try:
+        return {'body': content.decode('utf-8'), 'body_encoding': 'utf-8'}
+    except UnicodeDecodeError:
+        return {'body': base64.b64encode(content).decode('ascii'), 'body_encoding': 'base64'}
+
+
+def _decode_body(entry: Dict[str, Any]) -> bytes:
+    if entry['body_encoding'] == 'base64':
+        return base64.b64decode(entry['body'])
+
+    return entry['body'].encode('utf-8')
+
+
+class RecordingAdapter(BaseAdapter):
+    """
+    Sends the requests through `adapter` (a regular HTTP adapter by default), and writes every
+    response to `directory`.
+    """
+
+    def __init__(self, directory: str, adapter: Optional[BaseAdapter] = None):
+        super().__init__()
+        self.directory = os.path.expanduser(directory)
+        self.adapter = adapter or HTTPAdapter()
+
+    def send(self, request: requests.PreparedRequest, *args, **kwargs) -> requests.Response:
+        response = self.adapter.send(request, *args, **kwargs)
+
+        key = request_key(request.method or '', request.url or '', _body_bytes(request))
+        entry = {
+            'method': request.method,
+            'url': request.url,
+            'status_code': response.status_code,
+            'reason': response.reason,
+            'headers': {
+                name: value
+                for name, value in response.headers.items()
+                if name.lower() not in _SKIPPED_HEADERS
+            },
+            **_encode_body(response.content),
+        }
+
+        path = _path(self.directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Concurrent requests might record the same response
+        with atomic_write(path, compress=True, encoding='utf-8') as file:
+            json.dump(entry, file)
+
+        return response
+
+    def close(self) -> None:
+        self.adapter.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Serves the responses recorded on `directory` by `RecordingAdapter`, without any network call.
+    Requests that were not recorded fail with a `ConnectionError`.
+    """
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = os.path.expanduser(directory)
+
+    def send(self, request: requests.PreparedRequest, *args, **kwargs) -> requests.Response:
+        key = request_key(request.method or '', request.url or '', _body_bytes(request))
+
+        try:
+            with gzip.open(_path(self.directory, key), 'rt', encoding='utf-8') as file:
+                entry = json.load(file)
+        except FileNotFoundError:
+            raise requests.exceptions.ConnectionError(
+                f'No recorded response for {request.method} {request.url}', request=request
+            )
+
+        response = requests.Response()
+        response.status_code = entry['status_code']
+        response.reason = entry['reason']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response._content = _decode_body(entry)
+        response.url = entry['url']
+        response.request = request
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+def mount(session: requests.Session, adapter: BaseAdapter) -> None:
+    for prefix in ('http://', 'https://'):
+        session.mount(prefix, adapter)
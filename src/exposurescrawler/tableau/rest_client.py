@@ -1,44 +1,297 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from functools import partial
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+import requests
 import tableauserverclient as TSC
-from functools import lru_cache
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+from exposurescrawler.tableau import recording
+from exposurescrawler.tableau.defaults import (
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_TOKEN_TTL,
+    REST_API_PAGE_SIZE,
+)
+from exposurescrawler.tableau.scheduler import RequestScheduler, ScheduledAdapter
+from exposurescrawler.utils.files import atomic_write
+from exposurescrawler.utils.logger import logger
+from exposurescrawler.utils.metrics import metrics
+
+T = TypeVar('T')
+
+
+def _count_response(response: requests.Response, *args, **kwargs) -> None:
+    metrics().increment('tableau_http_requests')
+    metrics().increment('tableau_http_response_bytes', len(response.content))
+
+
+def _session_factory(
+    scheduler: Optional[RequestScheduler] = None,
+    record_dir: Optional[str] = None,
+    replay_dir: Optional[str] = None,
+) -> requests.Session:
+    # Every session (including the ones created when signing in again) counts its responses
+    session = requests.session()
+    session.hooks['response'].append(_count_response)
+
+    # Replayed responses are served locally, so they are not scheduled
+    if replay_dir:
+        recording.mount(session, recording.ReplayAdapter(replay_dir))
+        return session
+
+    adapter: BaseAdapter = recording.RecordingAdapter(record_dir) if record_dir else HTTPAdapter()
+
+    if scheduler:
+        adapter = ScheduledAdapter(scheduler, adapter)
+
+    recording.mount(session, adapter)
+
+    return session
+
+
+class _TokenCache:
+    """
+    Persists authentication tokens on a local JSON file, so back-to-back runs against the
+    same server (and with the same user) can skip signing in.
+    """
+
+    # The file can be shared by the clients of several sites, crawled at the same time
+    _lock = threading.Lock()
+
+    def __init__(self, path: str, ttl: int):
+        self.path = os.path.expanduser(path)
+        self.ttl = ttl
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, entries: dict) -> None:
+        with atomic_write(self.path, permissions=0o600) as file:
+            json.dump(entries, file)
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._read().get(key)
+
+        if entry and entry['expires_at'] > time.time():
+            return entry
+
+        return None
+
+    def set(self, key: str, site_id: str, user_id: str, auth_token: str, site_url: str) -> None:
+        with self._lock:
+            now = time.time()
+            entries = {k: v for k, v in self._read().items() if v['expires_at'] > now}
+            entries[key] = {
+                'site_id': site_id,
+                'user_id': user_id,
+                'auth_token': auth_token,
+                'site_url': site_url,
+                'expires_at': now + self.ttl,
+            }
+            self._write(entries)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            entries = self._read()
+
+            if entries.pop(key, None):
+                self._write(entries)
 
 
 class TableauRestClient:
     """
     Thin wrapper around the official Tableau Server client.
+
+    The client signs in once (lazily, on the first call) and reuses the same session, and
+    therefore the same pooled HTTP connections, for all calls. If the session expires, it
+    signs in again and retries the call. It should be used as a context manager, so it signs
+    out once at the end.
+
+    If a `token_cache_path` is given, the authentication token is persisted there for
+    `token_ttl` seconds and reused by the next runs. In that case, the client does not sign
+    out at the end, since that would invalidate the cached token.
+
+    All requests (and every page of the ones that are paginated) go through a scheduler (see
+    `scheduler.py`), which retries throttled and transient errors with backoff, keeps at most
+    `max_concurrency` requests in flight (fewer while Tableau is overloaded) and, if a
+    `rate_limit` is given, sends at most that many requests per second.
+
+    With a `record_dir`, all responses from Tableau are recorded there, and with a `replay_dir`,
+    the responses recorded there are served instead, without any network call (see
+    `recording.py`).
+
+    The client signs in to the site whose content URL is `site`, or to the default site. It can
+    be shared between threads.
     """
 
-    def __init__(self, url: str, username: str, password: str):
-        self.tableau_auth = TSC.TableauAuth(username, password)
-        self.server = TSC.Server(url, use_server_version=True)
+    def __init__(
+        self,
+        url: str,
+        username: str,
+        password: str,
+        token_cache_path: Optional[str] = None,
+        token_ttl: int = DEFAULT_TOKEN_TTL,
+        record_dir: Optional[str] = None,
+        replay_dir: Optional[str] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        rate_limit: Optional[float] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        site: str = '',
+    ):
+        self.tableau_auth = TSC.TableauAuth(username, password, site_id=site)
+
+        # Shared by all sessions, including the ones created when signing in again
+        self.scheduler = RequestScheduler(max_concurrency, rate_limit, max_retries)
+        self.server = TSC.Server(
+            url,
+            use_server_version=True,
+            session_factory=partial(_session_factory, self.scheduler, record_dir, replay_dir),
+        )
+
+        # Guards signing in, so concurrent calls share a single session
+        self._auth_lock = threading.RLock()
+
+        # The workbooks and users retrieved so far, by their ids
+        self._workbooks: Dict[str, Any] = {}
+        self._users: Dict[str, Any] = {}
+
+        self._token_cache = _TokenCache(token_cache_path, token_ttl) if token_cache_path else None
+        self._token_cache_key = hashlib.sha256(
+            f'{url}|{username}|{self.tableau_auth.site_id}'.encode()
+        ).hexdigest()
+
+    def __enter__(self) -> 'TableauRestClient':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.sign_out()
+
+    def sign_in(self) -> None:
+        with self._auth_lock:
+            if self.server.is_signed_in():
+                return
+
+            if self._token_cache and (entry := self._token_cache.get(self._token_cache_key)):
+                logger().debug('🔑 Reusing cached Tableau authentication token')
+                metrics().increment('tableau_token_cache_hits')
+                self.server._set_auth(
+                    entry['site_id'], entry['user_id'], entry['auth_token'], entry['site_url']
+                )
+                return
+
+            with metrics().span('tableau.sign_in'):
+                self.server.auth.sign_in(self.tableau_auth)
+
+            if self._token_cache:
+                self._token_cache.set(
+                    self._token_cache_key,
+                    self.server.site_id,
+                    self.server.user_id,
+                    self.server.auth_token,
+                    self.server._site_url,
+                )
+
+    def sign_out(self) -> None:
+        if self._token_cache:
+            return
+
+        self.server.auth.sign_out()
+
+    def _reset_auth(self) -> None:
+        if self._token_cache:
+            self._token_cache.delete(self._token_cache_key)
+
+        self.server._clear_auth()
+
+    def _call(self, name: str, function: Callable[[], T]) -> T:
+        """
+        Runs `function` on a signed in session, signing in again (once) if the session has
+        expired in the meantime. The call is measured as the `tableau.<name>` span.
+        """
+        self.sign_in()
+        auth_token = self.server._auth_token
+
+        try:
+            with metrics().span(f'tableau.{name}'):
+                return function()
+        except (TSC.NotSignedInError, TSC.ServerResponseError) as error:
+            if isinstance(error, TSC.ServerResponseError) and not error.code.startswith('401'):
+                raise
+
+            with self._auth_lock:
+                # Another thread might have already signed in again
+                if self.server._auth_token == auth_token:
+                    logger().debug('🔑 Tableau session expired, signing in again')
+                    self._reset_auth()
+                    self.sign_in()
+
+            metrics().increment('tableau_http_retries')
+
+            with metrics().span(f'tableau.{name}'):
+                return function()
+
+    def clear_cache(self) -> None:
+        """
+        Forgets the workbooks and users retrieved so far, so they are retrieved again.
+        """
+        self._workbooks.clear()
+        self._users.clear()
 
-    @lru_cache(maxsize=None)
     def retrieve_workbook(self, workbook_id: str):
-        with self.server.auth.sign_in(self.tableau_auth):
-            workbook = self.server.workbooks.get_by_id(workbook_id)
+        if workbook_id not in self._workbooks:
+            self._workbooks[workbook_id] = self._call(
+                'retrieve_workbook', lambda: self.server.workbooks.get_by_id(workbook_id)
+            )
 
-        return workbook
+        return self._workbooks[workbook_id]
 
-    @lru_cache(maxsize=None)
     def retrieve_user(self, user_id: str):
-        with self.server.auth.sign_in(self.tableau_auth):
-            user = self.server.users.get_by_id(user_id)
+        if user_id not in self._users:
+            self._users[user_id] = self._call(
+                'retrieve_user', lambda: self.server.users.get_by_id(user_id)
+            )
 
-        return user
+        return self._users[user_id]
 
-    def run_metadata_api(self, query: str):
-        with self.server.auth.sign_in(self.tableau_auth):
-            response = self.server.metadata.query(query)
+    def run_metadata_api(self, query: str, variables: Optional[dict] = None):
+        response = self._call(
+            'run_metadata_api', lambda: self.server.metadata.query(query, variables)
+        )
 
         return response['data']
 
     def retrieve_all_workbooks(self):
-        with self.server.auth.sign_in(self.tableau_auth):
-            all_workbooks = list(TSC.Pager(self.server.workbooks))
-
-        return all_workbooks
+        request_options = TSC.RequestOptions(pagesize=REST_API_PAGE_SIZE)
+        return self._call(
+            'retrieve_all_workbooks',
+            lambda: list(TSC.Pager(self.server.workbooks, request_options)),
+        )
 
     def retrieve_all_users(self):
-        with self.server.auth.sign_in(self.tableau_auth):
-            all_users = list(TSC.Pager(self.server.users))
+        request_options = TSC.RequestOptions(pagesize=REST_API_PAGE_SIZE)
+        return self._call(
+            'retrieve_all_users', lambda: list(TSC.Pager(self.server.users, request_options))
+        )
+
+    def count_workbooks(self) -> int:
+        request_options = TSC.RequestOptions(pagesize=1)
+        _, pagination = self._call(
+            'count_workbooks', lambda: self.server.workbooks.get(request_options)
+        )
+
+        return pagination.total_available
+
+    def count_users(self) -> int:
+        request_options = TSC.RequestOptions(pagesize=1)
+        _, pagination = self._call('count_users', lambda: self.server.users.get(request_options))
 
-        return all_users
+        return pagination.total_available
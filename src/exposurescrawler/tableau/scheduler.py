@@ -0,0 +1,240 @@
+import email.utils
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+import requests
+from requests.adapters import BaseAdapter
+
+from exposurescrawler.tableau.defaults import DEFAULT_MAX_CONCURRENCY, DEFAULT_MAX_RETRIES
+from exposurescrawler.utils.logger import logger
+from exposurescrawler.utils.metrics import metrics
+
+"""
+Client-side scheduling of the requests to Tableau, so a crawl goes as fast as the server allows
+without being throttled into failure:
+
+* throttled (429) and transient (5xx, connection errors) failures are retried, after waiting for
+  as long as the `Retry-After` header asks or, without it, for an exponential backoff with
+  jitter;
+* an optional token bucket caps how many requests are sent per second;
+* how many requests are in flight at the same time is adapted (AIMD): the limit is halved when
+  the server signals it is overloaded, and increased by one for every window of healthy
+  requests, up to the maximum concurrency.
+
+It is applied to every HTTP request (e.g. each page of `TSC.Pager` on its own), as a transport
+adapter of the `requests` session used by the Tableau client.
+"""
+
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_CAP = 30.0
+
+# Responses that are retried, and the ones that signal that the server is overloaded
+RETRIED_STATUSES = frozenset([429, 500, 502, 503, 504])
+OVERLOADED_STATUSES = frozenset([429, 503])
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """
+    :param value: the `Retry-After` header, either in seconds or as an HTTP date
+    :return: how many seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class TokenBucket:
+    """
+    Allows up to `rate` acquisitions per second on average, and bursts of up to `burst`.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+
+            # Taken right away, so concurrent callers queue up behind each other
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait:
+            time.sleep(wait)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits how many requests are in flight at the same time, adapting the limit with additive
+    increase and multiplicative decrease, between 1 and `max_limit`.
+    """
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max_limit
+        self.limit = max_limit
+
+        self._condition = threading.Condition()
+        self._in_flight = 0
+
+        # Successes since the limit was last increased, and completions since it was last
+        # decreased, so concurrent failures of the same burst only decrease it once
+        self._successes = 0
+        self._since_decrease = max_limit
+
+    def acquire(self) -> None:
+        with self._condition:
+            self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    def release(self, overloaded: bool) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._since_decrease += 1
+
+            if overloaded:
+                if self._since_decrease >= self.limit and self.limit > 1:
+                    self.limit = max(self.limit // 2, 1)
+                    self._since_decrease = 0
+                    logger().debug(
+                        f'🚦 Tableau is overloaded, lowering concurrency to {self.limit}'
+                    )
+                    metrics().increment('tableau_concurrency_decreases')
+
+                self._successes = 0
+            else:
+                self._successes += 1
+
+                if self._successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+
+            self._condition.notify_all()
+
+
+class RequestScheduler:
+    """
+    Sends requests through the rate limiter and the concurrency limiter, retrying them (up to
+    `max_retries` times) when they fail with a throttled or transient error.
+
+    :param max_concurrency: the maximum number of requests in flight at the same time
+    :param rate_limit: the maximum number of requests per second, if any
+    :param backoff_base: how long to wait (on average, twice as long for every attempt) before
+                         retrying a request, when the server does not say how long to wait
+    :param backoff_cap: the longest wait before retrying a request
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        rate_limit: Optional[float] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_base: float = DEFAULT_BACKOFF_BASE,
+        backoff_cap: float = DEFAULT_BACKOFF_CAP,
+        seed: Optional[int] = None,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+        self.concurrency_limiter = AdaptiveConcurrencyLimiter(max_concurrency)
+        self.token_bucket = TokenBucket(rate_limit) if rate_limit else None
+
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.backoff_cap)
+
+        # Full jitter, so retries of concurrent requests are spread out
+        with self._random_lock:
+            return self._random.uniform(0, min(self.backoff_cap, self.backoff_base * 2**attempt))
+
+    def send(self, send: Callable[[], requests.Response]) -> requests.Response:
+        """
+        :param send: sends the request, and returns its response
+        :return: the response, which might still be an error once all retries are used
+        """
+        attempt = 0
+
+        while True:
+            if self.token_bucket:
+                self.token_bucket.acquire()
+
+            self.concurrency_limiter.acquire()
+            response: Optional[requests.Response] = None
+
+            try:
+                response = send()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+            finally:
+                status = response.status_code if response is not None else None
+                self.concurrency_limiter.release(overloaded=status in OVERLOADED_STATUSES)
+
+            if response is not None and (
+                response.status_code not in RETRIED_STATUSES or attempt >= self.max_retries
+            ):
+                return response
+
+            retry_after = (
+                retry_after_seconds(response.headers.get('Retry-After'))
+                if response is not None
+                else None
+            )
+            delay = self._backoff(attempt, retry_after)
+
+            logger().debug(
+                f'🔁 Retrying {status or "failed request"} in {delay:.2f}s '
+                f'(attempt {attempt + 1} of {self.max_retries})'
+            )
+            metrics().increment('tableau_http_retries')
+            metrics().increment('tableau_backoff_seconds', delay)
+
+            if status == 429:
+                metrics().increment('tableau_http_throttled')
+
+            # Reads the body of the error, so its connection goes back to the pool
+            if response is not None:
+                response.content
+
+            time.sleep(delay)
+            attempt += 1
+
+
+class ScheduledAdapter(BaseAdapter):
+    """
+    Sends the requests through `adapter`, as scheduled by `scheduler`.
+    """
+
+    def __init__(self, scheduler: RequestScheduler, adapter: BaseAdapter):
+        super().__init__()
+        self.scheduler = scheduler
+        self.adapter = adapter
+
+    def send(self, request: requests.PreparedRequest, *args, **kwargs) -> requests.Response:
+        return self.scheduler.send(lambda: self.adapter.send(request, *args, **kwargs))
+
+    def close(self) -> None:
+        self.adapter.close()
@@ -0,0 +1,191 @@
+import hashlib
+import os
+from collections import namedtuple
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from exposurescrawler.dbt.models import ModelRecord
+from exposurescrawler.tableau.models import (
+    UserDetails,
+    WorkbookDetails,
+    WorkbookModelsMapping,
+    WorkbookReference,
+    user_details,
+    workbook_details,
+)
+from exposurescrawler.tableau.sites import TableauSite
+from exposurescrawler.utils import serialization
+from exposurescrawler.utils.files import atomic_write
+
+"""
+Sharded crawls: the workbooks of a site are partitioned into N shards by a hash of their luid,
+so each shard can be crawled on a different machine. A shard still goes through all the pages
+of the Metadata API (which can't be partitioned on the server), but it only searches the SQLs
+of its own workbooks, and only looks up those workbooks and their owners on the REST API.
+
+Instead of the manifest, each shard writes a compact partial result: for every workbook of the
+shard referencing models, the models found and the metadata of the workbook and of its owner.
+The partial results of all shards are then merged and applied to the manifest at once (see
+`tableau_merge.py`).
+"""
+
+SHARD_FORMAT_VERSION = 1
+
+"""
+A shard of a crawl: its (1-based) index and the total number of shards.
+"""
+Shard = namedtuple('Shard', 'index count')
+
+# The results of crawling a site: the workbooks with models found, and the maps of workbooks and
+# users
+SiteResults = Tuple[WorkbookModelsMapping, Mapping[str, Any], Mapping[str, Any]]
+
+
+class ShardError(ValueError):
+    """
+    The partial results to merge are not valid, or are not all the shards of the same crawl.
+    """
+
+
+def parse_shard(value: str) -> Shard:
+    """
+    :param value: the shard as `i/N`, e.g. `2/4` for the second of four shards
+    :raises ValueError: if the value is not a valid shard
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f'expected i/N (e.g. 1/4), got {value!r}')
+
+    if not 1 <= index <= count:
+        raise ValueError(f'the index must be between 1 and {count}, got {index}')
+
+    return Shard(index, count)
+
+
+def in_shard(luid: str, shard: Shard) -> bool:
+    # A stable hash, unlike `hash()`, so every machine agrees on the shard of each workbook
+    digest = hashlib.sha256(luid.encode()).digest()
+
+    return int.from_bytes(digest[:8], 'big') % shard.count == shard.index - 1
+
+
+def shard_pages(
+    workbooks_sqls_pages: Iterable[WorkbookModelsMapping], shard: Optional[Shard]
+) -> Iterable[WorkbookModelsMapping]:
+    """
+    :return: the same pages, with only the workbooks of `shard` (or all of them, without a shard)
+    """
+    if shard is None:
+        return workbooks_sqls_pages
+
+    return (
+        {
+            workbook_reference: sqls
+            for workbook_reference, sqls in workbooks_sqls.items()
+            if in_shard(workbook_reference.id, shard)
+        }
+        for workbooks_sqls in workbooks_sqls_pages
+    )
+
+
+def write_shard(
+    path: str, shard: Shard, sites_results: Sequence[Tuple[TableauSite, SiteResults]]
+) -> None:
+    """
+    Writes the partial results of a shard. Only the names and URLs of the sites are written,
+    and not their credentials.
+    """
+    sites = []
+
+    for site, (workbooks_models, workbook_owner_map, user_userid_map) in sites_results:
+        workbooks = []
+
+        for workbook_reference, found in workbooks_models.items():
+            workbook = workbook_owner_map[workbook_reference.id]
+
+            workbooks.append(
+                {
+                    'reference': list(workbook_reference),
+                    'models': sorted(
+                        set((model.unique_id, model.materialized_name) for model in found)
+                    ),
+                    'workbook': workbook_details(workbook)._asdict(),
+                    'owner': user_details(user_userid_map[workbook.owner_id])._asdict(),
+                }
+            )
+
+        sites.append({'name': site.name, 'url': site.url, 'workbooks': workbooks})
+
+    output = {
+        'version': SHARD_FORMAT_VERSION,
+        'shard': {'index': shard.index, 'count': shard.count},
+        'sites': sites,
+    }
+
+    with atomic_write(path, 'wb') as file:
+        file.write(serialization.dumps(output, compact=True))
+
+
+def _read_shard(path: str) -> Dict[str, Any]:
+    with open(os.path.expanduser(path), 'rb') as file:
+        try:
+            shard = serialization.loads(file.read())
+        except ValueError as error:
+            raise ShardError(f'{path}: not a shard ({error})')
+
+    if shard.get('version') != SHARD_FORMAT_VERSION:
+        raise ShardError(f'{path}: unsupported shard format version {shard.get("version")}')
+
+    return shard
+
+
+def read_shards(paths: Iterable[str]) -> List[Tuple[TableauSite, SiteResults]]:
+    """
+    Reads the partial results of all the shards of a crawl, and merges them. The results are
+    the same regardless of the order of `paths`.
+
+    :return: the results of every site, in the same order as crawled
+    :raises ShardError: if the shards are not all the shards of the same crawl
+    """
+    shards = sorted(
+        (_read_shard(path) for path in paths), key=lambda shard: shard['shard']['index']
+    )
+
+    counts = set(shard['shard']['count'] for shard in shards)
+    if len(counts) != 1:
+        raise ShardError(
+            f'the shards are from crawls with different shard counts: {sorted(counts)}'
+        )
+
+    indexes = [shard['shard']['index'] for shard in shards]
+    if indexes != list(range(1, counts.pop() + 1)):
+        raise ShardError(f'expected every shard exactly once, got shards {indexes}')
+
+    merged: Dict[Any, Tuple[TableauSite, Dict[str, dict]]] = {}
+
+    for shard in shards:
+        for site in shard['sites']:
+            _, workbooks = merged.setdefault(
+                site['name'], (TableauSite(site['name'], site['url'], '', ''), {})
+            )
+            workbooks.update((entry['reference'][0], entry) for entry in site['workbooks'])
+
+    return [(site, _site_results(workbooks)) for site, workbooks in merged.values()]
+
+
+def _site_results(workbooks: Dict[str, dict]) -> SiteResults:
+    workbooks_models: WorkbookModelsMapping = {}
+    workbook_owner_map: Dict[str, WorkbookDetails] = {}
+    user_userid_map: Dict[str, UserDetails] = {}
+
+    # In the order of the luids, so the manifest is the same whatever shard each workbook was on
+    for luid in sorted(workbooks):
+        entry = workbooks[luid]
+
+        workbooks_models[WorkbookReference(*entry['reference'])] = [
+            ModelRecord(*model) for model in entry['models']
+        ]
+        workbook_owner_map[luid] = WorkbookDetails(**entry['workbook'])
+        user_userid_map[entry['owner']['id']] = UserDetails(**entry['owner'])
+
+    return workbooks_models, workbook_owner_map, user_userid_map
@@ -0,0 +1,84 @@
+import json
+import os
+from collections import namedtuple
+from typing import List
+
+"""
+The Tableau sites to crawl. By default, a single site is crawled, configured through the
+`TABLEAU_URL`, `TABLEAU_USERNAME` and `TABLEAU_PASSWORD` environment variables.
+
+Several sites (on the same Tableau Server or not) can be configured on a JSON file instead,
+with a list of objects like the one below. Values can reference environment variables (e.g.
+`$TABLEAU_SALES_PASSWORD`), so credentials do not have to be written on the file:
+
+    {
+        "name": "sales",
+        "url": "https://tableau.company.com",
+        "site": "sales",
+        "username": "$TABLEAU_SALES_USERNAME",
+        "password": "$TABLEAU_SALES_PASSWORD"
+    }
+
+`site` is the content URL of the site (the part after `/site/` on its URLs), and can be left out
+for the default site. `name` identifies the site on the names of its exposures, so it must be
+unique.
+"""
+
+"""
+A Tableau site to crawl, and the credentials to sign in to it. The name is None for the single
+site configured through environment variables.
+"""
+TableauSite = namedtuple('TableauSite', 'name url username password content_url', defaults=[''])
+
+_REQUIRED_FIELDS = ('name', 'url', 'username', 'password')
+
+
+def site_from_environment() -> TableauSite:
+    return TableauSite(
+        None,
+        os.environ['TABLEAU_URL'],
+        os.environ['TABLEAU_USERNAME'],
+        os.environ['TABLEAU_PASSWORD'],
+    )
+
+
+def load_sites(path: str) -> List[TableauSite]:
+    """
+    :param path: the path to the JSON file listing the sites (see the module docstring)
+    :return: the sites, in the same order
+    :raises ValueError: if the file does not list the sites as expected
+    """
+    from slugify import slugify
+
+    with open(os.path.expanduser(path)) as file:
+        entries = json.load(file)
+
+    if not isinstance(entries, list) or not entries:
+        raise ValueError('expected a non-empty list of sites')
+
+    sites = []
+
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f'site #{index + 1} is not an object')
+
+        missing = [field for field in _REQUIRED_FIELDS if not entry.get(field)]
+        if missing:
+            raise ValueError(f'site #{index + 1} is missing {", ".join(missing)}')
+
+        sites.append(
+            TableauSite(
+                slugify(entry['name'], separator='_'),
+                os.path.expandvars(entry['url']).rstrip('/'),
+                os.path.expandvars(entry['username']),
+                os.path.expandvars(entry['password']),
+                entry.get('site') or '',
+            )
+        )
+
+    names = [site.name for site in sites]
+    duplicated = sorted(set(name for name in names if names.count(name) > 1))
+    if duplicated:
+        raise ValueError(f'site names must be unique: {", ".join(duplicated)}')
+
+    return sites
@@ -0,0 +1,48 @@
+import gzip
+import os
+import threading
+from contextlib import contextmanager
+from typing import IO, Any, Iterator, Optional
+
+
+@contextmanager
+def atomic_write(
+    path: str,
+    mode: str = 'w',
+    compress: bool = False,
+    permissions: Optional[int] = None,
+    **kwargs: Any,
+) -> Iterator[IO]:
+    """
+    Opens a temporary file next to `path`, which replaces `path` once written. A crash or a
+    failure while writing never leaves `path` half written: the previous file is kept instead.
+
+    Each thread writes to a temporary file of its own, so the same file can be written by
+    several threads at the same time (the last one to finish wins).
+
+    :param mode: the mode to open the file with, `w` (text) or `wb` (binary)
+    :param compress: whether to write the file gzipped
+    :param permissions: the permissions of the file if not the default ones (e.g. 0o600, for
+                        files holding credentials)
+    :param kwargs: passed on to `open()` (or `gzip.open()`), e.g. `encoding`
+    """
+    temporary_path = f'{path}.{threading.get_ident()}.tmp'
+
+    if permissions is not None:
+        os.close(os.open(temporary_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, permissions))
+
+    if compress and 'b' not in mode:
+        mode += 't'
+
+    try:
+        with (gzip.open if compress else open)(temporary_path, mode, **kwargs) as file:
+            yield file  # type: ignore
+    except BaseException:
+        try:
+            os.remove(temporary_path)
+        except FileNotFoundError:
+            pass
+
+        raise
+
+    os.replace(temporary_path, path)
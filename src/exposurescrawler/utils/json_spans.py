@@ -0,0 +1,120 @@
+import re
+from typing import Callable, List, Optional, Tuple
+
+"""
+Minimal scanner that finds where the values of a JSON object are, as byte spans, without
+decoding them. It is used to only decode the parts of a (potentially huge) JSON document that
+are needed, and to copy the other parts through as they are.
+
+The document is expected to be valid JSON.
+"""
+
+_WHITESPACE_RE = re.compile(rb'[ \t\n\r]*')
+_STRING_RE = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"')
+_SCALAR_RE = re.compile(rb'[^,}\] \t\n\r]+')
+
+# Skips everything up to the next bracket, in a single match. Strings are matched as a whole, so
+# brackets inside of them are not counted
+_NEXT_BRACKET_RE = re.compile(rb'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*[\[\]{}]')
+_OPENING_BRACKETS = (ord('{'), ord('['))
+
+Span = Tuple[int, int]
+
+
+def skip_whitespace(buffer, position: int) -> int:
+    return _WHITESPACE_RE.match(buffer, position).end()  # type: ignore
+
+
+def _peek(buffer, position: int) -> bytes:
+    end = position + 1
+    return buffer[position:end]
+
+
+def _expect(buffer, position: int, token: bytes) -> int:
+    if _peek(buffer, position) != token:
+        raise ValueError(f'Expected {token!r} at position {position}')
+
+    return position + 1
+
+
+def _string_end(buffer, position: int) -> int:
+    match = _STRING_RE.match(buffer, position)
+
+    if not match:
+        raise ValueError(f'Expected a string at position {position}')
+
+    return match.end()
+
+
+def value_end(buffer, position: int) -> int:
+    """
+    :param buffer: the JSON document
+    :param position: where a value starts
+    :return: the position right after the end of the value
+    """
+    first = _peek(buffer, position)
+
+    if first == b'"':
+        return _string_end(buffer, position)
+
+    if first not in (b'{', b'['):
+        match = _SCALAR_RE.match(buffer, position)
+
+        if not match:
+            raise ValueError(f'Expected a value at position {position}')
+
+        return match.end()
+
+    depth = 0
+    end = position
+
+    while match := _NEXT_BRACKET_RE.match(buffer, end):
+        end = match.end()
+
+        if buffer[end - 1] in _OPENING_BRACKETS:
+            depth += 1
+        else:
+            depth -= 1
+
+            if depth == 0:
+                return end
+
+    raise ValueError(f'Unterminated value starting at position {position}')
+
+
+def object_members(
+    buffer, position: int, scan_value: Optional[Callable[[Span, int], int]] = None
+) -> Tuple[List[Tuple[Span, Span]], int]:
+    """
+    Finds the members of a JSON object.
+
+    :param buffer: the JSON document
+    :param position: where the object starts
+    :param scan_value: called with the span of each key and where its value starts, returning
+                       where the value ends. Allows values to be processed while they are
+                       scanned, instead of scanning them twice. Defaults to `value_end()`
+    :return: the spans of each key (including the quotes) and of each value, and the position
+             right after the end of the object
+    """
+    members: List[Tuple[Span, Span]] = []
+    position = skip_whitespace(buffer, _expect(buffer, position, b'{'))
+
+    if _peek(buffer, position) == b'}':
+        return members, position + 1
+
+    while True:
+        key_end = _string_end(buffer, position)
+        key_span = (position, key_end)
+
+        position = skip_whitespace(buffer, key_end)
+        position = skip_whitespace(buffer, _expect(buffer, position, b':'))
+
+        end = scan_value(key_span, position) if scan_value else value_end(buffer, position)
+        members.append((key_span, (position, end)))
+
+        position = skip_whitespace(buffer, end)
+
+        if _peek(buffer, position) == b'}':
+            return members, position + 1
+
+        position = skip_whitespace(buffer, _expect(buffer, position, b','))
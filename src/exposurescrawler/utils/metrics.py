@@ -0,0 +1,137 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional
+
+from exposurescrawler.utils.files import atomic_write
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore
+
+"""
+Instrumentation of a crawl: spans (how many times a stage ran and for how long) and counters
+(e.g. how many SQLs were parsed or how many bytes came from Tableau), shared by all modules
+through `metrics()`, in the same way as `logger()`.
+
+At the end of a crawl, they can be written as a JSON run report and as a file for the textfile
+collector of the Prometheus node exporter.
+"""
+
+PROMETHEUS_PREFIX = 'exposurescrawler'
+
+
+def _peak_memory_bytes() -> Optional[int]:
+    if resource is None:  # pragma: no cover
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Reported in bytes on macOS, and in kilobytes on Linux
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def _prometheus_name(name: str) -> str:
+    return re.sub(r'[^a-zA-Z0-9_]', '_', f'{PROMETHEUS_PREFIX}_{name}')
+
+
+class Metrics:
+    """
+    Thread-safe registry of spans and counters.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started_at = time.time()
+            self._started = time.perf_counter()
+            self.spans: Dict[str, Dict[str, float]] = {}
+            self.counters: Dict[str, float] = {}
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """
+        Measures how long the block takes. Spans with the same name are aggregated.
+        """
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            span = self.spans.setdefault(name, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            span['count'] += 1
+            span['seconds'] += seconds
+            span['max_seconds'] = max(span['max_seconds'], seconds)
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self) -> Dict[str, Any]:
+        """
+        :return: the run report: the spans, the counters and the peak memory of the process
+        """
+        with self._lock:
+            return {
+                'started_at': self.started_at,
+                'duration_seconds': round(time.perf_counter() - self._started, 6),
+                'peak_memory_bytes': _peak_memory_bytes(),
+                'spans': {
+                    name: {**span, 'seconds': round(span['seconds'], 6)}
+                    for name, span in self.spans.items()
+                },
+                'counters': dict(self.counters),
+            }
+
+    def write_report(self, path: str) -> None:
+        with atomic_write(os.path.expanduser(path)) as file:
+            json.dump(self.report(), file, indent=4)
+
+    def write_prometheus_textfile(self, path: str) -> None:
+        """
+        Writes the metrics in the Prometheus text format. The file is written to a temporary
+        file first and then renamed, so the collector never reads a partial file.
+        """
+        report = self.report()
+        lines = []
+
+        for metric, kind, key in [
+            ('span_seconds_total', 'counter', 'seconds'),
+            ('span_count_total', 'counter', 'count'),
+            ('span_max_seconds', 'gauge', 'max_seconds'),
+        ]:
+            lines.append(f'# TYPE {_prometheus_name(metric)} {kind}')
+            lines.extend(
+                f'{_prometheus_name(metric)}{{span="{name}"}} {span[key]}'
+                for name, span in report['spans'].items()
+            )
+
+        for name, value in report['counters'].items():
+            lines.append(f'# TYPE {_prometheus_name(name)}_total counter')
+            lines.append(f'{_prometheus_name(name)}_total {value}')
+
+        for name in ('duration_seconds', 'peak_memory_bytes', 'started_at'):
+            if report[name] is not None:
+                lines.append(f'# TYPE {_prometheus_name(name)} gauge')
+                lines.append(f'{_prometheus_name(name)} {report[name]}')
+
+        with atomic_write(os.path.expanduser(path)) as file:
+            file.write('\n'.join(lines) + '\n')
+
+
+@lru_cache
+def metrics() -> Metrics:
+    return Metrics()
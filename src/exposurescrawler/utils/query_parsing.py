@@ -1,22 +1,453 @@
-from typing import Any, Mapping, Dict
+import hashlib
+import math
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
 
+# A single identifier part: quoted ("..."), backticked (`...`), bracketed ([...]) or bare. Bare
+# parts can contain single hyphens (e.g. the BigQuery project `my-project`), but not `--`, which
+# starts a comment
+_IDENTIFIER_PART = r'"[^"]*"|`[^`]*`|\[[^\]]*\]|[a-z_][a-z0-9_$]*(?:-[a-z0-9_$]+)*'
 
-def search_model_in_query(query: str, models: Mapping[str, Any]) -> Dict[str, Any]:
+# A (possibly) qualified identifier, such as `table`, `schema.table` or `db.schema.table`
+_IDENTIFIER_RE = re.compile(rf'(?:{_IDENTIFIER_PART})(?:\s*\.\s*(?:{_IDENTIFIER_PART}))*')
+
+# Names defined on common table expressions, e.g. `with orders as (...)`
+_CTE_NAME_RE = re.compile(r'([a-z_][a-z0-9_$]*)\s+as\s*\(')
+
+# Keywords after which an identifier refers to a table
+_TABLE_KEYWORDS = frozenset(['from', 'join'])
+
+
+def _split_identifier(identifier: str) -> List[str]:
+    return [part.strip().strip('"`[]').strip() for part in identifier.split('.')]
+
+
+def tokenize_query(query: str) -> List[Sequence[str]]:
+    """
+    Tokenizes a SQL query once into the identifiers that could reference a table.
+
+    Fully qualified identifiers (`database.schema.table`) are returned wherever they
+    appear, while partially qualified (`schema.table`) and bare (`table`) identifiers are
+    only returned when they directly follow a `FROM` or `JOIN`, since anywhere else they
+    are most likely columns. Names of common table expressions are never returned bare.
+
+    :param query: the raw SQL query
+    :return: a list of identifiers, each one as a sequence of (lowercase) parts
+    """
+    query = query.lower()
+    cte_names = set(_CTE_NAME_RE.findall(query))
+
+    identifiers: List[Sequence[str]] = []
+    previous = None
+
+    for match in _IDENTIFIER_RE.finditer(query):
+        parts = _split_identifier(match.group())
+
+        if len(parts) >= 3:
+            identifiers.append(parts[-3:])
+        elif previous in _TABLE_KEYWORDS and not (len(parts) == 1 and parts[0] in cte_names):
+            identifiers.append(parts)
+
+        previous = parts[-1] if len(parts) == 1 else None
+
+    return identifiers
+
+
+def _lookup_name(
+    parts: Sequence[str], database: Optional[str], schema: Optional[str]
+) -> Optional[str]:
+    """
+    :return: the fully qualified name an identifier is looked up as, `database.*.table` for bare
+             names when the schema is unknown (any schema, as long as it is unambiguous), or
+             None if it can't be resolved
+    """
+    if len(parts) == 3:
+        return '.'.join(parts)
+
+    if not database:
+        return None
+
+    if len(parts) == 2:
+        return '{}.{}.{}'.format(database, *parts)
+
+    return '{}.{}.{}'.format(database, schema or '*', parts[0])
+
+
+def query_identifiers(
+    query: str, database: Optional[str] = None, schema: Optional[str] = None
+) -> Set[str]:
+    """
+    The (lowercase) names a query is looked up as by `ModelIndex.search()`, whether they are
+    models or not. The models found on the query can only change if a model with one of these
+    names is added or removed (see `affected_identifiers()`).
+
+    :param query: the raw SQL query, or the fully qualified name of a table (native SQL)
+    :param database: the database of the connection running the query, if known
+    :param schema: the schema of the connection running the query, if known
+    """
+    database = database.lower() if database else None
+    schema = schema.lower() if schema else None
+
+    identifiers = {_lookup_name(parts, database, schema) for parts in tokenize_query(query)}
+
+    # Looked up as it is, in case it is the table of a native SQL
+    if (name := query.strip().lower()).count('.') == 2:
+        identifiers.add(name)
+
+    identifiers.discard(None)
+    return identifiers  # type: ignore
+
+
+def affected_identifiers(models: Iterable[str]) -> Set[str]:
+    """
+    :param models: the materialized names of models added or removed
+    :return: the identifiers (see `query_identifiers()`) whose lookups are affected
+    """
+    identifiers = set()
+
+    for model in models:
+        fqn = model.lower()
+        identifiers.add(fqn)
+
+        parts = fqn.split('.')
+        if len(parts) == 3:
+            identifiers.add('{}.*.{}'.format(parts[0], parts[2]))
+
+    return identifiers
+
+
+class ModelIndex:
+    """
+    Index of the models keyed by their fully qualified names (`database.schema.table`),
+    built once and reused for every query.
+
+    Partially qualified identifiers found on a query are resolved against the database
+    (and schema, if known) of the connection the query runs on, so every identifier is
+    looked up in constant time. Matching happens on whole identifiers: `db.schema.order`
+    does not match `db.schema.orders`.
+    """
+
+    def __init__(self, models: Mapping[str, Any]):
+        self.models = models
+
+        # Lowercase fully qualified name => key on `models`
+        self._by_fqn: Dict[str, str] = {}
+
+        # database => table => keys on `models`, used to resolve bare table names when
+        # the schema of the connection is unknown
+        self._by_database_table: Dict[str, Dict[str, List[str]]] = {}
+
+        for model in models.keys():
+            fqn = model.lower()
+            self._by_fqn[fqn] = model
+
+            parts = fqn.split('.')
+            if len(parts) == 3:
+                database, _, table = parts
+                self._by_database_table.setdefault(database, {}).setdefault(table, []).append(model)
+
+    def _resolve(
+        self, parts: Sequence[str], database: Optional[str], schema: Optional[str]
+    ) -> Optional[str]:
+        name = _lookup_name(parts, database, schema)
+
+        if name is None:
+            return None
+
+        if len(parts) == 1 and not schema:
+            # Without a schema, a bare table name is only resolved if it is unambiguous
+            candidates = self._by_database_table.get(database, {}).get(parts[0], [])  # type: ignore
+            return candidates[0] if len(candidates) == 1 else None
+
+        return self._by_fqn.get(name)
+
+    def search(
+        self, query: str, database: Optional[str] = None, schema: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Returns which models (if any) were found in the query.
+
+        :param query: the raw SQL query, or the fully qualified name of a table (native SQL)
+        :param database: the database of the connection running the query, if known
+        :param schema: the schema of the connection running the query, if known
+        :return: a dictionary of the models found, keyed by their fully qualified names
+        """
+        # The tables of native SQL are already fully qualified names, which might not be valid
+        # SQL identifiers (e.g. with spaces), so they are looked up as they are
+        if model := self._by_fqn.get(query.strip().lower()):
+            return {model: self.models[model]}
+
+        database = database.lower() if database else None
+        schema = schema.lower() if schema else None
+
+        found: Dict[str, Any] = {}
+        seen: Set[str] = set()
+
+        for parts in tokenize_query(query):
+            identifier = '.'.join(parts)
+            if identifier in seen:
+                continue
+            seen.add(identifier)
+
+            if model := self._resolve(parts, database, schema):
+                found[model] = self.models[model]
+
+        return found
+
+    def search_many(
+        self, queries: Sequence[Tuple[str, Optional[str], Optional[str]]]
+    ) -> List[Tuple[str, ...]]:
+        """
+        :param queries: tuples of the raw SQL query, and the database and schema of its connection
+        :return: the keys of the models found on each query, in the same order
+        """
+        return [tuple(self.search(*query).keys()) for query in queries]
+
+
+# The index of each worker process of `ParallelModelIndex`, built once when the worker starts
+_worker_index: Optional[ModelIndex] = None
+
+
+def _init_worker(compact_models: Dict[str, str]) -> None:
+    global _worker_index
+    _worker_index = ModelIndex(compact_models)
+
+
+def _search_chunk(
+    queries: Sequence[Tuple[str, Optional[str], Optional[str]]],
+) -> List[Tuple[str, ...]]:
+    # The compact models map to unique ids, so only the unique ids are sent back
+    return [tuple(_worker_index.search(*query).values()) for query in queries]  # type: ignore
+
+
+def _ping() -> None:
+    pass
+
+
+class ParallelModelIndex:
+    """
+    Same as `ModelIndex`, but `search_many` shards the queries across `workers` processes,
+    since matching is CPU-bound.
+
+    Every worker builds its own index once, from a compact form of the models (their
+    materialized names and unique ids), and sends back only the unique ids of the models found,
+    so little data is exchanged between processes. The results are the same as `ModelIndex`.
+
+    It should be used as a context manager, so the worker processes are stopped at the end.
+    """
+
+    def __init__(self, models: Mapping[str, Any], workers: int):
+        self.models = models
+        self._index = ModelIndex(models)
+        self._names = {model.unique_id: name for name, model in models.items()}
+        self._workers = workers
+
+        compact_models = {name: model.unique_id for name, model in models.items()}
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(compact_models,)
+        )
+
+        # Start the workers right away, before any other thread is started by the crawler,
+        # since forking a process while other threads are running is unsafe
+        self._executor.submit(_ping).result()
+
+    def __enter__(self) -> 'ParallelModelIndex':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown()
+
+    def search(
+        self, query: str, database: Optional[str] = None, schema: Optional[str] = None
+    ) -> Dict[str, Any]:
+        # A single query is not worth sending to another process
+        return self._index.search(query, database, schema)
+
+    def search_many(
+        self, queries: Sequence[Tuple[str, Optional[str], Optional[str]]]
+    ) -> List[Tuple[str, ...]]:
+        if not queries:
+            return []
+
+        # A few chunks per worker, so they are evenly busy
+        chunk_size = math.ceil(len(queries) / (self._workers * 4))
+        starts = range(0, len(queries), chunk_size)
+        chunks = [queries[slice(start, start + chunk_size)] for start in starts]
+
+        return [
+            tuple(self._names[unique_id] for unique_id in found)
+            for results in self._executor.map(_search_chunk, chunks)
+            for found in results
+        ]
+
+
+def search_model_in_query(
+    query: str,
+    models: Mapping[str, Any],
+    database: Optional[str] = None,
+    schema: Optional[str] = None,
+) -> Dict[str, Any]:
     """
     Takes a SQL query and a sequence of models and returns which models (if any) were
     found in the query.
 
+    When searching many queries against the same models, build a `ModelIndex` once
+    and reuse it instead.
+
     :param query:
     :param models:
+    :param database: the database of the connection running the query, if known
+    :param schema: the schema of the connection running the query, if known
     :return:
     """
+    return ModelIndex(models).search(query, database, schema)
+
+
+class QueryMemo:
+    """
+    Memoizes the models found on each distinct query (on the same database and schema), so
+    the same SQL copy-pasted across many workbooks is only parsed once per run.
+
+    Queries are keyed on a hash of their normalized text, and at most `maxsize` entries are
+    kept in memory, evicting the least recently used ones. If a `store` is given, entries are
+    also looked up there on a miss, and new entries are written to it on `flush()` along with
+    the identifiers of their queries (see `query_identifiers()`), so the memo persists across
+    runs. The store is expected to drop the entries whose identifiers are affected by the models
+    added or removed since they were written.
+
+    The memo can be shared between threads, and has the same `search` and `search_many` methods
+    as `ModelIndex`.
+    """
+
+    def __init__(self, model_index: ModelIndex, maxsize: int, store: Optional[Any] = None):
+        self.model_index = model_index
+        self.models = model_index.models
+        self.maxsize = maxsize
+        self.store = store
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Tuple[str, ...]]' = OrderedDict()
+        self._pending: Dict[str, Tuple[Tuple[str, ...], Set[str]]] = {}
+
+    @staticmethod
+    def key(query: str, database: Optional[str], schema: Optional[str]) -> str:
+        normalized = '\0'.join(
+            [query.strip().lower(), (database or '').lower(), (schema or '').lower()]
+        )
+        return hashlib.sha1(normalized.encode()).hexdigest()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _get(self, key: str) -> Optional[Tuple[str, ...]]:
+        with self._lock:
+            if (found := self._entries.get(key)) is not None:
+                self._entries.move_to_end(key)
+                return found
+
+        if self.store is not None and (stored := self.store.get_query_matches(key)) is not None:
+            found = tuple(stored)
+            self._set(key, found)
+            return found
+
+        return None
+
+    def _set(self, key: str, found: Tuple[str, ...]) -> None:
+        with self._lock:
+            self._entries[key] = found
+            self._entries.move_to_end(key)
+
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def search(
+        self, query: str, database: Optional[str] = None, schema: Optional[str] = None
+    ) -> Dict[str, Any]:
+        key = self.key(query, database, schema)
+
+        if (found := self._get(key)) is not None:
+            with self._lock:
+                self.hits += 1
+
+            return {model: self.models[model] for model in found}
+
+        result = self.model_index.search(query, database, schema)
+        found = tuple(result.keys())
+        self._set(key, found)
+
+        if self.store is not None:
+            identifiers = query_identifiers(query, database, schema)
+
+        with self._lock:
+            self.misses += 1
+
+            if self.store is not None:
+                self._pending[key] = (found, identifiers)
+
+        return result
+
+    def search_many(
+        self, queries: Sequence[Tuple[str, Optional[str], Optional[str]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Same as calling `search()` for every query, but the distinct queries not memoized yet
+        are searched at once, so the index can search them in parallel.
+
+        :param queries: tuples of the raw SQL query, and the database and schema of its connection
+        :return: the models found on each query, in the same order
+        """
+        keys = [self.key(*query) for query in queries]
+
+        found_by_key: Dict[str, Tuple[str, ...]] = {}
+        missing: Dict[str, Tuple[str, Optional[str], Optional[str]]] = {}
+
+        for key, query in zip(keys, queries):
+            if key in found_by_key or key in missing:
+                continue
+
+            if (found := self._get(key)) is not None:
+                found_by_key[key] = found
+            else:
+                missing[key] = query
+
+        for key, found in zip(missing, self.model_index.search_many(list(missing.values()))):
+            self._set(key, found)
+            found_by_key[key] = found
+
+        if self.store is not None:
+            pending = {
+                key: (found_by_key[key], query_identifiers(*query))
+                for key, query in missing.items()
+            }
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(queries) - len(missing)
 
-    found: Dict[str, Any] = {}
+            if self.store is not None:
+                self._pending.update(pending)
 
-    query = query.lower().replace('"', '').replace("'", '')
+        return [{model: self.models[model] for model in found_by_key[key]} for key in keys]
 
-    for model in models.keys():
-        if model in query:
-            found[model] = models[model]
+    def flush(self) -> None:
+        """
+        Writes the entries computed since the last flush to the store (if any).
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
 
-    return found
+        if self.store is not None and pending:
+            self.store.set_query_matches(
+                (key, found, identifiers) for key, (found, identifiers) in pending.items()
+            )
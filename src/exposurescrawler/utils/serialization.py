@@ -0,0 +1,78 @@
+import json
+from typing import Any, Optional
+
+"""
+JSON (de)serialization of the (potentially huge) dbt manifest.
+
+orjson or ujson are used when installed, since they are much faster than the standard library,
+which is used otherwise. All backends produce equivalent JSON, although not byte by byte: for
+example, orjson does not escape non-ASCII characters and only supports an indentation of 2
+spaces when pretty-printing.
+"""
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None  # type: ignore
+
+BACKEND_ORJSON = 'orjson'
+BACKEND_UJSON = 'ujson'
+BACKEND_STDLIB = 'json'
+
+
+def _default_backend() -> str:
+    if orjson is not None:
+        return BACKEND_ORJSON
+
+    if ujson is not None:
+        return BACKEND_UJSON
+
+    return BACKEND_STDLIB
+
+
+DEFAULT_BACKEND = _default_backend()
+
+
+def loads(data: bytes, backend: Optional[str] = None) -> Any:
+    backend = backend or DEFAULT_BACKEND
+
+    if backend == BACKEND_ORJSON:
+        return orjson.loads(data)
+
+    if backend == BACKEND_UJSON:
+        return ujson.loads(data)
+
+    return json.loads(data)
+
+
+def dumps(obj: Any, compact: bool = False, backend: Optional[str] = None) -> bytes:
+    """
+    :param obj: the object to serialize
+    :param compact: whether to write without any indentation or whitespace, instead of
+                    pretty-printing
+    :param backend: which backend to use, defaults to the fastest one installed
+    :return: the UTF-8 encoded JSON
+    """
+    backend = backend or DEFAULT_BACKEND
+
+    if backend == BACKEND_ORJSON:
+        options = orjson.OPT_NON_STR_KEYS
+        if not compact:
+            options |= orjson.OPT_INDENT_2
+
+        return orjson.dumps(obj, option=options)
+
+    if backend == BACKEND_UJSON:
+        return ujson.dumps(
+            obj, indent=0 if compact else 4, ensure_ascii=False, escape_forward_slashes=False
+        ).encode()
+
+    if compact:
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+    return json.dumps(obj, indent=4).encode()
@@ -0,0 +1,365 @@
+import itertools
+import json
+import os
+from unittest.mock import patch
+
+from click.testing import CliRunner
+from pytest import fixture, mark, raises
+from slugify import slugify
+
+from benchmarks.fake_server import FakeTableauServer
+from benchmarks.generators import SyntheticTableauSite, generate_manifest, materialized_names
+from exposurescrawler.crawlers.tableau import tableau_crawler
+from exposurescrawler.crawlers.tableau_merge import tableau_merge, tableau_merge_command
+from exposurescrawler.dbt.impact_index import ImpactIndex
+from exposurescrawler.dbt.manifest import DbtManifest
+from exposurescrawler.dbt.manifest_patch import apply_patch, read_patch
+from exposurescrawler.tableau.shards import Shard
+from exposurescrawler.tableau.sites import TableauSite
+from exposurescrawler.utils import serialization
+
+
+@fixture
+def manifest(tmp_path):
+    generated = generate_manifest(200, 20)
+    path = tmp_path / 'manifest.json'
+    path.write_bytes(serialization.dumps(generated))
+
+    return str(path), materialized_names(generated)
+
+
+def _crawl(manifest_path, server, report_path, lookup_mode, **options):
+    environment = {
+        'TABLEAU_URL': server.url,
+        'TABLEAU_USERNAME': 'user',
+        'TABLEAU_PASSWORD': 'password',
+    }
+
+    with patch.dict(os.environ, environment):
+        tableau_crawler(
+            manifest_path,
+            'benchmark',
+            [],
+            False,
+            page_size=25,
+            lookup_mode=lookup_mode,
+            metrics_report_path=report_path,
+            **options,
+        )
+
+    with open(manifest_path) as file:
+        return json.load(file)['exposures']
+
+
+@mark.parametrize('lookup_mode', ['bulk', 'targeted'])
+def test_tableau_crawler_end_to_end(manifest, tmp_path, lookup_mode):
+    manifest_path, tables = manifest
+    site = SyntheticTableauSite(tables, workbooks=60, custom_sqls=90, duplication=0.3)
+    report_path = str(tmp_path / 'report.json')
+
+    # Pages are smaller than requested, on both APIs
+    with FakeTableauServer(site, page_limit=10) as server:
+        exposures = _crawl(manifest_path, server, report_path, lookup_mode)
+
+    # Workbooks on personal spaces (without a project) are skipped
+    workbooks = {
+        f'tableau_{slugify(workbook.name, separator="_")}_{workbook.id[0:3]}': workbook
+        for workbook in site.workbooks
+    }
+    assert exposures
+    assert all(workbooks[exposure['name']].project_name for exposure in exposures.values())
+
+    with open(report_path) as file:
+        counters = json.load(file)['counters']
+
+    # 9 pages of custom SQL and at least 3 pages of native SQL, on top of signing in
+    assert counters['metadata_api_pages'] >= 12
+    assert counters['tableau_http_requests'] == server.requests
+
+
+def test_tableau_crawler_end_to_end_is_the_same_on_every_lookup_mode(manifest, tmp_path):
+    manifest_path, tables = manifest
+    site = SyntheticTableauSite(tables, workbooks=60, custom_sqls=90)
+    report_path = str(tmp_path / 'report.json')
+    exposures = []
+
+    with open(manifest_path, 'rb') as file:
+        original = file.read()
+
+    with FakeTableauServer(site, page_limit=10) as server:
+        for lookup_mode in ('bulk', 'targeted'):
+            with open(manifest_path, 'wb') as file:
+                file.write(original)
+
+            exposures.append(_crawl(manifest_path, server, report_path, lookup_mode))
+
+    assert exposures[0] == exposures[1]
+
+
+def test_tableau_crawler_end_to_end_retries_errors(manifest, tmp_path):
+    manifest_path, tables = manifest
+    site = SyntheticTableauSite(tables, workbooks=60, custom_sqls=90)
+    report_path = str(tmp_path / 'report.json')
+
+    # Throttled (429) and transient (503) errors on about a third of the requests
+    with FakeTableauServer(site, page_limit=10, error_rate=0.3, retry_after=0) as server:
+        exposures = _crawl(manifest_path, server, report_path, 'bulk')
+
+    with open(report_path) as file:
+        counters = json.load(file)['counters']
+
+    assert exposures
+    assert server.errors > 0
+    assert counters['tableau_http_retries'] == server.errors
+
+
+@mark.parametrize('lookup_mode', ['bulk', 'targeted'])
+def test_tableau_crawler_end_to_end_resumes_from_the_checkpoint(manifest, tmp_path, lookup_mode):
+    manifest_path, tables = manifest
+    site = SyntheticTableauSite(tables, workbooks=60, custom_sqls=90)
+    report_path = str(tmp_path / 'report.json')
+    state_dir = tmp_path / 'state'
+
+    with open(manifest_path, 'rb') as file:
+        original = file.read()
+
+    with FakeTableauServer(site, page_limit=10) as server:
+        expected = _crawl(manifest_path, server, report_path, lookup_mode)
+
+        with open(manifest_path, 'wb') as file:
+            file.write(original)
+
+        # Fails at the very end, once everything was retrieved
+        with patch.object(DbtManifest, 'save', side_effect=OSError('No space left on device')):
+            with raises(OSError):
+                _crawl(manifest_path, server, report_path, lookup_mode, state_dir=str(state_dir))
+
+        requests = server.requests
+        exposures = _crawl(
+            manifest_path, server, report_path, lookup_mode, state_dir=str(state_dir), resume=True
+        )
+
+    with open(report_path) as file:
+        counters = json.load(file)['counters']
+
+    # The tags of the workbooks are a set, which is checkpointed sorted
+    for exposure in itertools.chain(exposures.values(), expected.values()):
+        exposure['tags'].sort()
+
+    assert exposures == expected
+
+    # Only the server version, signing in and out again, since everything else is restored
+    assert server.requests - requests == 3
+    assert counters['checkpoint_pages_restored'] >= 12
+    assert 'metadata_api_pages' not in counters
+
+    # Nothing is left to resume once the crawl completes
+    assert list(state_dir.iterdir()) == []
+
+
+def test_tableau_crawler_end_to_end_resumes_on_the_lookup_mode_chosen(manifest, tmp_path):
+    manifest_path, tables = manifest
+    site = SyntheticTableauSite(tables, workbooks=60, custom_sqls=90)
+    report_path = str(tmp_path / 'report.json')
+    options = {'cache_path': str(tmp_path / 'cache.db'), 'state_dir': str(tmp_path / 'state')}
+
+    with open(manifest_path, 'rb') as file:
+        original = file.read()
+
+    with FakeTableauServer(site, page_limit=10) as server:
+        expected = _crawl(
+            manifest_path, server, report_path, 'auto', cache_path=options['cache_path']
+        )
+
+        with open(manifest_path, 'wb') as file:
+            file.write(original)
+
+        # Every workbook is cached, so auto mode picks targeted lookups, and the stages
+        # checkpointed hold none of the workbooks
+        with patch.object(DbtManifest, 'save', side_effect=OSError('No space left on device')):
+            with raises(OSError):
+                _crawl(manifest_path, server, report_path, 'auto', **options)
+
+        exposures = _crawl(manifest_path, server, report_path, 'auto', resume=True, **options)
+
+    for exposure in itertools.chain(exposures.values(), expected.values()):
+        exposure['tags'].sort()
+
+    assert exposures == expected
+
+
+def test_tableau_crawler_end_to_end_crawls_several_sites(manifest, tmp_path):
+    manifest_path, tables = manifest
+    report_path = str(tmp_path / 'report.json')
+
+    # The same workbook ids on both sites
+    sales = SyntheticTableauSite(tables, workbooks=40, custom_sqls=60, seed=1)
+    finance = SyntheticTableauSite(tables, workbooks=20, custom_sqls=30, seed=2)
+
+    with FakeTableauServer(sales, page_limit=10) as sales_server, FakeTableauServer(
+        finance, page_limit=10
+    ) as finance_server:
+        sites = [
+            TableauSite('sales', sales_server.url, 'user', 'password', 'sales'),
+            TableauSite('finance', finance_server.url, 'user', 'password', 'finance'),
+        ]
+
+        # The environment is not used when the sites are given
+        with patch.dict(os.environ, clear=True):
+            tableau_crawler(
+                manifest_path,
+                'benchmark',
+                [],
+                False,
+                page_size=25,
+                metrics_report_path=report_path,
+                sites=sites,
+            )
+
+    with open(manifest_path) as file:
+        exposures = json.load(file)['exposures']
+
+    for site, server in zip(sites, (sales_server, finance_server)):
+        site_exposures = [
+            exposure
+            for exposure in exposures.values()
+            if exposure['name'].startswith(f'tableau_{site.name}_')
+        ]
+
+        assert site_exposures
+        assert all(exposure['url'].startswith(server.url) for exposure in site_exposures)
+
+    assert all(
+        exposure['name'].startswith(('tableau_sales_', 'tableau_finance_'))
+        for exposure in exposures.values()
+    )
+
+
+def test_tableau_crawler_end_to_end_sharded_is_the_same_as_unsharded(manifest, tmp_path):
+    manifest_path, tables = manifest
+    site = SyntheticTableauSite(tables, workbooks=60, custom_sqls=90)
+    report_path = str(tmp_path / 'report.json')
+
+    with open(manifest_path, 'rb') as file:
+        original = file.read()
+
+    with FakeTableauServer(site, page_limit=10) as server:
+        expected = _crawl(manifest_path, server, report_path, 'auto')
+
+        with open(manifest_path, 'wb') as file:
+            file.write(original)
+
+        shard_paths = [str(tmp_path / f'shard-{index}.json') for index in (1, 2, 3)]
+
+        for index, shard_path in enumerate(shard_paths, start=1):
+            _crawl(
+                manifest_path,
+                server,
+                report_path,
+                'auto',
+                shard=Shard(index, 3),
+                shard_output_path=shard_path,
+            )
+
+    # The shards do not write the manifest
+    with open(manifest_path, 'rb') as file:
+        assert file.read() == original
+
+    tableau_merge(manifest_path, 'benchmark', [], list(reversed(shard_paths)), False)
+
+    with open(manifest_path) as file:
+        exposures = json.load(file)['exposures']
+
+    # The tags of the workbooks are a set, which is written sorted on the shards
+    for exposure in itertools.chain(exposures.values(), expected.values()):
+        exposure['tags'].sort()
+
+    assert exposures == expected
+
+
+def test_tableau_merge_reports_invalid_shards_as_usage_errors(manifest, tmp_path):
+    manifest_path, _ = manifest
+    shard_path = tmp_path / 'shard-1.json'
+    shard_path.write_text('not a shard')
+
+    result = CliRunner().invoke(
+        tableau_merge_command,
+        ['--manifest-path', manifest_path, '--dbt-package-name', 'benchmark', str(shard_path)],
+    )
+
+    assert result.exit_code == 2
+    assert 'shard-1.json: not a shard' in result.output
+
+
+def test_tableau_crawler_end_to_end_updates_the_impact_index(manifest, tmp_path):
+    manifest_path, tables = manifest
+    site = SyntheticTableauSite(tables, workbooks=60, custom_sqls=90)
+    report_path = str(tmp_path / 'report.json')
+    index_path = str(tmp_path / 'impact.db')
+
+    with FakeTableauServer(site, page_limit=10) as server:
+        exposures = _crawl(manifest_path, server, report_path, 'auto', impact_index_path=index_path)
+
+        with open(report_path) as file:
+            assert json.load(file)['counters']['impact_index_written'] == len(exposures)
+
+        # Nothing changed on Tableau, so nothing is written again
+        _crawl(manifest_path, server, report_path, 'auto', impact_index_path=index_path)
+
+        with open(report_path) as file:
+            assert json.load(file)['counters'].get('impact_index_written', 0) == 0
+
+    with ImpactIndex(index_path) as impact_index:
+        for unique_id, exposure in exposures.items():
+            models = impact_index.models_used_by(unique_id)
+            assert [model_unique_id for model_unique_id, _ in models] == exposure['depends_on'][
+                'nodes'
+            ]
+
+            for model_unique_id in exposure['depends_on']['nodes']:
+                workbooks = impact_index.workbooks_using(model_unique_id)
+                assert unique_id in [record.unique_id for record in workbooks]
+
+
+def test_tableau_crawler_end_to_end_patch_is_the_same_as_the_manifest(manifest, tmp_path):
+    manifest_path, tables = manifest
+    site = SyntheticTableauSite(tables, workbooks=60, custom_sqls=90)
+    report_path = str(tmp_path / 'report.json')
+    patch_path = str(tmp_path / 'patch.json')
+
+    with open(manifest_path, 'rb') as file:
+        original = file.read()
+
+    with FakeTableauServer(site, page_limit=10) as server:
+        _crawl(manifest_path, server, report_path, 'auto', patch_output_path=patch_path)
+
+        # The manifest is not written, only the patch
+        with open(manifest_path, 'rb') as file:
+            assert file.read() == original
+
+        _crawl(manifest_path, server, report_path, 'auto', patch_output_path=patch_path)
+
+        # Nothing changed on Tableau since the first run
+        with open(report_path) as file:
+            counters = json.load(file)['counters']
+        assert counters['exposures'] > 0
+        assert counters.get('exposures_added', 0) == counters.get('exposures_changed', 0) == 0
+
+        expected = _crawl(manifest_path, server, report_path, 'auto')
+
+    with open(manifest_path, 'wb') as file:
+        file.write(original)
+
+    manifest = DbtManifest.from_file(manifest_path, lazy=True)
+    apply_patch(manifest, read_patch(patch_path))
+    manifest.save(manifest_path)
+
+    with open(manifest_path) as file:
+        patched = json.load(file)
+
+    assert patched['exposures'] == expected
+    assert all(
+        unique_id in patched['child_map'][parent]
+        for unique_id, exposure in expected.items()
+        for parent in exposure['depends_on']['nodes']
+    )
@@ -0,0 +1,64 @@
+import subprocess
+import sys
+
+from pytest import mark
+
+# Cold start budget of the command line (the cumulative import time of the crawler), generous
+# enough for slow CI machines. It was over twice as long while importing the Tableau client
+IMPORT_TIME_BUDGET_SECONDS = 0.5
+
+# Only needed once a crawl starts
+DEFERRED_MODULES = ('tableauserverclient', 'requests', 'slugify')
+
+
+def _import_times(*arguments):
+    """
+    :return: the cumulative import time (in seconds) of every module imported by running Python
+             with `arguments`, as reported by `-X importtime`
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', *arguments],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    times = {}
+
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, module = line.split('|')
+        times[module.strip()] = int(cumulative) / 1_000_000
+
+    return times
+
+
+@mark.parametrize(
+    'module',
+    [
+        'exposurescrawler.crawlers.tableau',
+        'exposurescrawler.crawlers.tableau_watch',
+        'exposurescrawler.crawlers.tableau_merge',
+    ],
+)
+def test_the_crawlers_start_without_their_heavy_dependencies(module):
+    times = _import_times('-c', f'import {module}')
+
+    assert not [name for name in DEFERRED_MODULES if name in times]
+    assert times[module] < IMPORT_TIME_BUDGET_SECONDS
+
+
+def test_the_command_line_only_imports_the_command_run():
+    # The commands themselves are imported by importlib, which is not reported, unlike the
+    # modules they import
+    times = _import_times('-m', 'exposurescrawler.cli', 'impact', '--help')
+
+    assert 'exposurescrawler.dbt.exposure' in times
+    assert 'exposurescrawler.tableau.checkpoint' not in times
+
+    times = _import_times('-m', 'exposurescrawler.cli', 'tableau', '--help')
+
+    assert 'exposurescrawler.tableau.checkpoint' in times
+    assert not [name for name in DEFERRED_MODULES if name in times]
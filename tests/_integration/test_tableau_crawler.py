@@ -1,3 +1,4 @@
+import json
 import os
 import shutil
 from collections import namedtuple
@@ -5,7 +6,7 @@ from pathlib import Path
 from tempfile import NamedTemporaryFile
 from unittest.mock import patch
 
-from pytest import fixture
+from pytest import fixture, mark
 
 from exposurescrawler.crawlers.tableau import tableau_crawler
 from exposurescrawler.dbt.manifest import DbtManifest
@@ -62,7 +63,7 @@ def mock_graphql_custom_sql_result():
     }
 
     with patch('exposurescrawler.tableau.graphql_client._fetch_custom_sql', autospec=True) as mock:
-        mock.return_value = results
+        mock.return_value = [results]
         yield
 
 
@@ -115,7 +116,7 @@ def mock_graphql_native_sql_result():
     }
 
     with patch('exposurescrawler.tableau.graphql_client._fetch_native_sql', autospec=True) as mock:
-        mock.return_value = results
+        mock.return_value = [results]
         yield
 
 
@@ -165,8 +166,9 @@ def mock_tableau_rest_api():
     def _get_workbook_details(workbook_id):
         return workbook_details[workbook_id]
 
-    with patch('exposurescrawler.crawlers.tableau.TableauRestClient', autospec=True) as mock:
+    with patch('exposurescrawler.tableau.rest_client.TableauRestClient', autospec=True) as mock:
         instance = mock.return_value
+        instance.__enter__.return_value = instance
         instance.retrieve_workbook.side_effect = _get_workbook_details
         instance.retrieve_user.return_value = user_details['user-id']
         instance.retrieve_all_users.return_value = [user_details['user-id']]
@@ -175,7 +177,9 @@ def mock_tableau_rest_api():
             workbook_details['company-kpis-workbook-luid'],
             workbook_details['orders-workbook-luid']
         ]
-        yield
+        instance.count_workbooks.return_value = len(workbook_details)
+        instance.count_users.return_value = len(user_details)
+        yield instance
 
 
 @patch.dict(
@@ -187,9 +191,18 @@ def mock_tableau_rest_api():
     },
     clear=True,
 )
-def test_tableau_crawler(manifest_path):
+@mark.parametrize('lookup_mode', ['auto', 'bulk', 'targeted'])
+@mark.parametrize('lazy_manifest', [False, True])
+def test_tableau_crawler(manifest_path, mock_tableau_rest_api, lookup_mode, lazy_manifest):
     with patch.object(DbtManifest, 'save', autospec=True) as mock:
-        tableau_crawler(manifest_path, 'jaffle_shop', [], True)
+        tableau_crawler(
+            manifest_path,
+            'jaffle_shop',
+            [],
+            True,
+            lookup_mode=lookup_mode,
+            lazy_manifest=lazy_manifest,
+        )
 
         final_manifest = mock.call_args.args[0].data
         exposure = final_manifest['exposures']['exposure.jaffle_shop.tableau_orders_workbook_ord']
@@ -205,3 +218,96 @@ def test_tableau_crawler(manifest_path):
             'name': 'John Doe',
             'email': 'john.doe@example.com',
         }
+
+    # Only the matched workbooks are retrieved on targeted mode
+    if lookup_mode == 'targeted':
+        mock_tableau_rest_api.retrieve_all_workbooks.assert_not_called()
+        assert mock_tableau_rest_api.retrieve_workbook.call_count == 3
+
+
+@patch.dict(
+    os.environ,
+    {
+        'TABLEAU_URL': 'https://my-tableau-server.com',
+        'TABLEAU_USERNAME': '',
+        'TABLEAU_PASSWORD': '',
+    },
+    clear=True,
+)
+def test_tableau_crawler_incremental(manifest_path, mock_tableau_rest_api, tmp_path):
+    cache_path = str(tmp_path / 'cache.sqlite')
+
+    with patch.object(DbtManifest, 'save', autospec=True) as mock:
+        tableau_crawler(
+            manifest_path, 'jaffle_shop', [], True, lookup_mode='targeted', cache_path=cache_path
+        )
+
+        with patch('exposurescrawler.crawlers.tableau._search_models') as search_models:
+            tableau_crawler(
+                manifest_path,
+                'jaffle_shop',
+                [],
+                True,
+                lookup_mode='targeted',
+                cache_path=cache_path,
+            )
+
+        first_run, second_run = [call.args[0].data for call in mock.call_args_list]
+
+    # Nothing changed on Tableau, so the second run reuses everything from the cache
+    search_models.assert_not_called()
+    assert mock_tableau_rest_api.retrieve_workbook.call_count == 3
+    assert mock_tableau_rest_api.retrieve_user.call_count == 1
+
+    assert second_run['exposures'] == first_run['exposures']
+    assert second_run['parent_map'] == first_run['parent_map']
+
+
+@patch.dict(
+    os.environ,
+    {
+        'TABLEAU_URL': 'https://my-tableau-server.com',
+        'TABLEAU_USERNAME': '',
+        'TABLEAU_PASSWORD': '',
+    },
+    clear=True,
+)
+def test_tableau_crawler_metrics_report(manifest_path, tmp_path):
+    report_path = tmp_path / 'report.json'
+    prometheus_path = tmp_path / 'crawler.prom'
+
+    tableau_crawler(
+        manifest_path,
+        'jaffle_shop',
+        [],
+        True,
+        metrics_report_path=str(report_path),
+        prometheus_textfile_path=str(prometheus_path),
+    )
+
+    report = json.loads(report_path.read_text())
+
+    assert {'manifest_load', 'fetch', 'parse_sql.custom_sql', 'save'} <= report['spans'].keys()
+    assert report['counters']['sql_queries_scanned'] == 4
+    assert report['counters']['exposures'] == 3
+    assert 'exposurescrawler_exposures_total 3' in prometheus_path.read_text()
+
+
+@patch.dict(
+    os.environ,
+    {
+        'TABLEAU_URL': 'https://my-tableau-server.com',
+        'TABLEAU_USERNAME': '',
+        'TABLEAU_PASSWORD': '',
+    },
+    clear=True,
+)
+def test_tableau_crawler_with_workers(manifest_path):
+    with patch.object(DbtManifest, 'save', autospec=True) as mock:
+        tableau_crawler(manifest_path, 'jaffle_shop', [], True)
+        tableau_crawler(manifest_path, 'jaffle_shop', [], True, workers=2)
+
+        serial, parallel = [call.args[0].data for call in mock.call_args_list]
+
+    assert parallel['exposures'] == serial['exposures']
+    assert parallel['parent_map'] == serial['parent_map']
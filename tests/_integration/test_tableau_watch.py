@@ -0,0 +1,115 @@
+import os
+import shutil
+from collections import namedtuple
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from pytest import fixture
+
+from exposurescrawler.crawlers.tableau_watch import TableauWatcher
+from exposurescrawler.dbt.manifest import DbtManifest
+from exposurescrawler.dbt.models import ModelRecord
+from exposurescrawler.tableau.models import WorkbookReference
+
+CURRENT_FOLDER = Path(__file__).resolve().parent
+PATH_TO_MANIFEST_FIXTURE = CURRENT_FOLDER.parent / '_fixtures' / 'manifest.json'
+
+WorkbookDetailsMock = namedtuple(
+    'WorkbookDetailsMock',
+    [
+        'id',
+        'name',
+        'description',
+        'webpage_url',
+        'owner_id',
+        'project_name',
+        'tags',
+        'created_at',
+        'updated_at',
+    ],
+)
+UserDetailsMock = namedtuple('UserDetailsMock', ['id', 'fullname', 'name'])
+
+
+def _results(*workbook_ids):
+    orders = ModelRecord('model.jaffle_shop.orders', 'sample_db.public.orders')
+
+    return (
+        {WorkbookReference(luid, luid): [orders] for luid in workbook_ids},
+        {
+            luid: WorkbookDetailsMock(
+                luid, luid, '', 'http://hostname/workbook', 'user-id', 'Folder', [], '', ''
+            )
+            for luid in workbook_ids
+        },
+        {'user-id': UserDetailsMock('user-id', 'John Doe', 'john.doe@example.com')},
+    )
+
+
+@fixture
+def manifest_path(tmp_path):
+    path = tmp_path / 'manifest.json'
+    shutil.copy(PATH_TO_MANIFEST_FIXTURE, path)
+    return str(path)
+
+
+@fixture
+def crawl_tableau():
+    with patch(
+        'exposurescrawler.crawlers.tableau_watch._crawl_tableau', autospec=True
+    ) as mock, patch.dict(os.environ, {'TABLEAU_URL': 'https://my-tableau-server.com'}):
+        mock.return_value = _results('first-workbook')
+        yield mock
+
+
+def _exposures(manifest_path):
+    return sorted(DbtManifest.from_file(manifest_path)['exposures'])
+
+
+class TestTableauWatcher:
+    def test_only_applies_the_exposures_when_the_manifest_changes(
+        self, manifest_path, crawl_tableau
+    ):
+        with TableauWatcher(manifest_path, 'jaffle_shop', [], MagicMock()) as watcher:
+            assert watcher.poll()
+            assert _exposures(manifest_path) == ['exposure.jaffle_shop.tableau_first_workbook_fir']
+
+            # Its own changes to the manifest are ignored
+            assert not watcher.poll()
+
+            # A new manifest (e.g. from `dbt docs generate`) with the same models
+            os.remove(manifest_path)
+            shutil.copy(PATH_TO_MANIFEST_FIXTURE, manifest_path)
+
+            assert watcher.poll()
+            assert _exposures(manifest_path) == ['exposure.jaffle_shop.tableau_first_workbook_fir']
+
+        # Tableau was only crawled once, since the models stayed the same
+        assert crawl_tableau.call_count == 1
+
+    def test_crawls_tableau_again_when_the_results_are_stale(self, manifest_path, crawl_tableau):
+        tableau_client = MagicMock()
+
+        with TableauWatcher(
+            manifest_path, 'jaffle_shop', [], tableau_client, refresh_interval=0
+        ) as watcher:
+            assert watcher.poll()
+
+            crawl_tableau.return_value = _results('second-workbook')
+            assert watcher.poll()
+
+        # The exposure of the workbook that is gone is removed
+        assert _exposures(manifest_path) == ['exposure.jaffle_shop.tableau_second_workbook_sec']
+        assert crawl_tableau.call_count == 2
+        assert tableau_client.clear_cache.call_count == 2
+
+    def test_waits_for_the_manifest(self, tmp_path, crawl_tableau):
+        manifest_path = str(tmp_path / 'manifest.json')
+
+        with TableauWatcher(manifest_path, 'jaffle_shop', [], MagicMock()) as watcher:
+            assert not watcher.poll()
+
+            shutil.copy(PATH_TO_MANIFEST_FIXTURE, manifest_path)
+            assert watcher.poll()
+
+        crawl_tableau.assert_called_once()
@@ -0,0 +1,86 @@
+import json
+
+from click.testing import CliRunner
+
+from exposurescrawler.dbt.impact_index import ExposureRecord, ImpactIndex, impact_command
+
+
+def _record(unique_id, luid, *models, owner='jane@example.com', project='Sales'):
+    return ExposureRecord(
+        f'exposure.package.{unique_id}',
+        None,
+        luid,
+        unique_id,
+        project,
+        'Jane',
+        owner,
+        f'https://tableau/{luid}',
+        tuple((f'model.package.{name}', f'db.schema.{name}') for name in models),
+    )
+
+
+def test_looks_up_workbooks_and_models(tmp_path):
+    orders = _record('orders', 'luid-1', 'orders', 'customers')
+    churn = _record('churn', 'luid-2', 'customers', owner='john@example.com', project='Ops')
+
+    with ImpactIndex(str(tmp_path / 'impact.db')) as impact_index:
+        assert impact_index.update(None, [orders, churn]) == (2, 0)
+
+        by_unique_id = impact_index.workbooks_using('model.package.customers')
+        assert by_unique_id == [churn._replace(models=()), orders._replace(models=())]
+        assert impact_index.workbooks_using('DB.SCHEMA.CUSTOMERS') == by_unique_id
+        assert impact_index.workbooks_using('db.schema.customers', project='Ops') == [
+            churn._replace(models=())
+        ]
+        assert impact_index.workbooks_using('db.schema.orders', owner='john@example.com') == []
+
+        expected = [('model.package.customers', 'db.schema.customers')]
+        assert impact_index.models_used_by('luid-2') == expected
+        assert impact_index.models_used_by('exposure.package.churn') == expected
+        assert impact_index.models_used_by('churn') == expected
+
+    result = CliRunner().invoke(
+        impact_command,
+        ['--index-path', str(tmp_path / 'impact.db'), '--json', 'models', 'luid-1'],
+    )
+
+    assert result.exit_code == 0
+    assert [json.loads(line)['unique_id'] for line in result.output.splitlines()] == [
+        'model.package.customers',
+        'model.package.orders',
+    ]
+
+
+def test_only_writes_what_changed_on_the_site(tmp_path):
+    orders = _record('orders', 'luid-1', 'orders')
+    churn = _record('churn', 'luid-2', 'customers')
+    other_site = _record('other', 'luid-3', 'orders')._replace(site='other')
+
+    with ImpactIndex(str(tmp_path / 'impact.db')) as impact_index:
+        impact_index.update('other', [other_site])
+        impact_index.update(None, [orders, churn])
+
+        changed = churn._replace(models=churn.models + orders.models)
+        assert impact_index.update(None, [changed]) == (1, 1)
+
+        assert impact_index.models_used_by('luid-1') == []
+        assert impact_index.models_used_by('luid-2') == list(changed.models)
+        assert impact_index.workbooks_using('model.package.orders') == [
+            changed._replace(models=()),
+            other_site._replace(models=()),
+        ]
+
+
+def test_looks_up_materialized_names_in_any_case(tmp_path):
+    # As materialized on Snowflake
+    orders = _record('orders', 'luid-1')._replace(
+        models=(('model.package.orders', 'ANALYTICS.PUBLIC.ORDERS'),)
+    )
+
+    with ImpactIndex(str(tmp_path / 'impact.db')) as impact_index:
+        impact_index.update(None, [orders])
+
+        expected = [orders._replace(models=())]
+        assert impact_index.workbooks_using('ANALYTICS.PUBLIC.ORDERS') == expected
+        assert impact_index.workbooks_using('analytics.public.orders') == expected
+        assert impact_index.models_used_by('luid-1') == list(orders.models)
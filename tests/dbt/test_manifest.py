@@ -0,0 +1,145 @@
+import json
+import shutil
+from pathlib import Path
+
+from pytest import fixture, mark
+
+from exposurescrawler.dbt.manifest import LAZY_NODE_FIELDS, DbtManifest
+from exposurescrawler.dbt.models import ModelRecord
+
+PATH_TO_MANIFEST_FIXTURE = Path(__file__).resolve().parent.parent / '_fixtures' / 'manifest.json'
+
+
+def _assert_every_node_is_on_the_child_map(manifest):
+    nodes = set(manifest['nodes']) | set(manifest['sources']) | set(manifest['exposures'])
+    assert set(manifest['child_map']) == nodes
+
+
+@fixture
+def manifest_path(tmp_path):
+    path = tmp_path / 'manifest.json'
+    shutil.copy(PATH_TO_MANIFEST_FIXTURE, path)
+    return path
+
+
+def test_lazy_manifest_only_decodes_the_used_sections(manifest_path):
+    eager = DbtManifest.from_file(str(manifest_path))
+    lazy = DbtManifest.from_file(str(manifest_path), lazy=True)
+
+    assert set(lazy.keys()) == {'nodes', 'sources', 'exposures', 'parent_map'}
+    assert lazy['exposures'] == eager['exposures']
+    assert lazy['parent_map'] == eager['parent_map']
+
+    for unique_id, node in eager['nodes'].items():
+        assert lazy['nodes'][unique_id] == {
+            field: node[field] for field in LAZY_NODE_FIELDS if field in node
+        }
+
+    assert lazy.retrieve_models_and_sources().keys() == eager.retrieve_models_and_sources().keys()
+
+
+@mark.parametrize('compact', [True, False])
+def test_lazy_manifest_writes_the_other_sections_back(manifest_path, compact):
+    original = json.loads(manifest_path.read_bytes())
+
+    manifest = DbtManifest.from_file(str(manifest_path), lazy=True)
+    manifest['exposures']['exposure.test'] = {'name': 'test'}
+    manifest['parent_map']['exposure.test'] = ['model.jaffle_shop.orders']
+
+    # Overwrites the same file that is memory-mapped
+    manifest.save(str(manifest_path), compact=compact)
+    saved = json.loads(manifest_path.read_bytes())
+
+    original['exposures']['exposure.test'] = {'name': 'test'}
+    original['parent_map']['exposure.test'] = ['model.jaffle_shop.orders']
+
+    assert saved == original
+    assert list(saved.keys()) == list(original.keys())
+
+
+def test_models_and_sources_are_retrieved_as_records(manifest_path):
+    manifest = DbtManifest.from_file(str(manifest_path))
+    models = manifest.retrieve_models_and_sources()
+
+    assert models['sample_db.public.orders'] == ModelRecord(
+        'model.jaffle_shop.orders', 'sample_db.public.orders'
+    )
+
+    # The nodes of the manifest are left untouched
+    assert manifest.to_dict() == json.loads(manifest_path.read_bytes())
+
+
+@mark.parametrize('lazy', [False, True])
+def test_exposures_are_added_to_the_child_map(manifest_path, lazy):
+    manifest = DbtManifest.from_file(str(manifest_path), lazy=lazy)
+    exposure = {'name': 'test'}
+
+    manifest.set_exposure('exposure.test', exposure, ['model.jaffle_shop.orders', 'source.new'])
+    manifest.set_exposure('exposure.other', exposure, ['model.jaffle_shop.orders'])
+    # Replacing an exposure also replaces its edges
+    manifest.set_exposure('exposure.test', exposure, ['model.jaffle_shop.customers'])
+    manifest.remove_exposure('exposure.other')
+    manifest.save(str(manifest_path))
+
+    original = json.loads(PATH_TO_MANIFEST_FIXTURE.read_bytes())
+    saved = json.loads(manifest_path.read_bytes())
+
+    assert saved['parent_map']['exposure.test'] == ['model.jaffle_shop.customers']
+    assert 'exposure.other' not in saved['parent_map']
+    assert saved['child_map']['model.jaffle_shop.orders'] == (
+        original['child_map']['model.jaffle_shop.orders']
+    )
+    assert saved['child_map']['model.jaffle_shop.customers'] == sorted(
+        original['child_map']['model.jaffle_shop.customers'] + ['exposure.test']
+    )
+    assert saved['child_map']['source.new'] == []
+    assert saved['child_map']['exposure.test'] == []
+    assert 'exposure.other' not in saved['child_map']
+
+    # Only the children of the nodes modified change
+    for unique_id, children in original['child_map'].items():
+        if unique_id not in ('model.jaffle_shop.orders', 'model.jaffle_shop.customers'):
+            assert saved['child_map'][unique_id] == children
+
+
+@mark.parametrize('lazy', [False, True])
+def test_every_node_keeps_its_entry_on_the_child_map(manifest_path, lazy):
+    parents = ['model.jaffle_shop.orders']
+
+    manifest = DbtManifest.from_file(str(manifest_path), lazy=lazy)
+    for name in ('first', 'second', 'third'):
+        manifest.set_exposure(f'exposure.{name}', {'name': name}, parents)
+    manifest.remove_exposure('exposure.third')
+    manifest.save(str(manifest_path))
+
+    saved = json.loads(manifest_path.read_bytes())
+    _assert_every_node_is_on_the_child_map(saved)
+
+    # Replacing and removing exposures already on the manifest
+    manifest = DbtManifest.from_file(str(manifest_path), lazy=lazy)
+    manifest.set_exposure('exposure.first', {'name': 'first'}, ['model.jaffle_shop.customers'])
+    manifest.remove_exposure('exposure.second')
+    manifest.save(str(manifest_path))
+
+    saved = json.loads(manifest_path.read_bytes())
+    _assert_every_node_is_on_the_child_map(saved)
+    assert saved['child_map']['model.jaffle_shop.orders'] == (
+        json.loads(PATH_TO_MANIFEST_FIXTURE.read_bytes())['child_map']['model.jaffle_shop.orders']
+    )
+    assert 'exposure.first' in saved['child_map']['model.jaffle_shop.customers']
+
+
+@mark.parametrize('lazy', [False, True])
+def test_removing_exposures_does_not_add_nodes_to_the_child_map(manifest_path, lazy):
+    manifest = DbtManifest.from_file(str(manifest_path), lazy=lazy)
+
+    # An exposure whose parents are not on the child map (e.g. added by hand)
+    manifest['exposures']['exposure.test'] = {'name': 'test'}
+    manifest['parent_map']['exposure.test'] = ['source.missing']
+    manifest.remove_exposure('exposure.test')
+    manifest.save(str(manifest_path))
+
+    saved = json.loads(manifest_path.read_bytes())
+
+    assert 'source.missing' not in saved['child_map']
+    assert saved == json.loads(PATH_TO_MANIFEST_FIXTURE.read_bytes())
@@ -0,0 +1,92 @@
+import json
+import shutil
+from pathlib import Path
+
+from click.testing import CliRunner
+
+from exposurescrawler.dbt.manifest import DbtManifest
+from exposurescrawler.dbt.manifest_patch import (
+    apply_patch_command,
+    build_patch,
+    read_patch,
+    write_patch,
+)
+
+PATH_TO_MANIFEST_FIXTURE = Path(__file__).resolve().parent.parent / '_fixtures' / 'manifest.json'
+
+
+def _add_exposures(manifest, exposures):
+    for name, (description, parents) in exposures.items():
+        manifest.set_exposure(f'exposure.test.{name}', {'description': description}, parents)
+
+    return [f'exposure.test.{name}' for name in exposures]
+
+
+def test_patches_report_the_changes_since_the_previous_patch(tmp_path):
+    patch_path = str(tmp_path / 'patch.json')
+    assert read_patch(patch_path) is None
+
+    manifest = DbtManifest.from_file(str(PATH_TO_MANIFEST_FIXTURE))
+    unique_ids = _add_exposures(
+        manifest,
+        {
+            'orders': ('Orders', ['model.jaffle_shop.orders']),
+            'customers': ('Customers', ['model.jaffle_shop.customers']),
+            'churn': ('Churn', ['model.jaffle_shop.customers']),
+        },
+    )
+    write_patch(patch_path, build_patch(manifest, unique_ids))
+
+    manifest = DbtManifest.from_file(str(PATH_TO_MANIFEST_FIXTURE))
+    unique_ids = _add_exposures(
+        manifest,
+        {
+            'orders': ('Orders', ['model.jaffle_shop.orders']),
+            'customers': ('Customers', ['model.jaffle_shop.orders']),
+            'revenue': ('Revenue', ['model.jaffle_shop.orders']),
+        },
+    )
+    patch = build_patch(manifest, unique_ids, read_patch(patch_path))
+
+    assert patch['changes'] == {
+        'added': ['exposure.test.revenue'],
+        'changed': ['exposure.test.customers'],
+        'removed': ['exposure.test.churn'],
+    }
+    assert patch['child_map'] == {
+        'exposure.test.customers': [],
+        'exposure.test.orders': [],
+        'exposure.test.revenue': [],
+        'model.jaffle_shop.orders': [
+            'exposure.test.customers',
+            'exposure.test.orders',
+            'exposure.test.revenue',
+        ],
+    }
+
+
+def test_applying_a_patch_is_the_same_as_writing_the_manifest(tmp_path):
+    full_path = tmp_path / 'full.json'
+    patched_path = tmp_path / 'patched.json'
+    patch_path = tmp_path / 'patch.json'
+
+    for path in (full_path, patched_path):
+        shutil.copy(PATH_TO_MANIFEST_FIXTURE, path)
+
+    manifest = DbtManifest.from_file(str(full_path))
+    unique_ids = _add_exposures(
+        manifest,
+        {
+            'orders': ('Orders', ['model.jaffle_shop.orders', 'model.jaffle_shop.customers']),
+            'customers': ('Customers', ['model.jaffle_shop.customers']),
+        },
+    )
+    manifest.save(str(full_path))
+    write_patch(str(patch_path), build_patch(manifest, unique_ids))
+
+    result = CliRunner().invoke(
+        apply_patch_command, ['--manifest-path', str(patched_path), str(patch_path)]
+    )
+
+    assert result.exit_code == 0
+    assert json.loads(patched_path.read_bytes()) == json.loads(full_path.read_bytes())
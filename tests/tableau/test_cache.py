@@ -0,0 +1,85 @@
+import sqlite3
+
+from exposurescrawler.tableau.cache import CrawlCache
+from exposurescrawler.utils.query_parsing import query_identifiers
+
+MODELS = ['db.schema.a', 'db.schema.b']
+
+
+def _set_query(cache, key, query, found, database=None, schema=None):
+    cache.set_query_matches([(key, found, query_identifiers(query, database, schema))])
+
+
+class TestCrawlCache:
+    def test_found_is_keyed_on_updated_at(self, tmp_path):
+        with CrawlCache(str(tmp_path / 'cache.sqlite'), MODELS) as cache:
+            cache.set_found(
+                [('luid', 'custom_sql', '2023-01-01T00:00:00Z', ['db.schema.table'], [])]
+            )
+
+            assert cache.get_found('luid', 'custom_sql', '2023-01-01T00:00:00Z') == [
+                'db.schema.table'
+            ]
+            assert cache.get_found('luid', 'custom_sql', '2023-02-01T00:00:00Z') is None
+            assert cache.get_found('luid', 'native_sql', '2023-01-01T00:00:00Z') is None
+
+    def test_only_the_entries_affected_by_the_models_changed_are_invalidated(self, tmp_path):
+        path = str(tmp_path / 'cache.sqlite')
+
+        with CrawlCache(path, MODELS) as cache:
+            _set_query(cache, 'a', 'select * from db.schema.a', ['db.schema.a'])
+            _set_query(cache, 'c', 'select * from c', [], database='db')
+            cache.set_found(
+                [
+                    ('luid_a', 'custom_sql', None, ['db.schema.a'], ['a']),
+                    ('luid_c', 'custom_sql', None, [], ['a', 'c']),
+                ]
+            )
+
+        with CrawlCache(path, list(reversed(MODELS)) + ['db.other.unrelated']) as cache:
+            assert cache.get_found('luid_a', 'custom_sql', None) == ['db.schema.a']
+            assert cache.get_found('luid_c', 'custom_sql', None) == []
+
+        # A bare name on a connection without a schema matches a model on any schema
+        with CrawlCache(path, MODELS + ['db.other.c']) as cache:
+            assert cache.get_found('luid_a', 'custom_sql', None) == ['db.schema.a']
+            assert cache.get_found('luid_c', 'custom_sql', None) is None
+            assert cache.get_query_matches('a') == ['db.schema.a']
+            assert cache.get_query_matches('c') is None
+
+        with CrawlCache(path, ['db.schema.b']) as cache:
+            assert cache.get_found('luid_a', 'custom_sql', None) is None
+            assert cache.get_query_matches('a') is None
+
+    def test_workbooks_using_queries_not_cached_are_invalidated(self, tmp_path):
+        path = str(tmp_path / 'cache.sqlite')
+
+        # E.g. a run interrupted before the query memo was flushed
+        with CrawlCache(path, MODELS) as cache:
+            cache.set_found([('luid', 'custom_sql', None, ['db.schema.a'], ['missing'])])
+
+        with CrawlCache(path, MODELS) as cache:
+            assert cache.get_found('luid', 'custom_sql', None) is None
+
+    def test_found_is_keyed_on_the_connection_types(self, tmp_path):
+        path = str(tmp_path / 'cache.sqlite')
+
+        with CrawlCache(path, MODELS, ['snowflake']) as cache:
+            cache.set_found([('luid', 'custom_sql', None, ['db.schema.a'], [])])
+
+        # Crawling other types might find more models on the same workbook
+        with CrawlCache(path, MODELS, ['postgres', 'snowflake']) as cache:
+            assert cache.get_found('luid', 'custom_sql', None) is None
+
+        with CrawlCache(path, MODELS, ['snowflake', 'snowflake']) as cache:
+            assert cache.get_found('luid', 'custom_sql', None) == ['db.schema.a']
+
+    def test_caches_written_with_another_schema_are_discarded(self, tmp_path):
+        path = str(tmp_path / 'cache.sqlite')
+
+        with sqlite3.connect(path) as connection:
+            connection.execute('create table workbook_matches (luid text, source text)')
+
+        with CrawlCache(path, MODELS) as cache:
+            cache.set_found([('luid', 'custom_sql', None, ['db.schema.a'], [])])
+            assert cache.get_found('luid', 'custom_sql', None) == ['db.schema.a']
@@ -0,0 +1,56 @@
+from exposurescrawler.dbt.models import ModelRecord
+from exposurescrawler.tableau.checkpoint import (
+    STAGE_USERS,
+    STAGE_WORKBOOKS,
+    CrawlCheckpoint,
+    crawl_fingerprint,
+)
+from exposurescrawler.tableau.models import UserDetails, WorkbookDetails, WorkbookReference
+
+MODELS = {'db.schema.orders': ModelRecord('model.package.orders', 'db.schema.orders')}
+
+
+class TestCrawlCheckpoint:
+    def test_restores_the_pages_matches_and_stages(self, tmp_path):
+        reference = WorkbookReference('luid', 'Orders', '2023-01-01T00:00:00Z')
+        workbook = WorkbookDetails(
+            'luid', 'Orders', None, 'https://tableau', 'owner', 'Project', ['b', 'a'], None, None
+        )
+        user = UserDetails('owner', 'owner@example.com', 'Owner')
+
+        checkpoint = CrawlCheckpoint(str(tmp_path), 'fingerprint', MODELS)
+        checkpoint.set_page('customSQLTablesConnection', 0, {'page': 'results'})
+        checkpoint.set_matches('custom_sql', 0, {reference: list(MODELS.values())})
+        checkpoint.set_stage(STAGE_WORKBOOKS, {'luid': workbook})
+        checkpoint.set_stage(STAGE_USERS, {'owner': user})
+        checkpoint.set_lookup_mode('targeted')
+
+        checkpoint = CrawlCheckpoint(str(tmp_path), 'fingerprint', MODELS, resume=True)
+
+        assert checkpoint.resumed
+        assert checkpoint.get_page('customSQLTablesConnection', 0) == {'page': 'results'}
+        assert checkpoint.get_page('customSQLTablesConnection', 1) is None
+        assert checkpoint.get_matches('custom_sql', 0) == {reference: list(MODELS.values())}
+        assert checkpoint.get_matches('native_sql', 0) is None
+        assert checkpoint.get_stage(STAGE_WORKBOOKS) == {'luid': workbook._replace(tags=['a', 'b'])}
+        assert checkpoint.get_stage(STAGE_USERS) == {'owner': user}
+        assert checkpoint.has_stages(STAGE_WORKBOOKS, STAGE_USERS)
+        assert checkpoint.get_lookup_mode() == 'targeted'
+
+    def test_starts_over_unless_resuming_the_same_crawl(self, tmp_path):
+        fingerprint = crawl_fingerprint(url='https://tableau', page_size=100)
+
+        checkpoint = CrawlCheckpoint(str(tmp_path), fingerprint, MODELS)
+        checkpoint.set_page('customSQLTablesConnection', 0, {'page': 'results'})
+
+        other_fingerprint = crawl_fingerprint(url='https://tableau', page_size=50)
+        checkpoint = CrawlCheckpoint(str(tmp_path), other_fingerprint, MODELS, resume=True)
+
+        assert not checkpoint.resumed
+        assert checkpoint.get_page('customSQLTablesConnection', 0) is None
+
+        checkpoint.set_page('customSQLTablesConnection', 0, {'page': 'results'})
+        checkpoint = CrawlCheckpoint(str(tmp_path), other_fingerprint, MODELS)
+
+        assert not checkpoint.resumed
+        assert checkpoint.get_page('customSQLTablesConnection', 0) is None
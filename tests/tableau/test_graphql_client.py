@@ -0,0 +1,175 @@
+from unittest.mock import MagicMock
+
+from pytest import raises
+
+from exposurescrawler.tableau.checkpoint import CrawlCheckpoint
+from exposurescrawler.tableau.graphql_client import retrieve_custom_sql, retrieve_native_sql
+from exposurescrawler.tableau.models import SqlQuery, WorkbookReference
+
+
+def _custom_sql_page(query, workbook_luid, has_next_page, end_cursor, connection_type='snowflake'):
+    return {
+        'customSQLTablesConnection': {
+            'nodes': [
+                {
+                    'query': query,
+                    'database': {'name': 'SAMPLE_DB', 'connectionType': connection_type},
+                    'downstreamWorkbooks': [{'luid': workbook_luid, 'name': workbook_luid}],
+                }
+            ],
+            'pageInfo': {'hasNextPage': has_next_page, 'endCursor': end_cursor},
+        }
+    }
+
+
+class TestRetrieveCustomSql:
+    def test_follows_the_page_cursor(self):
+        tableau_client = MagicMock()
+        tableau_client.run_metadata_api.side_effect = [
+            _custom_sql_page('select 1', 'first-luid', True, 'cursor-1'),
+            _custom_sql_page('select 2', 'second-luid', False, None),
+        ]
+
+        pages = list(retrieve_custom_sql(tableau_client, ['snowflake'], page_size=1))
+
+        assert pages == [
+            {
+                WorkbookReference('first-luid', 'first-luid'): [
+                    SqlQuery('select 1', 'SAMPLE_DB', None)
+                ]
+            },
+            {
+                WorkbookReference('second-luid', 'second-luid'): [
+                    SqlQuery('select 2', 'SAMPLE_DB', None)
+                ]
+            },
+        ]
+        assert [call.args[1] for call in tableau_client.run_metadata_api.call_args_list] == [
+            {'first': 1, 'afterToken': None},
+            {'first': 1, 'afterToken': 'cursor-1'},
+        ]
+
+    def test_is_consumed_lazily(self):
+        tableau_client = MagicMock()
+        tableau_client.run_metadata_api.side_effect = [
+            _custom_sql_page('select 1', 'first-luid', True, 'cursor-1'),
+            _custom_sql_page('select 2', 'second-luid', False, None),
+        ]
+
+        pages = retrieve_custom_sql(tableau_client, ['snowflake'], page_size=1)
+        next(pages)
+
+        assert tableau_client.run_metadata_api.call_count == 1
+
+    def test_resumes_after_the_last_checkpointed_page(self, tmp_path):
+        tableau_client = MagicMock()
+        tableau_client.run_metadata_api.side_effect = [
+            _custom_sql_page('select 1', 'first-luid', True, 'cursor-1'),
+            ConnectionError('Dropped connection'),
+        ]
+        checkpoint = CrawlCheckpoint(str(tmp_path), 'fingerprint', {})
+
+        with raises(ConnectionError):
+            list(retrieve_custom_sql(tableau_client, ['snowflake'], 1, checkpoint))
+
+        tableau_client.run_metadata_api.side_effect = [
+            _custom_sql_page('select 2', 'second-luid', False, None),
+        ]
+        checkpoint = CrawlCheckpoint(str(tmp_path), 'fingerprint', {}, resume=True)
+        pages = list(retrieve_custom_sql(tableau_client, ['snowflake'], 1, checkpoint))
+
+        assert [list(page) for page in pages] == [
+            [WorkbookReference('first-luid', 'first-luid')],
+            [WorkbookReference('second-luid', 'second-luid')],
+        ]
+        assert tableau_client.run_metadata_api.call_args.args[1] == {
+            'first': 1,
+            'afterToken': 'cursor-1',
+        }
+
+    def test_keeps_only_the_requested_connection_types(self):
+        tableau_client = MagicMock()
+        tableau_client.run_metadata_api.side_effect = [
+            _custom_sql_page('select 1', 'first-luid', True, 'cursor-1', 'postgres'),
+            _custom_sql_page('select 2', 'second-luid', True, 'cursor-2', 'bigquery'),
+            _custom_sql_page('select 3', 'third-luid', False, None, 'snowflake'),
+        ]
+
+        pages = list(retrieve_custom_sql(tableau_client, ['snowflake', 'postgres']))
+
+        # Unqualified tables on Postgres resolve to the public schema
+        assert pages == [
+            {
+                WorkbookReference('first-luid', 'first-luid'): [
+                    SqlQuery('select 1', 'SAMPLE_DB', 'public')
+                ]
+            },
+            {},
+            {
+                WorkbookReference('third-luid', 'third-luid'): [
+                    SqlQuery('select 3', 'SAMPLE_DB', None)
+                ]
+            },
+        ]
+
+    def test_keeps_the_default_connection_types_if_not_given(self):
+        tableau_client = MagicMock()
+        tableau_client.run_metadata_api.side_effect = [
+            _custom_sql_page('select 1', 'first-luid', True, 'cursor-1', 'postgres'),
+            _custom_sql_page('select 2', 'second-luid', False, None, 'snowflake'),
+        ]
+
+        pages = list(retrieve_custom_sql(tableau_client))
+
+        assert [list(page) for page in pages] == [
+            [],
+            [WorkbookReference('second-luid', 'second-luid')],
+        ]
+
+
+class TestRetrieveNativeSql:
+    def test_retrieves_all_connection_types_at_once(self):
+        def _table(name, connection_type):
+            return {
+                'database': {'name': 'SAMPLE_DB'},
+                'schema': 'PUBLIC',
+                'fullName': f'[PUBLIC].[{name}]',
+                'connectionType': connection_type,
+            }
+
+        tableau_client = MagicMock()
+        tableau_client.run_metadata_api.return_value = {
+            'workbooksConnection': {
+                'nodes': [
+                    {
+                        'luid': 'workbook-luid',
+                        'name': 'Workbook',
+                        'embeddedDatasources': [
+                            {
+                                'upstreamTables': [
+                                    _table('ORDERS', 'snowflake'),
+                                    _table('CUSTOMERS', 'postgres'),
+                                ]
+                            }
+                        ],
+                    }
+                ],
+                'pageInfo': {'hasNextPage': False, 'endCursor': None},
+            }
+        }
+
+        pages = list(retrieve_native_sql(tableau_client, ['snowflake', 'postgres']))
+
+        assert pages == [
+            {
+                WorkbookReference('workbook-luid', 'Workbook'): [
+                    SqlQuery('SAMPLE_DB.PUBLIC.ORDERS', 'SAMPLE_DB', 'PUBLIC'),
+                    SqlQuery('SAMPLE_DB.PUBLIC.CUSTOMERS', 'SAMPLE_DB', 'PUBLIC'),
+                ]
+            }
+        ]
+        assert tableau_client.run_metadata_api.call_count == 1
+        assert tableau_client.run_metadata_api.call_args.args[1]['connectionTypes'] == [
+            'snowflake',
+            'postgres',
+        ]
@@ -0,0 +1,83 @@
+import gzip
+import os
+
+import requests
+from pytest import raises
+from requests.adapters import BaseAdapter
+
+from exposurescrawler.tableau.recording import ReplayAdapter, RecordingAdapter, mount, request_key
+
+
+class FakeAdapter(BaseAdapter):
+    """
+    Stands in for the network, answering every request with its own URL and body.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sent = 0
+
+    def send(self, request, *args, **kwargs):
+        self.sent += 1
+
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.headers['Content-Type'] = 'application/json; charset=utf-8'
+        response.headers['Set-Cookie'] = 'session=secret'
+        response._content = request.url.encode() + b' ' + (request.body or b'')
+        response.url = request.url
+        response.request = request
+
+        return response
+
+    def close(self):
+        pass
+
+
+def _session(adapter):
+    session = requests.Session()
+    mount(session, adapter)
+
+    return session
+
+
+class TestRecording:
+    def test_replays_the_recorded_responses(self, tmp_path):
+        fake_adapter = FakeAdapter()
+        recording_session = _session(RecordingAdapter(str(tmp_path), fake_adapter))
+
+        recording_session.post('https://tableau/api/metadata/graphql', data=b'{"query": 1}')
+        recording_session.get('https://tableau/api/3.4/sites/site-id/workbooks')
+
+        replay_session = _session(ReplayAdapter(str(tmp_path)))
+        response = replay_session.post('https://tableau/api/metadata/graphql', data=b'{"query": 1}')
+
+        assert response.status_code == 200
+        assert response.text == 'https://tableau/api/metadata/graphql {"query": 1}'
+        assert response.headers['Content-Type'] == 'application/json; charset=utf-8'
+        assert 'Set-Cookie' not in response.headers
+        assert fake_adapter.sent == 2
+
+        # Only what was recorded can be replayed
+        with raises(requests.exceptions.ConnectionError):
+            replay_session.post('https://tableau/api/metadata/graphql', data=b'{"query": 2}')
+
+    def test_responses_are_addressed_by_their_request(self, tmp_path):
+        session = _session(RecordingAdapter(str(tmp_path), FakeAdapter()))
+        session.post('https://tableau/api/metadata/graphql', data=b'{"query": 1}')
+
+        key = request_key('POST', 'https://tableau/api/metadata/graphql', b'{"query": 1}')
+        path = tmp_path / key[:2] / f'{key}.json.gz'
+
+        with gzip.open(path, 'rt') as file:
+            assert '{\\"query\\": 1}' in file.read()
+
+        assert os.listdir(tmp_path) == [key[:2]]
+
+    def test_sign_in_is_addressed_without_the_credentials(self):
+        url = 'https://tableau/api/3.4/auth/signin'
+
+        assert request_key('POST', url, b'<password>a</password>') == request_key(
+            'POST', url, b'<password>b</password>'
+        )
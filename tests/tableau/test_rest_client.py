@@ -0,0 +1,133 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import requests
+import tableauserverclient as TSC
+from pytest import fixture
+
+from exposurescrawler.tableau.rest_client import TableauRestClient
+
+
+@fixture
+def server():
+    with patch('exposurescrawler.tableau.rest_client.TSC.Server') as mock:
+        instance = mock.return_value
+        instance.is_signed_in.return_value = False
+
+        def _sign_in(_):
+            instance.is_signed_in.return_value = True
+            instance.site_id = 'site-id'
+            instance.user_id = 'user-id'
+            instance.auth_token = 'auth-token'
+            instance._site_url = ''
+
+        def _clear_auth():
+            instance.is_signed_in.return_value = False
+
+        instance.auth.sign_in.side_effect = _sign_in
+        instance._clear_auth.side_effect = _clear_auth
+        instance.metadata.query.return_value = {'data': {}}
+
+        yield instance
+
+
+class TestTableauRestClient:
+    def test_signs_in_once(self, server):
+        with TableauRestClient('https://tableau', 'user', 'password') as client:
+            client.run_metadata_api('query')
+            client.run_metadata_api('query')
+            client.retrieve_user('user-id')
+
+        assert server.auth.sign_in.call_count == 1
+        assert server.auth.sign_out.call_count == 1
+
+    def test_signs_in_once_when_shared_between_threads(self, server):
+        with TableauRestClient('https://tableau', 'user', 'password') as client:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(client.run_metadata_api, ['query'] * 32))
+
+        assert server.auth.sign_in.call_count == 1
+
+    def test_signs_in_again_when_the_session_expires(self, server):
+        server.metadata.query.side_effect = [
+            TSC.NotSignedInError('expired'),
+            {'data': {'result': 1}},
+        ]
+
+        with TableauRestClient('https://tableau', 'user', 'password') as client:
+            assert client.run_metadata_api('query') == {'result': 1}
+
+        assert server.auth.sign_in.call_count == 2
+        server._clear_auth.assert_called_once()
+
+    def test_reuses_the_cached_token(self, server, tmp_path):
+        token_cache_path = str(tmp_path / 'token.json')
+
+        with TableauRestClient('https://tableau', 'user', 'password', token_cache_path) as client:
+            client.run_metadata_api('query')
+
+        server.is_signed_in.return_value = False
+
+        with TableauRestClient('https://tableau', 'user', 'password', token_cache_path) as client:
+            client.run_metadata_api('query')
+
+        assert server.auth.sign_in.call_count == 1
+        assert server.auth.sign_out.call_count == 0
+        server._set_auth.assert_called_once_with('site-id', 'user-id', 'auth-token', '')
+
+    def test_caches_the_workbooks_and_users_of_each_client(self, server):
+        first = TableauRestClient('https://first', 'user', 'password')
+        second = TableauRestClient('https://second', 'user', 'password')
+
+        first.retrieve_workbook('workbook-id')
+        first.retrieve_workbook('workbook-id')
+        second.retrieve_workbook('workbook-id')
+        first.retrieve_user('user-id')
+
+        assert server.workbooks.get_by_id.call_count == 2
+
+        # Clearing the cache of a client leaves the cache of the others alone
+        second.clear_cache()
+        first.retrieve_workbook('workbook-id')
+        first.retrieve_user('user-id')
+        second.retrieve_workbook('workbook-id')
+
+        assert server.workbooks.get_by_id.call_count == 3
+        assert server.users.get_by_id.call_count == 1
+
+
+class TestTableauServerClientInternals:
+    """
+    The client relies on private parts of tableauserverclient (to reuse cached tokens and to
+    sign in again), which might change on any version: these fail if they are no longer there.
+    """
+
+    def test_creates_sessions_through_the_session_factory(self):
+        sessions = []
+
+        def session_factory():
+            sessions.append(requests.Session())
+            return sessions[-1]
+
+        TSC.Server('https://tableau', session_factory=session_factory)
+
+        assert sessions, 'TSC.Server no longer creates its sessions through session_factory'
+
+    def test_sets_and_clears_the_authentication(self):
+        for method in ('_set_auth', '_clear_auth'):
+            assert hasattr(TSC.Server, method), f'TSC.Server no longer has {method}()'
+
+        server = TSC.Server('https://tableau')
+        server._set_auth('site-id', 'user-id', 'auth-token', 'site-url')
+
+        for attribute in ('_auth_token', '_site_url'):
+            assert hasattr(server, attribute), f'TSC.Server no longer has {attribute}'
+
+        assert server.is_signed_in()
+        assert (server.site_id, server.user_id) == ('site-id', 'user-id')
+        assert (server._auth_token, server._site_url) == ('auth-token', 'site-url')
+
+        server._clear_auth()
+
+        assert not server.is_signed_in()
+        assert server._auth_token is None
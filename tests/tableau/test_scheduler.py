@@ -0,0 +1,132 @@
+import email.utils
+import threading
+import time
+
+import requests
+from pytest import raises
+
+from exposurescrawler.tableau.scheduler import (
+    AdaptiveConcurrencyLimiter,
+    RequestScheduler,
+    TokenBucket,
+    retry_after_seconds,
+)
+
+
+def _response(status_code, retry_after=None):
+    response = requests.Response()
+    response.status_code = status_code
+
+    if retry_after is not None:
+        response.headers['Retry-After'] = retry_after
+
+    return response
+
+
+def test_retry_after_seconds():
+    in_a_minute = email.utils.formatdate(time.time() + 60, usegmt=True)
+
+    assert retry_after_seconds('3') == 3
+    assert 55 < retry_after_seconds(in_a_minute) <= 60
+    assert retry_after_seconds('soon') is None
+    assert retry_after_seconds(None) is None
+
+
+class TestRequestScheduler:
+    def test_retries_throttled_and_transient_errors(self):
+        responses = iter([_response(429, '0'), _response(503), _response(200)])
+        scheduler = RequestScheduler(max_concurrency=4, backoff_base=0.001)
+
+        assert scheduler.send(lambda: next(responses)).status_code == 200
+
+    def test_retries_connection_errors(self):
+        attempts = []
+
+        def send():
+            attempts.append(1)
+
+            if len(attempts) < 3:
+                raise requests.exceptions.ConnectionError('connection reset')
+
+            return _response(200)
+
+        scheduler = RequestScheduler(max_concurrency=4, backoff_base=0.001)
+
+        assert scheduler.send(send).status_code == 200
+        assert len(attempts) == 3
+
+    def test_gives_up_after_the_last_retry(self):
+        scheduler = RequestScheduler(max_concurrency=4, max_retries=2, backoff_base=0.001)
+        attempts = []
+
+        def send():
+            attempts.append(1)
+            return _response(503)
+
+        # The last error is handed over to the Tableau client, which raises it
+        assert scheduler.send(send).status_code == 503
+        assert len(attempts) == 3
+
+        with raises(requests.exceptions.ConnectionError):
+            scheduler.send(lambda: (_ for _ in ()).throw(requests.exceptions.ConnectionError()))
+
+    def test_does_not_retry_client_errors(self):
+        responses = iter([_response(404), _response(200)])
+        scheduler = RequestScheduler(max_concurrency=4)
+
+        assert scheduler.send(lambda: next(responses)).status_code == 404
+
+    def test_honors_retry_after(self):
+        responses = iter([_response(429, '0.2'), _response(200)])
+        scheduler = RequestScheduler(max_concurrency=4, backoff_base=0)
+
+        start = time.perf_counter()
+        scheduler.send(lambda: next(responses))
+
+        assert time.perf_counter() - start >= 0.2
+
+
+class TestAdaptiveConcurrencyLimiter:
+    def test_halves_when_overloaded_and_ramps_up_when_healthy(self):
+        limiter = AdaptiveConcurrencyLimiter(8)
+
+        limiter.acquire()
+        limiter.release(overloaded=True)
+        assert limiter.limit == 4
+
+        # Failures of the same burst only lower it once
+        limiter.acquire()
+        limiter.release(overloaded=True)
+        assert limiter.limit == 4
+
+        for _ in range(4):
+            limiter.acquire()
+            limiter.release(overloaded=False)
+
+        assert limiter.limit == 5
+
+    def test_limits_the_requests_in_flight(self):
+        limiter = AdaptiveConcurrencyLimiter(2)
+        limiter.acquire()
+        limiter.acquire()
+
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+        thread.start()
+
+        assert not acquired.wait(0.05)
+
+        limiter.release(overloaded=False)
+        assert acquired.wait(1)
+        thread.join()
+
+
+def test_token_bucket_limits_the_rate():
+    bucket = TokenBucket(rate=50, burst=1)
+
+    start = time.perf_counter()
+    for _ in range(6):
+        bucket.acquire()
+
+    # The first one is taken from the burst, and the next 5 at 50 per second
+    assert time.perf_counter() - start >= 0.09
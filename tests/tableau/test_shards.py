@@ -0,0 +1,75 @@
+from pytest import mark, raises
+
+from exposurescrawler.dbt.models import ModelRecord
+from exposurescrawler.tableau.models import UserDetails, WorkbookDetails, WorkbookReference
+from exposurescrawler.tableau.shards import (
+    Shard,
+    ShardError,
+    in_shard,
+    parse_shard,
+    read_shards,
+    shard_pages,
+    write_shard,
+)
+from exposurescrawler.tableau.sites import TableauSite
+
+
+@mark.parametrize(
+    'value, error',
+    [
+        ('1', 'expected i/N'),
+        ('a/4', 'expected i/N'),
+        ('0/4', 'between 1 and 4'),
+        ('5/4', 'between 1 and 4'),
+    ],
+)
+def test_parse_shard_rejects_invalid_shards(value, error):
+    with raises(ValueError, match=error):
+        parse_shard(value)
+
+
+def test_every_workbook_is_on_exactly_one_shard():
+    luids = [f'workbook-{index}' for index in range(1000)]
+    shards = [parse_shard(f'{index}/4') for index in range(1, 5)]
+
+    counts = [sum(in_shard(luid, shard) for luid in luids) for shard in shards]
+
+    assert sum(counts) == len(luids)
+    assert all(count > 200 for count in counts)
+
+    pages = [{WorkbookReference(luid, luid): []} for luid in luids]
+    assert sum(len(page) for page in shard_pages(pages, shards[0])) == counts[0]
+
+
+def test_read_shards_merges_all_the_shards(tmp_path):
+    site = TableauSite('sales', 'https://tableau', 'user', 'password')
+    owner = UserDetails('owner', 'owner@example.com', 'Owner')
+    paths = []
+
+    for index, luid in ((2, 'second'), (1, 'first')):
+        workbook = WorkbookDetails(luid, luid, None, 'url', 'owner', 'project', [], None, None)
+        results = (
+            {WorkbookReference(luid, luid): [ModelRecord('model.orders', 'db.schema.orders')]},
+            {luid: workbook},
+            {'owner': owner},
+        )
+        paths.append(str(tmp_path / f'shard-{index}.json'))
+        write_shard(paths[-1], Shard(index, 2), [(site, results)])
+
+    ((merged_site, (workbooks_models, workbook_owner_map, user_userid_map)),) = read_shards(paths)
+
+    assert merged_site == TableauSite('sales', 'https://tableau', '', '')
+    assert list(workbooks_models) == [
+        WorkbookReference('first', 'first'),
+        WorkbookReference('second', 'second'),
+    ]
+    assert set(workbook_owner_map) == {'first', 'second'}
+    assert user_userid_map == {'owner': owner}
+
+    with raises(ShardError, match=r'every shard exactly once, got shards \[2\]'):
+        read_shards(paths[:1])
+
+    (tmp_path / 'shard-3.json').write_text('not a shard')
+
+    with raises(ShardError, match='shard-3.json: not a shard'):
+        read_shards(paths + [str(tmp_path / 'shard-3.json')])
@@ -0,0 +1,52 @@
+import json
+from unittest.mock import patch
+
+from pytest import raises
+
+from exposurescrawler.tableau.sites import TableauSite, load_sites
+
+
+def _write_sites(tmp_path, sites):
+    path = tmp_path / 'sites.json'
+    path.write_text(json.dumps(sites))
+    return str(path)
+
+
+def test_load_sites_expands_environment_variables(tmp_path):
+    path = _write_sites(
+        tmp_path,
+        [
+            {
+                'name': 'Sales EMEA',
+                'url': 'https://tableau.company.com/',
+                'site': 'sales',
+                'username': '$SALES_USERNAME',
+                'password': '${SALES_PASSWORD}',
+            },
+            {'name': 'main', 'url': 'https://main', 'username': 'user', 'password': 'password'},
+        ],
+    )
+
+    with patch.dict('os.environ', {'SALES_USERNAME': 'sales', 'SALES_PASSWORD': 'secret'}):
+        sites = load_sites(path)
+
+    assert sites == [
+        TableauSite('sales_emea', 'https://tableau.company.com', 'sales', 'secret', 'sales'),
+        TableauSite('main', 'https://main', 'user', 'password', ''),
+    ]
+
+
+def test_load_sites_rejects_invalid_sites(tmp_path):
+    site = {'name': 'main', 'url': 'https://main', 'username': 'user', 'password': 'password'}
+
+    with raises(ValueError, match='missing password'):
+        load_sites(_write_sites(tmp_path, [{**site, 'password': ''}]))
+
+    with raises(ValueError, match='must be unique: main'):
+        load_sites(_write_sites(tmp_path, [site, {**site, 'name': 'Main'}]))
+
+    with raises(ValueError, match='site #2 is not an object'):
+        load_sites(_write_sites(tmp_path, [site, 'https://other']))
+
+    with raises(ValueError, match='non-empty list'):
+        load_sites(_write_sites(tmp_path, {'sites': [site]}))
@@ -0,0 +1,49 @@
+import gzip
+import os
+
+from pytest import raises
+
+from exposurescrawler.utils.files import atomic_write
+
+
+class TestAtomicWrite:
+    def test_replaces_the_file_once_written(self, tmp_path):
+        path = tmp_path / 'file.json'
+        path.write_text('previous')
+
+        with atomic_write(str(path)) as file:
+            file.write('new')
+            assert path.read_text() == 'previous'
+
+        assert path.read_text() == 'new'
+        assert os.listdir(tmp_path) == ['file.json']
+
+    def test_keeps_the_previous_file_if_writing_fails(self, tmp_path):
+        path = tmp_path / 'file.json'
+        path.write_text('previous')
+
+        with raises(RuntimeError):
+            with atomic_write(str(path)) as file:
+                file.write('new')
+                raise RuntimeError('Failed while writing')
+
+        assert path.read_text() == 'previous'
+        assert os.listdir(tmp_path) == ['file.json']
+
+    def test_writes_gzipped_files(self, tmp_path):
+        path = tmp_path / 'file.json.gz'
+
+        with atomic_write(str(path), compress=True, encoding='utf-8') as file:
+            file.write('✅')
+
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            assert file.read() == '✅'
+
+    def test_writes_files_with_the_given_permissions(self, tmp_path):
+        path = tmp_path / 'token.json'
+
+        with atomic_write(str(path), 'wb', permissions=0o600) as file:
+            file.write(b'secret')
+
+        assert path.read_bytes() == b'secret'
+        assert path.stat().st_mode & 0o777 == 0o600
@@ -0,0 +1,34 @@
+from exposurescrawler.utils.metrics import Metrics
+
+
+class TestMetrics:
+    def test_aggregates_spans_and_counters(self):
+        metrics = Metrics()
+
+        with metrics.span('stage'):
+            pass
+
+        metrics.observe('stage', 2.0)
+        metrics.increment('queries')
+        metrics.increment('queries', 2)
+
+        report = metrics.report()
+
+        assert report['spans']['stage']['count'] == 2
+        assert report['spans']['stage']['max_seconds'] == 2.0
+        assert report['counters'] == {'queries': 3}
+        assert report['peak_memory_bytes'] > 0
+
+    def test_writes_prometheus_textfile(self, tmp_path):
+        metrics = Metrics()
+        metrics.observe('tableau.run_metadata_api', 1.5)
+        metrics.increment('tableau_http_response_bytes', 1024)
+
+        path = tmp_path / 'crawler.prom'
+        metrics.write_prometheus_textfile(str(path))
+        lines = path.read_text().splitlines()
+
+        assert 'exposurescrawler_span_seconds_total{span="tableau.run_metadata_api"} 1.5' in lines
+        assert 'exposurescrawler_span_count_total{span="tableau.run_metadata_api"} 1' in lines
+        assert '# TYPE exposurescrawler_tableau_http_response_bytes_total counter' in lines
+        assert 'exposurescrawler_tableau_http_response_bytes_total 1024' in lines
@@ -1,4 +1,14 @@
-from exposurescrawler.utils.query_parsing import search_model_in_query
+from exposurescrawler.dbt.models import ModelRecord
+from exposurescrawler.tableau.graphql_client import _fix_fqn_native_sql
+from exposurescrawler.utils.query_parsing import (
+    ModelIndex,
+    ParallelModelIndex,
+    QueryMemo,
+    affected_identifiers,
+    query_identifiers,
+    search_model_in_query,
+    tokenize_query,
+)
 
 
 class TestQuerySearcher:
@@ -12,3 +22,176 @@ class TestQuerySearcher:
         assert search_model_in_query(query, models) == {
             'mart.core.ride': {'name': 'mart.core.ride'}
         }
+
+
+MODELS = {
+    'sample_db.public.customers': {'name': 'customers'},
+    'sample_db.public.orders': {'name': 'orders'},
+    'sample_db.marketing.orders': {'name': 'marketing orders'},
+}
+
+
+class TestModelIndex:
+    def test_multiple_models(self):
+        query = 'select * from sample_db.public.customers join sample_db.public.orders using (id)'
+
+        assert ModelIndex(MODELS).search(query).keys() == {
+            'sample_db.public.customers',
+            'sample_db.public.orders',
+        }
+
+    def test_identifier_boundaries(self):
+        models = {'sample_db.public.order': {'name': 'order'}}
+        query = 'select * from sample_db.public.orders'
+
+        assert ModelIndex(models).search(query) == {}
+
+    def test_partially_qualified_names_use_the_connection_database(self):
+        query = 'select * from public.customers c join "MARKETING"."ORDERS" o on c.id = o.id'
+
+        assert ModelIndex(MODELS).search(query) == {}
+        assert ModelIndex(MODELS).search(query, database='SAMPLE_DB').keys() == {
+            'sample_db.public.customers',
+            'sample_db.marketing.orders',
+        }
+
+    def test_bare_names(self):
+        query = 'select customers.orders from customers join orders on true'
+        index = ModelIndex(MODELS)
+
+        # `orders` is ambiguous without a schema, `customers` is not
+        assert index.search(query, database='sample_db').keys() == {'sample_db.public.customers'}
+        assert index.search(query, database='sample_db', schema='public').keys() == {
+            'sample_db.public.customers',
+            'sample_db.public.orders',
+        }
+
+    def test_hyphenated_names(self):
+        models = {'my-project.analytics.orders': {'name': 'orders'}}
+        query = 'select * from my-project.analytics.orders-- comment\njoin `my-project.x.y` on true'
+
+        assert ModelIndex(models).search(query).keys() == {'my-project.analytics.orders'}
+        assert tokenize_query('select a-b from orders-1') == [['orders-1']]
+
+    def test_native_sql_tables_are_looked_up_as_they_are(self):
+        models = {'my-project.analytics.orders': {}, 'sample db.public.order items': {}}
+        index = ModelIndex(models)
+
+        table = {
+            'fullName': '[my-project].[analytics].[orders]',
+            'database': {'name': 'my-project'},
+            'schema': 'analytics',
+        }
+        assert index.search(_fix_fqn_native_sql(table)).keys() == {'my-project.analytics.orders'}
+        assert index.search('SAMPLE DB.public.Order Items').keys() == {
+            'sample db.public.order items'
+        }
+
+    def test_cte_names_are_not_models(self):
+        query = 'with customers as (select 1) select * from customers'
+
+        assert ModelIndex(MODELS).search(query, database='sample_db') == {}
+
+
+class TestQueryMemo:
+    def test_identical_queries_are_parsed_once(self):
+        memo = QueryMemo(ModelIndex(MODELS), maxsize=10)
+        query = 'select * from sample_db.public.customers'
+
+        assert memo.search(query) == memo.search(' SELECT * FROM sample_db.public.customers ')
+        assert memo.search(query, database='other_db') == memo.search(query)
+        assert (memo.hits, memo.misses) == (2, 2)
+
+    def test_least_recently_used_queries_are_evicted(self):
+        memo = QueryMemo(ModelIndex(MODELS), maxsize=2)
+
+        memo.search('select 1')
+        memo.search('select 2')
+        memo.search('select 1')
+        memo.search('select 3')
+        memo.search('select 2')
+
+        assert (memo.hits, memo.misses) == (1, 4)
+
+    def test_entries_are_persisted_on_the_store(self):
+        class Store(dict):
+            def get_query_matches(self, key):
+                return self.get(key)
+
+            def set_query_matches(self, entries):
+                self.update((key, found) for key, found, _ in entries)
+
+        store = Store()
+        query = 'select * from sample_db.public.customers'
+
+        memo = QueryMemo(ModelIndex(MODELS), maxsize=10, store=store)
+        memo.search(query)
+        memo.flush()
+
+        memo = QueryMemo(ModelIndex(MODELS), maxsize=10, store=store)
+        assert memo.search(query).keys() == {'sample_db.public.customers'}
+        assert (memo.hits, memo.misses) == (1, 0)
+
+    def test_search_many_is_the_same_as_search(self):
+        queries = [
+            ('select * from sample_db.public.customers', None, None),
+            ('select * from orders', 'sample_db', 'marketing'),
+            ('select * from sample_db.public.customers', None, None),
+            ('select 1', None, None),
+        ]
+
+        memo = QueryMemo(ModelIndex(MODELS), maxsize=10)
+        serial_memo = QueryMemo(ModelIndex(MODELS), maxsize=10)
+
+        assert memo.search_many(queries) == [serial_memo.search(*query) for query in queries]
+        assert (memo.hits, memo.misses) == (serial_memo.hits, serial_memo.misses) == (1, 3)
+
+
+class TestQueryIdentifiers:
+    def test_identifiers_are_looked_up_as_by_the_index(self):
+        query = 'select * from "Sample_DB".public.customers join orders join marketing.orders'
+
+        assert query_identifiers(query, 'sample_db', None) == {
+            'sample_db.public.customers',
+            'sample_db.*.orders',
+            'sample_db.marketing.orders',
+        }
+        assert query_identifiers(query) == {'sample_db.public.customers'}
+        assert query_identifiers('sample_db.public.orders') == {'sample_db.public.orders'}
+
+    def test_the_results_only_change_with_the_models_affected(self):
+        queries = [
+            ('select * from orders', 'sample_db', None),
+            ('select * from orders', 'sample_db', 'public'),
+            ('select * from sample_db.public.customers', None, None),
+            ('select * from customers', 'other_db', 'public'),
+        ]
+
+        for added in ['sample_db.other.orders', 'sample_db.public.clients', 'other_db.x.x']:
+            affected = affected_identifiers([added])
+            models = {**MODELS, added: {'name': added}}
+
+            for query in queries:
+                if not query_identifiers(*query) & affected:
+                    assert ModelIndex(models).search(*query) == ModelIndex(MODELS).search(*query)
+
+        assert query_identifiers(*queries[0]) & affected_identifiers(['Sample_DB.other.Orders'])
+
+
+class TestParallelModelIndex:
+    def test_results_are_the_same_as_the_serial_index(self):
+        models = {
+            name: ModelRecord(f'model.{model["name"]}', name) for name, model in MODELS.items()
+        }
+        queries = [
+            (
+                'select * from sample_db.public.customers join orders using (id)',
+                'sample_db',
+                'public',
+            ),
+            ('select * from sample_db.marketing.orders', None, None),
+            ('select 1', None, None),
+        ] * 10
+
+        with ParallelModelIndex(models, workers=2) as index:
+            assert index.search_many(queries) == ModelIndex(models).search_many(queries)
@@ -0,0 +1,35 @@
+import json
+from pathlib import Path
+
+from pytest import mark, param
+
+from exposurescrawler.utils import serialization
+
+PATH_TO_MANIFEST_FIXTURE = Path(__file__).resolve().parent.parent / '_fixtures' / 'manifest.json'
+
+BACKENDS = [
+    param(
+        serialization.BACKEND_ORJSON,
+        marks=mark.skipif(serialization.orjson is None, reason='orjson is not installed'),
+    ),
+    param(
+        serialization.BACKEND_UJSON,
+        marks=mark.skipif(serialization.ujson is None, reason='ujson is not installed'),
+    ),
+    serialization.BACKEND_STDLIB,
+]
+
+
+@mark.parametrize('backend', BACKENDS)
+@mark.parametrize('compact', [True, False])
+def test_round_trip_is_equivalent_to_the_standard_library(backend, compact):
+    data = PATH_TO_MANIFEST_FIXTURE.read_bytes()
+    manifest = serialization.loads(data, backend)
+
+    assert manifest == json.loads(data)
+    assert json.loads(serialization.dumps(manifest, compact, backend)) == manifest
+
+
+@mark.parametrize('backend', BACKENDS)
+def test_compact_output_has_no_whitespace(backend):
+    assert serialization.dumps({'a': [1, {'b': 'c'}]}, True, backend) == b'{"a":[1,{"b":"c"}]}'